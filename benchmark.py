@@ -0,0 +1,221 @@
+"""Mesure les temps de chargement de l'application sur une base volumineuse.
+
+Chaque scénario appelle la vraie méthode de l'interface (load_data des
+onglets, recherche d'étudiants, calculate_moyennes, génération du
+bulletin...) sur des widgets créés hors écran. Les requêtes passent par un
+worker synchrone qui chronomètre séparément la partie SQL (fonction exécutée
+sur le worker) et la partie Qt (callback qui remplit les widgets).
+
+Les résultats sont écrits en JSON ; --baseline compare avec un run précédent
+et échoue (code de sortie 1) si un scénario ralentit au-delà du seuil.
+
+Usage : python benchmark.py base.db [--output resultats.json] [--baseline ancien.json]
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtWidgets import QApplication
+
+from core import DatabaseManager, GestionService, ResultsEngine
+from main import (DepartementsTab, FormationsTab, EtudiantsTab, StudentsManagementDialog, NotesManagementDialog,
+                  BulletinDialog, BulletinBatch)
+
+
+class TimingWorker:
+    """Remplace DatabaseWorker : exécute les requêtes immédiatement et chronomètre SQL et Qt"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.sql = 0.0
+        self.qt = 0.0
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.sql = self.qt = 0.0
+
+    def submit(self, func, callback, group=None, errback=None, site=None):
+        stats = self.db_manager.query_stats
+        cursor = self.db_manager.get_connection().cursor()
+        debut = time.perf_counter()
+        with stats.site(site or stats.call_site(skip=1)):
+            result = func(cursor)
+        milieu = time.perf_counter()
+        callback(result)
+        self.sql += milieu - debut
+        self.qt += time.perf_counter() - milieu
+        return next(self._ids)
+
+    def cancel(self, request_id):
+        pass
+
+    def cancel_group(self, group):
+        pass
+
+    def stop(self):
+        pass
+
+
+class Benchmark:
+    def __init__(self, db, repeat):
+        # Les modèles Qt mesurés exigent une QApplication, gardée pour toute la durée du benchmark
+        self.app = QApplication.instance() or QApplication([])
+        self.db = db
+        self.repeat = repeat
+        self.worker = TimingWorker(db)
+        self.results = {}
+
+    def measure(self, name, action):
+        """Exécute `action` `repeat` fois et enregistre les durées (ms) totale, SQL et Qt"""
+        mesures = {'total': [], 'sql': [], 'qt': []}
+        for _ in range(self.repeat):
+            self.worker.reset()
+            debut = time.perf_counter()
+            action()
+            self.app.processEvents()
+            mesures['total'].append((time.perf_counter() - debut) * 1000)
+            mesures['sql'].append(self.worker.sql * 1000)
+            mesures['qt'].append(self.worker.qt * 1000)
+
+        def resume(valeurs):
+            valeurs = sorted(valeurs)
+            return {'min': round(valeurs[0], 3), 'median': round(statistics.median(valeurs), 3),
+                    'p95': round(valeurs[min(len(valeurs) - 1, int(len(valeurs) * 0.95))], 3),
+                    'max': round(valeurs[-1], 3)}
+
+        self.results[name] = {cle: resume(valeurs) for cle, valeurs in mesures.items()}
+        print(f"{name:45s} {self.results[name]['total']['median']:10.2f} ms "
+              f"(SQL {self.results[name]['sql']['median']:.2f} ms)")
+
+    def sample(self, sql, limit):
+        cursor = self.db.get_connection().cursor()
+        cursor.execute(sql, (limit,))
+        return cursor.fetchall()
+
+    def run(self, samples):
+        # Onglets principaux : requête de la première page puis peinture de la vue
+        for tab_class in (DepartementsTab, FormationsTab, EtudiantsTab):
+            tab = tab_class(self.db, self.worker)
+            tab.resize(1000, 700)
+            tab.show()
+            self.measure(f"{tab_class.__name__}.load_data", tab.load_data)
+            self.measure(f"{tab_class.__name__}.paint", lambda: tab.table.viewport().grab())
+            self.measure(f"{tab_class.__name__}.scroll_end",
+                         lambda: (tab.table.scrollToBottom(), tab.table.viewport().grab()))
+            tab.close()
+
+        # Formations les plus peuplées
+        formations = self.sample('''
+            SELECT formation_id, COUNT(*) AS nb FROM inscriptions
+            GROUP BY formation_id ORDER BY nb DESC LIMIT ?
+        ''', samples)
+        for formation_id, _ in formations:
+            dialog = StudentsManagementDialog(None, self.db, formation_id, str(formation_id), self.worker)
+            self.measure(f"StudentsManagementDialog.load_data[{formation_id}]", dialog.load_data)
+            for text in ('Mar', 'Martin Ju', 'E0000'):
+                dialog.etudiant_search.setText(text)
+                self.measure(f"StudentSearchBox.search[{formation_id}, {text!r}]", dialog.etudiant_search.search)
+            dialog.done(0)
+            self.measure(f"ResultsEngine.compute_formation[{formation_id}]",
+                         lambda: self.worker.submit(
+                             lambda cursor: ResultsEngine(self.db).compute_formation(formation_id, cursor),
+                             lambda result: None))
+            batch = BulletinBatch(self.db, formation_id, os.devnull)
+            self.measure(f"BulletinBatch.query[{formation_id}]",
+                         lambda: self.worker.submit(batch.query, lambda result: None))
+
+        # Premiers étudiants inscrits
+        etudiants = self.sample('''
+            SELECT etudiant_id, MIN(formation_id) FROM inscriptions
+            GROUP BY etudiant_id ORDER BY etudiant_id LIMIT ?
+        ''', samples)
+        for etudiant_id, formation_id in etudiants:
+            dialog = NotesManagementDialog(None, self.db, etudiant_id, str(etudiant_id), formation_id, self.worker)
+            self.measure(f"NotesManagementDialog.load_data[{etudiant_id}]", dialog.load_data)
+            self.measure(f"NotesManagementDialog.calculate_moyennes[{etudiant_id}]", dialog.calculate_moyennes)
+
+            def bulletin():
+                cursor = self.db.get_connection().cursor()
+                debut = time.perf_counter()
+                data = GestionService.query_bulletin(cursor, etudiant_id)
+                self.worker.sql += time.perf_counter() - debut
+                BulletinDialog(dialog, *data).close()
+
+            self.measure(f"NotesManagementDialog.generate_bulletin[{etudiant_id}]", bulletin)
+            dialog.done(0)
+
+
+def counts(db):
+    cursor = db.get_connection().cursor()
+    result = {}
+    for table in ('departements', 'formations', 'matieres', 'etudiants', 'inscriptions', 'notes'):
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        result[table] = cursor.fetchone()[0]
+    return result
+
+
+def compare(results, baseline_path, seuil):
+    """Affiche les scénarios dont la médiane a augmenté de plus de `seuil` ; retourne leur nombre"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = 0
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        avant, apres = baseline[name]['total']['median'], result['total']['median']
+        # Les mesures sous la milliseconde sont trop bruitées pour conclure
+        if apres > max(avant, 1.0) * (1 + seuil):
+            regressions += 1
+            print(f"REGRESSION {name}: {avant:.2f} ms -> {apres:.2f} ms")
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark des chargements de l'interface")
+    parser.add_argument('db', help="base générée par generate_data.py")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--samples', type=int, default=3, help="formations et étudiants mesurés")
+    parser.add_argument('--baseline', help="résultats JSON d'un run précédent")
+    parser.add_argument('--seuil', type=float, default=0.2, help="ralentissement toléré (0.2 = +20%%)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} introuvable (voir generate_data.py)")
+
+    db = DatabaseManager(args.db)
+    bench = Benchmark(db, args.repeat)
+    try:
+        bench.run(args.samples)
+        rapport = {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'counts': counts(db),
+            'results': bench.results,
+        }
+    finally:
+        db.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {args.output}")
+
+    if args.baseline and compare(bench.results, args.baseline, args.seuil):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
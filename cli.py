@@ -0,0 +1,131 @@
+"""Traitements par lots en ligne de commande, sans interface graphique.
+
+Imports en masse, recalcul des moyennes, exports (CSV, XLSX, JSON Lines),
+bulletins d'une formation, archivage d'une année et purge des orphelins.
+Seuls les bulletins PDF chargent Qt (rendu du document) ; les autres
+commandes n'importent que core.py et démarrent sans PyQt6.
+
+Usage : python cli.py [--db base.db] commande ...
+    importer {etudiants,inscriptions,notes} fichier.csv|fichier.xlsx
+    moyennes
+    exporter {etudiants,notes,resultats} fichier.csv|.xlsx|.jsonl [--formation ID] [--format F]
+    bulletins FORMATION dossier [--annee N] [--semestre N] [--format pdf|html] [--processus N]
+    archiver ANNEE
+    purger-orphelins
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+from core import DatabaseManager, Exporter, GestionService, bulletin_html, format_purge, libelle_annee
+
+
+def importer(service, args):
+    debut = time.perf_counter()
+    report = service.importer(args.type, args.fichier,
+                              progress=lambda lues: print(f"{lues} ligne(s) lue(s)", file=sys.stderr))
+    print(f"{report} en {time.perf_counter() - debut:.1f} s")
+    for ligne, raison in report.rejets:
+        print(f"ligne {ligne} : {raison}")
+    return 1 if report.rejets else 0
+
+
+def moyennes(service, args):
+    ecarts = service.recalculer_moyennes()
+    print(f"Cache des moyennes reconstruit : {ecarts} ligne(s) incohérente(s) corrigée(s)")
+    return 0
+
+
+def exporter(service, args):
+    debut = time.perf_counter()
+    exporter = Exporter(service, progress=lambda nb: print(f"{nb} ligne(s) écrite(s)", file=sys.stderr))
+    nb = exporter.export(args.type, args.fichier, args.formation, args.format)
+    print(f"{nb} ligne(s) exportée(s) dans {args.fichier} en {time.perf_counter() - debut:.1f} s")
+    return 0
+
+
+def bulletins(service, args):
+    if args.format == 'pdf':
+        # Rendu par QTextDocument : seule commande qui charge Qt
+        from main import BulletinBatch
+        batch = BulletinBatch(service.db_manager, args.formation, args.dossier, args.annee, args.semestre,
+                              processes=args.processus)
+        generes, deja_faits = batch.run()
+        print(f"{generes} bulletin(s) généré(s), {deja_faits} déjà présent(s) dans {args.dossier}")
+        return 0
+
+    os.makedirs(args.dossier, exist_ok=True)
+    nb = 0
+    for info, notes, moyenne in service.bulletins_formation(args.formation, args.annee, args.semestre):
+        path = os.path.join(args.dossier, "bulletin_" + re.sub(r'[^\w.-]', '_', str(info[0])) + ".html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("<!DOCTYPE html><html><head><meta charset='utf-8'></head><body>"
+                    + bulletin_html(info, notes, moyenne, entete=True) + "</body></html>")
+        nb += 1
+    print(f"{nb} bulletin(s) écrit(s) dans {args.dossier}")
+    return 0
+
+
+def archiver(service, args):
+    counts = service.db_manager.archiver_annee(args.annee)
+    print(f"{libelle_annee(args.annee)} : {counts['inscriptions']} inscription(s) et {counts['notes']} note(s) "
+          f"archivées dans {service.db_manager.archive_path(args.annee)}")
+    return 0
+
+
+def purger_orphelins(service, args):
+    print(format_purge(*service.db_manager.purge_orphans()))
+    return 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Traitements par lots de la gestion des étudiants")
+    parser.add_argument('--db', default="gestion_etudiants.db", help="fichier de base de données")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    p = commandes.add_parser('importer', help="import en masse d'un CSV ou d'un XLSX")
+    p.add_argument('type', choices=('etudiants', 'inscriptions', 'notes'))
+    p.add_argument('fichier')
+    p.set_defaults(action=importer)
+
+    p = commandes.add_parser('moyennes', help="reconstruit le cache des moyennes")
+    p.set_defaults(action=moyennes)
+
+    p = commandes.add_parser('exporter', help="export CSV, XLSX ou JSON Lines, écrit au fil de la lecture")
+    p.add_argument('type', choices=tuple(GestionService.EXPORTS))
+    p.add_argument('fichier')
+    p.add_argument('--formation', type=int, help="limite l'export aux inscrits de la formation")
+    p.add_argument('--format', choices=Exporter.FORMATS, help="par défaut : extension du fichier")
+    p.set_defaults(action=exporter)
+
+    p = commandes.add_parser('bulletins', help="bulletins des inscrits d'une formation")
+    p.add_argument('formation', type=int)
+    p.add_argument('dossier')
+    p.add_argument('--annee', type=int, help="année d'étude")
+    p.add_argument('--semestre', type=int)
+    p.add_argument('--format', choices=('pdf', 'html'), default='pdf')
+    p.add_argument('--processus', type=int, help="processus de rendu PDF (défaut : nombre de cœurs)")
+    p.set_defaults(action=bulletins)
+
+    p = commandes.add_parser('archiver', help="archive une année académique close")
+    p.add_argument('annee', type=int, help="année de la rentrée (2023 pour 2023-2024)")
+    p.set_defaults(action=archiver)
+
+    p = commandes.add_parser('purger-orphelins', help="supprime les lignes orphelines et compacte la base")
+    p.set_defaults(action=purger_orphelins)
+
+    args = parser.parse_args(argv)
+    db = DatabaseManager(args.db)
+    try:
+        return args.action(GestionService(db), args)
+    except ValueError as e:
+        print(f"Erreur : {e}", file=sys.stderr)
+        return 2
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,2497 @@
+"""Couche métier de la gestion des étudiants, utilisable sans interface graphique.
+
+Accès à la base (DatabaseManager), calcul des moyennes (ResultsEngine),
+imports en masse (BulkImporter), exports (Exporter), requêtes de l'onglet
+Étudiants et assemblage des bulletins. GestionService regroupe les opérations courantes
+(inscriptions, saisie des notes, moyennes, bulletins) pour main.py et pour
+cli.py. Ce module n'importe pas PyQt6 : les traitements par lots démarrent
+vite et tournent sur un serveur sans affichage.
+"""
+import sys
+import contextlib
+import csv
+import datetime
+import io
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from logging.handlers import RotatingFileHandler
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from html import escape
+import numpy as np
+
+
+class QueryStats:
+    """Statistiques des requêtes SQL par site d'appel (méthode appelante).
+
+    Chaque requête est enregistrée avec sa durée (exécution et lecture des
+    lignes) et son nombre de lignes. Celles qui dépassent `slow_query_ms` sont
+    écrites dans le journal rotatif `slow_query_log` s'il est configuré.
+    """
+
+    # Fonctions d'infrastructure ignorées pour déterminer le site d'appel
+    INTERNAL = ('TracedCursor.', 'TracedConnection.', 'QueryStats.', 'DatabaseManager.transaction',
+                'DatabaseManager.write', 'DatabaseManager.maintenance', 'DatabaseManager._retry_busy', 'WriteQueue.')
+
+    def __init__(self, slow_query_ms=100, slow_query_log=None, max_samples=10000):
+        self.slow_query_ms = slow_query_ms
+        self.max_samples = max_samples
+        self._sites = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._logger = None
+        if slow_query_log:
+            self._logger = logging.Logger('requetes_lentes')
+            handler = RotatingFileHandler(slow_query_log, maxBytes=5 * 1024 * 1024, backupCount=3,
+                                          encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger.addHandler(handler)
+
+    @contextmanager
+    def site(self, name):
+        """Attribue à `name` les requêtes exécutées dans le bloc par le thread courant"""
+        previous = getattr(self._local, 'site', None)
+        self._local.site = name
+        try:
+            yield
+        finally:
+            self._local.site = previous
+
+    def call_site(self, skip=0):
+        """Retourne la méthode applicative à l'origine de l'appel, en ignorant `skip` appelants directs"""
+        site = getattr(self._local, 'site', None)
+        if site is not None:
+            return site
+        frame = sys._getframe(1 + skip)
+        while frame is not None:
+            code = frame.f_code
+            qualname = getattr(code, 'co_qualname', code.co_name)
+            if code.co_filename != contextlib.__file__ and not qualname.startswith(self.INTERNAL):
+                # Les fonctions internes (requêtes du worker) sont rattachées à leur méthode
+                return qualname.split('.<locals>')[0]
+            frame = frame.f_back
+        return '?'
+
+    def record(self, sql, site, duration, rows):
+        duration_ms = duration * 1000
+        with self._lock:
+            entry = self._sites.get(site)
+            if entry is None:
+                entry = self._sites[site] = {'durees': deque(maxlen=self.max_samples), 'nb': 0,
+                                             'total': 0.0, 'lignes': 0}
+            entry['durees'].append(duration_ms)
+            entry['nb'] += 1
+            entry['total'] += duration_ms
+            entry['lignes'] += rows
+        if self._logger is not None and duration_ms >= self.slow_query_ms:
+            self._logger.warning("%.1f ms %d ligne(s) %s : %s", duration_ms, rows, site, ' '.join(sql.split()))
+
+    def summary(self):
+        """Retourne par site : nombre, p50/p95/p99/max (ms), temps total et lignes, du plus coûteux au moins coûteux"""
+        with self._lock:
+            sites = [(site, list(entry['durees']), entry['nb'], entry['total'], entry['lignes'])
+                     for site, entry in self._sites.items()]
+        result = []
+        for site, durees, nb, total, lignes in sites:
+            p50, p95, p99 = np.percentile(durees, [50, 95, 99])
+            result.append({'site': site, 'nb': nb, 'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                           'max': max(durees), 'total': total, 'lignes': lignes})
+        result.sort(key=lambda row: row['total'], reverse=True)
+        return result
+
+    def format_summary(self):
+        lines = [f"{'Site':55s} {'Nb':>7s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s} {'total':>10s} {'lignes':>9s}"]
+        for row in self.summary():
+            lines.append(f"{row['site'][:55]:55s} {row['nb']:7d} {row['p50']:9.2f} {row['p95']:9.2f} "
+                         f"{row['p99']:9.2f} {row['max']:9.2f} {row['total']:10.1f} {row['lignes']:9d}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
+
+class TracedCursor(sqlite3.Cursor):
+    """Curseur qui chronomètre chaque requête, lecture des lignes comprise.
+
+    La mesure d'un SELECT se termine quand toutes ses lignes ont été lues,
+    à la requête suivante sur le curseur ou à sa fermeture. `site` force le
+    site d'appel attribué aux requêtes du curseur.
+    """
+    _trace = None
+    site = None
+
+    def _begin(self, sql):
+        self._finish()
+        self._trace = [sql, self.site or self.connection.stats.call_site(), 0.0, 0]
+
+    def _finish(self):
+        trace = self._trace
+        if trace is not None:
+            self._trace = None
+            self.connection.stats.record(*trace)
+
+    def _timed(self, method, *args):
+        debut = time.perf_counter()
+        try:
+            return method(*args)
+        except BaseException:
+            self._finish()
+            raise
+        finally:
+            if self._trace is not None:
+                self._trace[2] += time.perf_counter() - debut
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._trace[3] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql)
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._trace[3] = max(self.rowcount, 0)
+        self._finish()
+        return self
+
+    def executescript(self, sql_script):
+        self._begin(sql_script)
+        self._timed(super().executescript, sql_script)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if self._trace is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._trace[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if self._trace is not None:
+            self._trace[3] += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._trace is not None:
+            self._trace[3] += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+class TracedConnection(sqlite3.Connection):
+    """Connexion dont tous les curseurs sont des TracedCursor reliés à `stats`"""
+    stats = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def is_busy(error):
+    """Indique si l'erreur vient d'un verrou tenu par une autre connexion (SQLITE_BUSY, SQLITE_LOCKED)"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error)
+
+def annee_academique_courante(date=None):
+    """Année académique en cours, désignée par l'année de sa rentrée (septembre)"""
+    date = date or datetime.date.today()
+    return date.year if date.month >= 9 else date.year - 1
+
+def libelle_annee(annee):
+    """Libellé d'une année académique : 2024 -> '2024-2025'"""
+    return f"{annee}-{annee + 1}"
+
+class DatabaseManager:
+    # Pragmas appliqués à chaque connexion ouverte (surchargeables via `pragmas`)
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # 64 Mo de cache de pages
+        'mmap_size': 268435456,  # 256 Mo
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,  # ms
+        'foreign_keys': 'ON',  # suppressions en cascade (ON DELETE CASCADE)
+    }
+
+    # Migrations du schéma (description, méthode), appliquées dans l'ordre ; PRAGMA user_version
+    # vaut le nombre de migrations déjà appliquées. Les six premières sont idempotentes : elles
+    # mettent à niveau les bases créées avant la numérotation (user_version = 0).
+    # Toute évolution du schéma s'ajoute à la fin de cette liste, sans modifier les précédentes.
+    MIGRATIONS = (
+        ("création des tables", '_create_tables'),
+        ("clés étrangères en cascade", '_migrate_foreign_keys'),
+        ("fusion des notes en double", '_merge_duplicate_notes'),
+        ("création des index", '_create_indexes'),
+        ("cache des moyennes", '_create_moyennes_cache'),
+        ("index de recherche", '_create_search_index'),
+        ("années académiques et archives", '_create_annees_academiques'),
+        ("une note par année académique", '_unique_notes_par_annee'),
+        ("dernière note d'une matière repassée", '_notes_retenues'),
+    )
+
+    def __init__(self, db_name="gestion_etudiants.db", pragmas=None, slow_query_ms=100, slow_query_log=None,
+                 migration_progress=None):
+        self.db_name = db_name
+        self.pragmas = dict(self.DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        # migration_progress(numéro, total, description) : appelé à chaque migration, puis
+        # régulièrement pendant les requêtes longues (construction d'index sur une grosse base)
+        self.migration_progress = migration_progress
+        self.query_stats = QueryStats(slow_query_ms, slow_query_log)
+        self._local = threading.local()
+        self._connections = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.write_queue = None
+        # Statistiques de cohorte en cache, invalidées par les notifications de modification
+        self.cohort_stats = CohortStatistics(self)
+        self.init_database()
+
+    def schema_version(self):
+        """Retourne le nombre de migrations appliquées à la base (PRAGMA user_version)"""
+        return self.get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+    def init_database(self):
+        """Met le schéma à jour : applique en une transaction les migrations en attente.
+
+        Une base déjà à jour ne coûte que la lecture de user_version. Retourne
+        le nombre de migrations appliquées.
+        """
+        if self.schema_version() >= len(self.MIGRATIONS):
+            return 0
+        conn = self.get_connection()
+        # foreign_keys ne peut pas changer dans une transaction, et doit être
+        # désactivé pendant la copie des tables (DROP TABLE déclencherait les cascades)
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            with self.transaction() as cursor:
+                # Relu sous verrou : un autre processus a pu migrer la base entre-temps
+                cursor.execute("PRAGMA user_version")
+                version = cursor.fetchone()[0]
+                for numero in range(version + 1, len(self.MIGRATIONS) + 1):
+                    description, method = self.MIGRATIONS[numero - 1]
+                    self._migration_step(conn, numero, description)
+                    getattr(self, method)(cursor)
+                    cursor.execute(f"PRAGMA user_version = {numero}")
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.execute(f"PRAGMA foreign_keys = {self.pragmas['foreign_keys']}")
+        return max(0, len(self.MIGRATIONS) - version)
+
+    def _migration_step(self, conn, numero, description):
+        """Signale le début d'une migration à migration_progress.
+
+        Construire un index sur une grosse base prend plusieurs secondes : le
+        rappel est répété pendant l'exécution pour que l'interface reste à jour.
+        """
+        if self.migration_progress is None:
+            return
+        total = len(self.MIGRATIONS)
+        self.migration_progress(numero, total, description)
+
+        def handler():
+            self.migration_progress(numero, total, description)
+            return 0  # une valeur non nulle interromprait la requête
+
+        # Les lecteurs des autres connexions continuent pendant ce temps (WAL)
+        conn.set_progress_handler(handler, 1000000)
+
+    # Schéma des tables ; {name} permet de recréer une table sous un autre nom lors d'une migration.
+    # Supprimer une ligne supprime en cascade les lignes qui la référencent (PRAGMA foreign_keys).
+    TABLES = {
+        'departements': '''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT NOT NULL UNIQUE,
+                description TEXT
+            )
+        ''',
+        'formations': '''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT NOT NULL,
+                nb_annees INTEGER NOT NULL,
+                departement_id INTEGER,
+                FOREIGN KEY (departement_id) REFERENCES departements (id) ON DELETE CASCADE
+            )
+        ''',
+        'etudiants': '''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                matricule TEXT NOT NULL UNIQUE,
+                nom TEXT NOT NULL,
+                prenom TEXT NOT NULL,
+                email TEXT,
+                telephone TEXT
+            )
+        ''',
+        'inscriptions': '''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                etudiant_id INTEGER,
+                formation_id INTEGER,
+                annee_inscription INTEGER,
+                FOREIGN KEY (etudiant_id) REFERENCES etudiants (id) ON DELETE CASCADE,
+                FOREIGN KEY (formation_id) REFERENCES formations (id) ON DELETE CASCADE
+            )
+        ''',
+        'matieres': '''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT NOT NULL,
+                credits INTEGER NOT NULL,
+                formation_id INTEGER,
+                annee INTEGER NOT NULL,
+                semestre INTEGER NOT NULL,
+                FOREIGN KEY (formation_id) REFERENCES formations (id) ON DELETE CASCADE
+            )
+        ''',
+        'notes': '''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                etudiant_id INTEGER,
+                matiere_id INTEGER,
+                note REAL,
+                semestre INTEGER,
+                -- Année de la rentrée, comme annee_academique_courante()
+                annee_academique INTEGER DEFAULT (CAST(strftime('%Y', 'now', '-8 months') AS INTEGER)),
+                FOREIGN KEY (etudiant_id) REFERENCES etudiants (id) ON DELETE CASCADE,
+                FOREIGN KEY (matiere_id) REFERENCES matieres (id) ON DELETE CASCADE
+            )
+        ''',
+    }
+
+    # Table -> (table enfant, colonne) des lignes supprimées en cascade
+    CASCADES = {
+        'departements': (('formations', 'departement_id'),),
+        'formations': (('inscriptions', 'formation_id'), ('matieres', 'formation_id')),
+        'etudiants': (('inscriptions', 'etudiant_id'), ('notes', 'etudiant_id')),
+        'matieres': (('notes', 'matiere_id'),),
+    }
+
+    def _create_tables(self, cursor):
+        """Crée les tables si elles n'existent pas encore"""
+        for name, sql in self.TABLES.items():
+            cursor.execute(sql.format(name=name))
+
+    def _foreign_keys_migrated(self, cursor):
+        """Indique si toutes les clés étrangères existantes sont déclarées ON DELETE CASCADE"""
+        cursor.execute('''
+            SELECT COUNT(*) FROM sqlite_master m, pragma_foreign_key_list(m.name) f
+            WHERE m.type = 'table' AND f.on_delete != 'CASCADE'
+        ''')
+        return cursor.fetchone()[0] == 0
+
+    def _migrate_foreign_keys(self, cursor):
+        """Migration : recrée les tables à clés étrangères avec ON DELETE CASCADE.
+
+        SQLite ne sait pas modifier une contrainte existante : chaque table est
+        copiée dans une nouvelle puis remplacée (voir _rebuild_tables). Index et
+        triggers sont recréés par les migrations suivantes. Les orphelins déjà
+        présents sont conservés (voir purge_orphans).
+        """
+        if self._foreign_keys_migrated(cursor):
+            return
+        children = {child for references in self.CASCADES.values() for child, _ in references}
+        self._rebuild_tables(cursor, [name for name in self.TABLES if name in children])
+
+    def _rebuild_tables(self, cursor, tables):
+        """Recrée `tables` selon leur définition actuelle (TABLES) en conservant leurs lignes.
+
+        Seules les colonnes communes à l'ancienne et à la nouvelle définition
+        sont copiées ; les nouvelles prennent leur valeur par défaut. À exécuter
+        avec foreign_keys désactivé. Tous les triggers sont supprimés (ils
+        seraient invalides pendant la copie) : l'appelant les recrée, avec les
+        index des tables recréées.
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        for (trigger,) in cursor.fetchall():
+            cursor.execute(f"DROP TRIGGER {trigger}")
+        for table in tables:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+            sequence = cursor.fetchone()
+            cursor.execute(self.TABLES[table].format(name=table + '_migration'))
+            cursor.execute(f'''
+                SELECT n.name FROM pragma_table_info('{table}_migration') n
+                JOIN pragma_table_info('{table}') o ON o.name = n.name
+            ''')
+            columns = ', '.join(row[0] for row in cursor.fetchall())
+            cursor.execute(f"INSERT INTO {table}_migration ({columns}) SELECT {columns} FROM {table}")
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_migration RENAME TO {table}")
+            # AUTOINCREMENT : ne pas réattribuer les ids de lignes supprimées avant la migration
+            if sequence:
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table))
+
+    def _create_indexes(self, cursor):
+        """Crée les index secondaires utilisés par les requêtes de l'application"""
+        # Notes d'un étudiant (affichage, moyennes, bulletin) : index couvrant
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notes_etudiant
+            ON notes (etudiant_id, semestre, matiere_id, note)
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_matiere ON notes (matiere_id)")
+        # Une seule note par étudiant, matière et semestre (cible de NOTES_UPSERT)
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_unique
+            ON notes (etudiant_id, matiere_id, semestre)
+        ''')
+
+        # Étudiants inscrits à une formation, et formations d'un étudiant
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_inscriptions_formation
+            ON inscriptions (formation_id, etudiant_id)
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inscriptions_etudiant ON inscriptions (etudiant_id)")
+
+        # Matières d'une formation, triées par année puis nom
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_matieres_formation
+            ON matieres (formation_id, annee, nom)
+        ''')
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_formations_departement ON formations (departement_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_etudiants_nom ON etudiants (nom, prenom)")
+
+        # Tris et filtres de l'onglet Étudiants, insensibles à la casse
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_etudiants_nom_nocase
+            ON etudiants (nom COLLATE NOCASE, prenom COLLATE NOCASE)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_etudiants_prenom_nocase
+            ON etudiants (prenom COLLATE NOCASE, nom COLLATE NOCASE)
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_etudiants_email_nocase ON etudiants (email COLLATE NOCASE)")
+
+        # Archivage d'une année académique close (idx_notes_annee : voir _create_annees_academiques)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inscriptions_annee ON inscriptions (annee_inscription)")
+
+    def _merge_duplicate_notes(self, cursor):
+        """Migration : ne garde que la dernière note saisie pour chaque (étudiant, matière, semestre)"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_notes_unique'")
+        if cursor.fetchone():
+            return 0
+        cursor.execute('''
+            DELETE FROM notes
+            WHERE id NOT IN (SELECT MAX(id) FROM notes GROUP BY etudiant_id, matiere_id, semestre)
+        ''')
+        return cursor.rowcount
+
+    def _unique_notes_par_annee(self, cursor):
+        """Migration : une note par étudiant, matière, semestre et année académique.
+
+        Une matière repassée l'année suivante reçoit une nouvelle note au lieu
+        d'écraser celle de l'année précédente, qui reste archivable avec elle.
+        """
+        cursor.execute("DROP INDEX IF EXISTS idx_notes_unique")
+        cursor.execute('''
+            CREATE UNIQUE INDEX idx_notes_unique
+            ON notes (etudiant_id, matiere_id, semestre, annee_academique)
+        ''')
+
+    # Insertion ou remplacement de notes (etudiant_id, matiere_id, note, semestre) de l'année en cours
+    NOTES_UPSERT = '''
+        INSERT INTO notes (etudiant_id, matiere_id, note, semestre) VALUES {values}
+        ON CONFLICT (etudiant_id, matiere_id, semestre, annee_academique) DO UPDATE SET note = excluded.note
+        RETURNING id
+    '''
+    NOTES_UPSERT_BATCH = 250
+
+    def upsert_notes(self, cursor, notes):
+        """Enregistre des notes (etudiant_id, matiere_id, note, semestre) et retourne leurs ids.
+
+        Une note existant déjà pour le même étudiant, la même matière, le
+        même semestre et l'année en cours est remplacée. Chaque paquet de
+        NOTES_UPSERT_BATCH notes est écrit en une seule requête.
+        """
+        ids = []
+        for i in range(0, len(notes), self.NOTES_UPSERT_BATCH):
+            batch = notes[i:i + self.NOTES_UPSERT_BATCH]
+            cursor.execute(self.NOTES_UPSERT.format(values=', '.join(['(?, ?, ?, ?)'] * len(batch))),
+                           [value for note in batch for value in note])
+            ids.extend(row[0] for row in cursor.fetchall())
+        # Insertions et mises à jour confondues : les vues recomptent leurs lignes
+        self.notify_change('notes', 'insert', ids)
+        return ids
+
+    def inscrire(self, cursor, formation_id, etudiant_ids, annee):
+        """Inscrit des étudiants à une formation et retourne le nombre d'inscriptions créées.
+
+        Une inscription par étudiant, formation et année (comme BulkImporter.import_inscriptions) :
+        les étudiants déjà inscrits à la formation cette année-là (ou cités deux fois) sont ignorés.
+        """
+        # Une seule requête pour toute la liste : RETURNING donne les ids à notifier
+        cursor.execute('''
+            INSERT INTO inscriptions (etudiant_id, formation_id, annee_inscription)
+            SELECT DISTINCT e.value, ?, ? FROM json_each(?) e
+            WHERE NOT EXISTS (
+                SELECT 1 FROM inscriptions
+                WHERE formation_id = ? AND etudiant_id = e.value AND annee_inscription = ?
+            )
+            RETURNING id
+        ''', (formation_id, annee, json.dumps(list(etudiant_ids)), formation_id, annee))
+        ids = [row[0] for row in cursor.fetchall()]
+        self.notify_change('inscriptions', 'insert', ids)
+        return len(ids)
+
+    def desinscrire(self, cursor, formation_id, etudiant_ids):
+        """Désinscrit des étudiants d'une formation et retourne le nombre d'inscriptions supprimées"""
+        # Une seule requête pour toute la liste : RETURNING donne les ids à notifier
+        cursor.execute('''
+            DELETE FROM inscriptions
+            WHERE formation_id = ? AND etudiant_id IN (SELECT value FROM json_each(?))
+            RETURNING id
+        ''', (formation_id, json.dumps(list(etudiant_ids))))
+        ids = [row[0] for row in cursor.fetchall()]
+        self.notify_change('inscriptions', 'delete', ids)
+        return len(ids)
+
+    def supprimer(self, cursor, table, ids):
+        """Supprime des lignes de `table` et, en cascade, celles qui en dépendent.
+
+        Une seule requête pour toute la liste ; la cascade est faite par SQLite
+        (ON DELETE CASCADE). Retourne {table: nombre de lignes supprimées}.
+        """
+        ids = list(ids)
+        counts = {}
+        self._notify_cascade(cursor, table, ids, counts)
+        cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+        return counts
+
+    def _notify_cascade(self, cursor, table, ids, counts):
+        """Notifie la suppression des lignes `ids` de `table` et de celles qui les référencent"""
+        if not ids:
+            return
+        counts[table] = counts.get(table, 0) + len(ids)
+        self.notify_change(table, 'delete', ids)
+        for child, column in self.CASCADES.get(table, ()):
+            cursor.execute(f"SELECT id FROM {child} WHERE {column} IN (SELECT value FROM json_each(?))",
+                           (json.dumps(ids),))
+            self._notify_cascade(cursor, child, [row[0] for row in cursor.fetchall()], counts)
+
+    def purge_orphans(self):
+        """Supprime les lignes dont une clé étrangère ne référence plus rien, puis compacte la base.
+
+        Les orphelins sont ceux que signale PRAGMA foreign_key_check (suppressions
+        faites avant l'activation des clés étrangères) ; leurs dépendances
+        partent en cascade. Retourne ({table: lignes supprimées}, octets récupérés).
+        """
+        conn = self.get_connection()
+        taille_avant = self._database_size(conn)
+
+        def purger(cursor):
+            counts = {}
+            # Dans l'ordre des dépendances : une formation orpheline emporte ses matières
+            for table in self.TABLES:
+                cursor.execute(f"SELECT DISTINCT rowid FROM pragma_foreign_key_check('{table}')")
+                orphans = [row[0] for row in cursor.fetchall()]
+                for name, count in self.supprimer(cursor, table, orphans).items():
+                    counts[name] = counts.get(name, 0) + count
+            return counts
+
+        counts = self.write(purger)
+        if counts:
+            # Les pages libérées ne sont rendues au système que par VACUUM
+            self.maintenance(lambda writer: writer.execute("VACUUM"))
+        return counts, taille_avant - self._database_size(conn)
+
+    @staticmethod
+    def _database_size(conn):
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def _notes_retenues(self, cursor):
+        """Migration : seule la note la plus récente d'une matière repassée compte.
+
+        La vue notes_retenues écarte les notes remplacées par celle d'une année
+        académique plus récente (même étudiant, matière et semestre) ; moyennes,
+        statistiques et bulletins la lisent. Les triggers du cache sont recréés
+        selon la même règle et le cache est recalculé.
+        """
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS notes_retenues AS
+            SELECT * FROM notes n
+            WHERE NOT EXISTS (
+                SELECT 1 FROM notes r
+                WHERE r.etudiant_id = n.etudiant_id AND r.matiere_id = n.matiere_id
+                AND r.semestre IS n.semestre AND (r.annee_academique, r.id) > (n.annee_academique, n.id)
+            )
+        ''')
+        for trigger in ('notes_cache_insert', 'notes_cache_delete', 'notes_cache_update',
+                        'matieres_cache_update', 'matieres_cache_before_delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_{trigger}")
+        self._create_moyennes_cache(cursor)
+        cursor.execute("DELETE FROM moyennes_cache")
+        cursor.execute(f"INSERT INTO moyennes_cache {self.MOYENNES_CACHE_SELECT}")
+
+    # Agrégats par (étudiant, année, semestre) recalculés depuis les notes retenues
+    MOYENNES_CACHE_SELECT = '''
+        SELECT n.etudiant_id, m.annee, IFNULL(n.semestre, 0),
+               SUM(n.note), SUM(n.note * m.credits), SUM(m.credits), COUNT(*)
+        FROM notes_retenues n
+        JOIN matieres m ON m.id = n.matiere_id
+        WHERE n.etudiant_id IS NOT NULL AND n.note IS NOT NULL
+        GROUP BY n.etudiant_id, m.annee, IFNULL(n.semestre, 0)
+    '''
+
+    def _create_moyennes_cache(self, cursor):
+        """Crée la table des agrégats de notes et les triggers qui la maintiennent.
+
+        Chaque ligne de moyennes_cache cumule, pour un étudiant, une année et un
+        semestre, la somme des notes, la somme pondérée par les crédits, le
+        total des crédits et le nombre de notes retenues (voir _notes_retenues).
+        Les triggers la mettent à jour à chaque écriture sur notes ou matieres :
+        lire une moyenne ne coûte plus que quelques lignes, quel que soit le
+        nombre de notes. Le cache est rempli par la migration _notes_retenues.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moyennes_cache (
+                etudiant_id INTEGER NOT NULL,
+                annee INTEGER NOT NULL,
+                semestre INTEGER NOT NULL,
+                somme_notes REAL NOT NULL,
+                somme_ponderee REAL NOT NULL,
+                total_credits INTEGER NOT NULL,
+                nb_notes INTEGER NOT NULL,
+                PRIMARY KEY (etudiant_id, annee, semestre)
+            ) WITHOUT ROWID
+        ''')
+
+        upsert = '''
+            ON CONFLICT (etudiant_id, annee, semestre) DO UPDATE SET
+                somme_notes = somme_notes + excluded.somme_notes,
+                somme_ponderee = somme_ponderee + excluded.somme_ponderee,
+                total_credits = total_credits + excluded.total_credits,
+                nb_notes = nb_notes + excluded.nb_notes
+        '''
+        # Une mise à jour retire OLD puis ajoute NEW. Les deux étapes ne regardent que les autres
+        # notes de la même matière (id différent), identiques avant et après l'écriture : la plus
+        # récente d'entre elles est la note `p` que NEW remplace, ou qui compte de nouveau sans OLD.
+        newer = '''
+            EXISTS (
+                SELECT 1 FROM notes r
+                WHERE r.etudiant_id = {ref}.etudiant_id AND r.matiere_id = {ref}.matiere_id
+                AND r.semestre IS {ref}.semestre AND r.id != {ref}.id
+                AND (r.annee_academique, r.id) > ({ref}.annee_academique, {ref}.id)
+            )
+        '''
+        previous = '''
+            (SELECT * FROM notes
+             WHERE etudiant_id = {ref}.etudiant_id AND matiere_id = {ref}.matiere_id
+             AND semestre IS {ref}.semestre AND id != {ref}.id
+             ORDER BY annee_academique DESC, id DESC LIMIT 1) AS p
+            JOIN matieres m ON m.id = p.matiere_id
+        '''
+        add_new = f'''
+            UPDATE moyennes_cache SET
+                somme_notes = somme_notes - p.note,
+                somme_ponderee = somme_ponderee - p.note * m.credits,
+                total_credits = total_credits - m.credits,
+                nb_notes = nb_notes - 1
+            FROM {previous.format(ref='NEW')}
+            WHERE p.note IS NOT NULL AND (p.annee_academique, p.id) < (NEW.annee_academique, NEW.id)
+            AND moyennes_cache.etudiant_id = p.etudiant_id
+            AND moyennes_cache.annee = m.annee
+            AND moyennes_cache.semestre = IFNULL(p.semestre, 0);
+            INSERT INTO moyennes_cache
+            SELECT NEW.etudiant_id, m.annee, IFNULL(NEW.semestre, 0),
+                   NEW.note, NEW.note * m.credits, m.credits, 1
+            FROM matieres m
+            WHERE m.id = NEW.matiere_id AND NEW.etudiant_id IS NOT NULL AND NEW.note IS NOT NULL
+            AND NOT {newer.format(ref='NEW')}
+            {upsert};
+            DELETE FROM moyennes_cache WHERE etudiant_id = NEW.etudiant_id AND nb_notes <= 0;
+        '''
+        remove_old = f'''
+            UPDATE moyennes_cache SET
+                somme_notes = somme_notes - OLD.note,
+                somme_ponderee = somme_ponderee - OLD.note * m.credits,
+                total_credits = total_credits - m.credits,
+                nb_notes = nb_notes - 1
+            FROM matieres m
+            WHERE m.id = OLD.matiere_id AND OLD.note IS NOT NULL
+            AND NOT {newer.format(ref='OLD')}
+            AND moyennes_cache.etudiant_id = OLD.etudiant_id
+            AND moyennes_cache.annee = m.annee
+            AND moyennes_cache.semestre = IFNULL(OLD.semestre, 0);
+            INSERT INTO moyennes_cache
+            SELECT p.etudiant_id, m.annee, IFNULL(p.semestre, 0), p.note, p.note * m.credits, m.credits, 1
+            FROM {previous.format(ref='OLD')}
+            WHERE p.etudiant_id IS NOT NULL AND p.note IS NOT NULL
+            AND (p.annee_academique, p.id) < (OLD.annee_academique, OLD.id)
+            {upsert};
+            DELETE FROM moyennes_cache WHERE etudiant_id = OLD.etudiant_id AND nb_notes <= 0;
+        '''
+        # Retire (ou rajoute) d'un bloc toutes les notes retenues d'une matière
+        matiere_notes = '''
+            SELECT etudiant_id, IFNULL(semestre, 0) AS semestre, SUM(note) AS somme, COUNT(*) AS nb
+            FROM notes_retenues
+            WHERE matiere_id = {ref}.id AND etudiant_id IS NOT NULL AND note IS NOT NULL
+            GROUP BY etudiant_id, IFNULL(semestre, 0)
+        '''
+        remove_matiere = f'''
+            UPDATE moyennes_cache SET
+                somme_notes = somme_notes - agg.somme,
+                somme_ponderee = somme_ponderee - agg.somme * OLD.credits,
+                total_credits = total_credits - agg.nb * OLD.credits,
+                nb_notes = nb_notes - agg.nb
+            FROM ({matiere_notes.format(ref='OLD')}) AS agg
+            WHERE moyennes_cache.etudiant_id = agg.etudiant_id
+            AND moyennes_cache.annee = OLD.annee
+            AND moyennes_cache.semestre = agg.semestre;
+        '''
+        purge_matiere = '''
+            DELETE FROM moyennes_cache
+            WHERE nb_notes <= 0
+            AND etudiant_id IN (SELECT etudiant_id FROM notes WHERE matiere_id = OLD.id);
+        '''
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_notes_cache_insert AFTER INSERT ON notes
+            BEGIN
+                {add_new}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_notes_cache_delete AFTER DELETE ON notes
+            BEGIN
+                {remove_old}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_notes_cache_update
+            AFTER UPDATE OF etudiant_id, matiere_id, note, semestre, annee_academique ON notes
+            BEGIN
+                {remove_old}
+                {add_new}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_matieres_cache_update
+            AFTER UPDATE OF credits, annee ON matieres
+            BEGIN
+                {remove_matiere}
+                INSERT INTO moyennes_cache
+                SELECT agg.etudiant_id, NEW.annee, agg.semestre,
+                       agg.somme, agg.somme * NEW.credits, agg.nb * NEW.credits, agg.nb
+                FROM ({matiere_notes.format(ref='NEW')}) AS agg
+                WHERE true
+                {upsert};
+                {purge_matiere}
+            END
+        ''')
+        # Les notes d'une matière supprimée disparaissent en cascade après elle, quand le
+        # trigger des notes ne trouve plus la matière : on les retire avant la suppression
+        cursor.execute("DROP TRIGGER IF EXISTS trg_matieres_cache_delete")
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_matieres_cache_before_delete BEFORE DELETE ON matieres
+            BEGIN
+                {remove_matiere}
+                {purge_matiere}
+            END
+        ''')
+
+    def _create_search_index(self, cursor):
+        """Crée l'index plein texte des étudiants (FTS5) et les triggers qui le synchronisent"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'etudiants_fts'")
+        exists = cursor.fetchone() is not None
+
+        # Table à contenu externe : seul l'index est stocké, les valeurs restent dans etudiants
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS etudiants_fts USING fts5(
+                matricule, nom, prenom, email,
+                content='etudiants', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_etudiants_fts_insert AFTER INSERT ON etudiants
+            BEGIN
+                INSERT INTO etudiants_fts (rowid, matricule, nom, prenom, email)
+                VALUES (NEW.id, NEW.matricule, NEW.nom, NEW.prenom, NEW.email);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_etudiants_fts_delete AFTER DELETE ON etudiants
+            BEGIN
+                INSERT INTO etudiants_fts (etudiants_fts, rowid, matricule, nom, prenom, email)
+                VALUES ('delete', OLD.id, OLD.matricule, OLD.nom, OLD.prenom, OLD.email);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_etudiants_fts_update
+            AFTER UPDATE OF matricule, nom, prenom, email ON etudiants
+            BEGIN
+                INSERT INTO etudiants_fts (etudiants_fts, rowid, matricule, nom, prenom, email)
+                VALUES ('delete', OLD.id, OLD.matricule, OLD.nom, OLD.prenom, OLD.email);
+                INSERT INTO etudiants_fts (rowid, matricule, nom, prenom, email)
+                VALUES (NEW.id, NEW.matricule, NEW.nom, NEW.prenom, NEW.email);
+            END
+        ''')
+
+        if not exists:
+            cursor.execute("INSERT INTO etudiants_fts (etudiants_fts) VALUES ('rebuild')")
+
+    def _create_annees_academiques(self, cursor):
+        """Migration : année académique des notes et registre des années archivées.
+
+        Les notes existantes reçoivent l'année de la dernière inscription de
+        l'étudiant à la formation de la matière, à défaut l'année en cours.
+        """
+        cursor.execute("SELECT 1 FROM pragma_table_info('notes') WHERE name = 'annee_academique'")
+        if cursor.fetchone() is None:
+            # ALTER TABLE ADD COLUMN refuse une valeur par défaut non constante
+            self._rebuild_tables(cursor, ['notes'])
+            cursor.execute('''
+                UPDATE notes SET annee_academique = IFNULL((
+                    SELECT MAX(i.annee_inscription)
+                    FROM matieres m
+                    JOIN inscriptions i ON i.formation_id = m.formation_id AND i.etudiant_id = notes.etudiant_id
+                    WHERE m.id = notes.matiere_id
+                ), annee_academique)
+            ''')
+            # Triggers supprimés par _rebuild_tables (le cache des moyennes est resté juste)
+            self._create_moyennes_cache(cursor)
+            self._create_search_index(cursor)
+        self._create_indexes(cursor)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_annee ON notes (annee_academique)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archives (
+                annee INTEGER PRIMARY KEY,
+                fichier TEXT NOT NULL,
+                inscriptions INTEGER NOT NULL,
+                notes INTEGER NOT NULL,
+                date_archivage TEXT NOT NULL
+            )
+        ''')
+
+    # Tables dont les lignes d'une année close partent dans l'archive de l'année -> colonne de l'année
+    ARCHIVE_TABLES = {'inscriptions': 'annee_inscription', 'notes': 'annee_academique'}
+
+    def archive_path(self, annee):
+        """Fichier d'archive d'une année académique, à côté de la base courante"""
+        if self.db_name == ':memory:':
+            raise ValueError("une base en mémoire ne peut pas être archivée")
+        base, ext = os.path.splitext(self.db_name)
+        return f"{base}_{annee}{ext or '.db'}"
+
+    def annees_archivables(self):
+        """Années académiques closes ayant encore des inscriptions ou des notes dans la base courante"""
+        cursor = self.get_connection().cursor()
+        annees = set()
+        for table, colonne in self.ARCHIVE_TABLES.items():
+            cursor.execute(f"SELECT DISTINCT {colonne} FROM {table} WHERE {colonne} < ?",
+                           (annee_academique_courante(),))
+            annees.update(row[0] for row in cursor.fetchall())
+        return sorted(annees)
+
+    def _archive_table_sql(self, table):
+        """Définition de `table` dans une archive : sans clés étrangères (les parents restent ici)"""
+        sql = re.sub(r'\n\s*FOREIGN KEY[^\n]*', '', self.TABLES[table])
+        return re.sub(r',(\s*\)\s*)$', r'\1', sql)
+
+    @staticmethod
+    def _attach(conn, annee, path):
+        """ATTACHe l'archive de `annee` si elle ne l'est pas déjà ; retourne le nom de son schéma"""
+        schema = f"archive_{annee}"
+        if conn.execute("SELECT 1 FROM pragma_database_list WHERE name = ?", (schema,)).fetchone() is None:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        return schema
+
+    @staticmethod
+    def attach_archives(conn):
+        """ATTACHe les archives et crée les vues historique_notes et historique_inscriptions.
+
+        Les vues (TEMP, propres à la connexion) réunissent la base courante et
+        toutes les années archivées : les requêtes qui ont besoin de tout
+        l'historique les lisent à la place des tables. À appeler hors
+        transaction ; SQLite limite à 10 le nombre de bases attachées.
+        """
+        main_file = conn.execute("SELECT file FROM pragma_database_list WHERE name = 'main'").fetchone()[0]
+        dossier = os.path.dirname(main_file)
+        schemas = ['main']
+        for annee, fichier in conn.execute("SELECT annee, fichier FROM main.archives ORDER BY annee").fetchall():
+            schemas.append(DatabaseManager._attach(conn, annee, os.path.join(dossier, fichier)))
+        if getattr(conn, 'archive_schemas', None) == schemas:
+            return
+        for table in DatabaseManager.ARCHIVE_TABLES:
+            columns = ', '.join(row[0] for row in conn.execute(f"SELECT name FROM pragma_table_info('{table}')"))
+            conn.execute(f"DROP VIEW IF EXISTS temp.historique_{table}")
+            conn.execute(f"CREATE TEMP VIEW historique_{table} AS "
+                         + ' UNION ALL '.join(f"SELECT {columns} FROM {schema}.{table}" for schema in schemas))
+        conn.archive_schemas = schemas
+
+    def archiver_annee(self, annee):
+        """Déplace les inscriptions et les notes d'une année académique close dans son archive.
+
+        Les lignes sont copiées dans le fichier archive_path(annee), ATTACHé à la
+        connexion, puis supprimées de la base courante en une transaction. En
+        WAL, SQLite ne garantit pas l'atomicité entre deux fichiers : après une
+        interruption, relancer l'archivage termine le travail (les lignes déjà
+        copiées sont remplacées). Retourne {table: lignes archivées}.
+        """
+        if annee >= annee_academique_courante():
+            raise ValueError(f"l'année {libelle_annee(annee)} n'est pas close")
+        path = self.archive_path(annee)
+        # ATTACH est refusé dans une transaction : fait à part, sur la connexion qui écrira
+        schema = self.maintenance(lambda writer: self._attach(writer, annee, path))
+
+        def archiver(cursor):
+            counts = {}
+            for table, colonne in self.ARCHIVE_TABLES.items():
+                cursor.execute(self._archive_table_sql(table).format(name=f"{schema}.{table}"))
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_etudiant ON {table} (etudiant_id)")
+                cursor.execute(f"SELECT name FROM pragma_table_info('{table}', 'main')")
+                columns = ', '.join(row[0] for row in cursor.fetchall())
+                cursor.execute(f"INSERT OR REPLACE INTO {schema}.{table} ({columns}) "
+                               f"SELECT {columns} FROM main.{table} WHERE {colonne} = ?", (annee,))
+                cursor.execute(f"DELETE FROM main.{table} WHERE {colonne} = ? RETURNING id", (annee,))
+                ids = [row[0] for row in cursor.fetchall()]
+                self.notify_change(table, 'delete', ids)
+                counts[table] = len(ids)
+            cursor.execute('''
+                INSERT INTO archives (annee, fichier, inscriptions, notes, date_archivage)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (annee) DO UPDATE SET
+                    inscriptions = inscriptions + excluded.inscriptions,
+                    notes = notes + excluded.notes,
+                    date_archivage = excluded.date_archivage
+            ''', (annee, os.path.basename(path), counts['inscriptions'], counts['notes'],
+                  datetime.datetime.now().isoformat(timespec='seconds')))
+            return counts
+
+        counts = self.write(archiver)
+        self.attach_archives(self.get_connection())
+        return counts
+
+    def check_moyennes_cache(self):
+        """Retourne les clés (étudiant, année, semestre) dont le cache diffère d'un recalcul complet"""
+        cursor = self.get_connection().cursor()
+        cursor.execute(f'''
+            WITH attendu (etudiant_id, annee, semestre, somme_notes, somme_ponderee, total_credits, nb_notes)
+            AS ({self.MOYENNES_CACHE_SELECT})
+            SELECT a.etudiant_id, a.annee, a.semestre
+            FROM attendu a
+            LEFT JOIN moyennes_cache c
+                ON c.etudiant_id = a.etudiant_id AND c.annee = a.annee AND c.semestre = a.semestre
+            WHERE c.etudiant_id IS NULL
+               OR c.nb_notes != a.nb_notes
+               OR c.total_credits != a.total_credits
+               OR ABS(c.somme_notes - a.somme_notes) > 1e-6
+               OR ABS(c.somme_ponderee - a.somme_ponderee) > 1e-6
+            UNION ALL
+            SELECT c.etudiant_id, c.annee, c.semestre
+            FROM moyennes_cache c
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendu a
+                WHERE a.etudiant_id = c.etudiant_id AND a.annee = c.annee AND a.semestre = c.semestre
+            )
+        ''')
+        return cursor.fetchall()
+
+    def rebuild_moyennes_cache(self):
+        """Recalcule entièrement le cache des moyennes ; retourne le nombre de lignes qui étaient fausses"""
+        def reconstruire(cursor):
+            # Relu par la connexion qui écrit, dans la transaction de la reconstruction
+            ecarts = len(self.check_moyennes_cache())
+            cursor.execute("DELETE FROM moyennes_cache")
+            cursor.execute(f"INSERT INTO moyennes_cache {self.MOYENNES_CACHE_SELECT}")
+            return ecarts
+
+        return self.write(reconstruire)
+
+    def _open_connection(self):
+        """Ouvre une nouvelle connexion et lui applique les pragmas configurés"""
+        # isolation_level=None : autocommit, les transactions sont gérées par transaction()
+        # check_same_thread=False : chaque connexion reste propre à un thread, mais
+        # close() et interrupt() peuvent être appelés depuis le thread principal
+        # factory=TracedConnection : chaque requête est mesurée dans query_stats
+        conn = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False,
+                               factory=TracedConnection)
+        conn.stats = self.query_stats
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def get_connection(self):
+        """Retourne la connexion persistante du thread courant (ouverte au premier appel)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.pending = []
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """Exécute un bloc dans une transaction : commit en sortie, rollback sur exception.
+
+        Les appels imbriqués utilisent des SAVEPOINT sur la même connexion.
+        Les notifications émises pendant la transaction ne sont diffusées
+        qu'après le COMMIT, et abandonnées en cas de rollback.
+        """
+        conn = self.get_connection()
+        depth = self._local.depth
+        pending = self._local.pending
+        mark = len(pending)
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        else:
+            conn.execute(f"SAVEPOINT sp_{depth}")
+        self._local.depth = depth + 1
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        except BaseException:
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            else:
+                conn.execute(f"ROLLBACK TO sp_{depth}")
+                conn.execute(f"RELEASE sp_{depth}")
+            del pending[mark:]
+            raise
+        else:
+            if depth == 0:
+                try:
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    # COMMIT refusé (base occupée) : la transaction reste ouverte, on l'abandonne
+                    conn.execute("ROLLBACK")
+                    del pending[mark:]
+                    raise
+            else:
+                conn.execute(f"RELEASE sp_{depth}")
+        finally:
+            self._local.depth = depth
+            cursor.close()
+        if depth == 0 and pending:
+            changes = list(pending)
+            pending.clear()
+            self._dispatch(changes)
+
+    # Tentatives après SQLITE_BUSY, délai initial (doublé à chaque tentative) et délai maximal, en ms
+    BUSY_RETRIES = 8
+    BUSY_BACKOFF_MS = 10
+    BUSY_BACKOFF_MAX_MS = 1000
+
+    def _retry_busy(self, run):
+        """Appelle run() et le rejoue, avec un délai croissant, tant que la base est occupée"""
+        for tentative in itertools.count():
+            try:
+                return run()
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or tentative >= self.BUSY_RETRIES:
+                    raise
+            delai = min(self.BUSY_BACKOFF_MS * 2 ** tentative, self.BUSY_BACKOFF_MAX_MS)
+            time.sleep(delai * random.uniform(0.5, 1.0) / 1000)
+
+    def write(self, func):
+        """Exécute func(cursor) dans une transaction d'écriture et retourne son résultat.
+
+        Avec une file d'écriture (start_write_queue), l'écriture est confiée au
+        thread écrivain et l'appel rend la main quand son COMMIT est durable.
+        Sinon elle est faite dans le thread courant, rejouée si la base est
+        occupée : func ne doit modifier que la base. Dans une transaction
+        déjà ouverte, func s'exécute dans un SAVEPOINT de celle-ci.
+        """
+        if getattr(self._local, 'depth', 0):
+            with self.transaction() as cursor:
+                return func(cursor)
+        if self.write_queue is not None and not self.write_queue.in_writer():
+            return self.write_queue.submit(func).result()
+
+        def run():
+            with self.transaction() as cursor:
+                return func(cursor)
+
+        return self._retry_busy(run)
+
+    def maintenance(self, func):
+        """Exécute func(connexion) hors transaction (VACUUM, ATTACH) et retourne son résultat.
+
+        Avec une file d'écriture, func est exécutée seule par le thread
+        écrivain, sur sa connexion, après le COMMIT des écritures déjà en
+        file ; sinon dans le thread courant. Rejouée si la base est occupée.
+        """
+        if self.write_queue is not None and not self.write_queue.in_writer():
+            return self.write_queue.submit(func, transaction=False).result()
+        conn = self.get_connection()
+        return self._retry_busy(lambda: func(conn))
+
+    def start_write_queue(self, **options):
+        """Fait passer les écritures de write() par une WriteQueue (voir ses options) et la retourne"""
+        if self.write_queue is None:
+            self.write_queue = WriteQueue(self, **options)
+        return self.write_queue
+
+    def add_listener(self, callback):
+        """Abonne callback(table, type, ids) aux modifications validées"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def notify_change(self, table, kind, ids):
+        """Signale une modification ('insert', 'update' ou 'delete') des lignes `ids` de `table`.
+
+        'reset' (sans ids) signale que toute la table a pu changer : les vues
+        la relisent. Dans une transaction, la notification est différée
+        jusqu'au COMMIT.
+        """
+        change = (table, kind, list(ids))
+        if getattr(self._local, 'depth', 0):
+            self._local.pending.append(change)
+        else:
+            self._dispatch([change])
+
+    def _dispatch(self, changes):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            for table, kind, ids in changes:
+                callback(table, kind, ids)
+
+    @property
+    def service(self):
+        """GestionService opérant sur cette base"""
+        return GestionService(self)
+
+    def close(self):
+        """Ferme toutes les connexions ouvertes par ce gestionnaire"""
+        if self.write_queue is not None:
+            self.write_queue.close()
+            self.write_queue = None
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Connexion créée dans un autre thread déjà terminé
+                pass
+        self._local = threading.local()
+        self.query_stats.close()
+
+class WriteQueue:
+    """File des écritures de toute l'application, validées par lots (group commit).
+
+    Un seul thread écrit dans la base. Il prend les écritures en attente,
+    plus celles qui arrivent dans les `window_ms` suivantes (au plus
+    `max_batch`), et les exécute dans une même transaction, chacune dans son
+    SAVEPOINT : l'échec de l'une n'annule pas les autres. Un seul COMMIT,
+    donc une seule synchronisation disque, valide tout le lot. La connexion
+    de l'écrivain est en synchronous=FULL : quand le Future d'une écriture
+    reçoit son résultat, elle survivra à une coupure de courant. Si une autre
+    connexion tient le verrou (SQLITE_BUSY), le lot est rejoué avec un délai
+    croissant (DatabaseManager._retry_busy).
+    """
+
+    def __init__(self, db_manager, window_ms=2, max_batch=500, busy_timeout_ms=100):
+        self.db_manager = db_manager
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.busy_timeout_ms = busy_timeout_ms
+        # Lots validés et écritures exécutées, pour les statistiques
+        self.lots = 0
+        self.ecritures = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='ecrivain', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, site=None, transaction=True):
+        """Met func(cursor) en file et retourne un Future, résolu après le COMMIT durable de son lot.
+
+        Avec transaction=False, func(connexion) est exécutée seule, hors
+        transaction, une fois validées les écritures qui la précèdent (VACUUM,
+        ATTACH). Les requêtes de func sont attribuées à `site` dans les
+        statistiques, par défaut la méthode qui appelle submit().
+        """
+        future = Future()
+        self._queue.put((func, future, site or self.db_manager.query_stats.call_site(skip=1), transaction))
+        return future
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def close(self):
+        """Termine les écritures en file puis arrête le thread écrivain"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        conn = self.db_manager.get_connection()
+        conn.execute("PRAGMA synchronous = FULL")
+        # Attente courte de SQLite sur un verrou : les nouvelles tentatives sont faites par _retry_busy
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        arret = False
+        while not arret:
+            item = self._queue.get()
+            if item is None:
+                break
+            lot = [item]
+            fin = time.monotonic() + self.window
+            # Une opération hors transaction termine le lot : elle passe après son COMMIT
+            while len(lot) < self.max_batch and lot[-1][3]:
+                try:
+                    item = self._queue.get(timeout=max(fin - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    arret = True
+                    break
+                lot.append(item)
+            seule = None if lot[-1][3] else lot.pop()
+            self._commit([(func, future, site) for func, future, site, _ in lot
+                          if future.set_running_or_notify_cancel()])
+            if seule is not None:
+                self._hors_transaction(*seule[:3])
+
+    def _commit(self, lot):
+        if not lot:
+            return
+        stats = self.db_manager.query_stats
+
+        def run():
+            resultats = []
+            # BEGIN, SAVEPOINT et COMMIT du lot sont attribués à la file dans les statistiques
+            with stats.site('WriteQueue'), self.db_manager.transaction():
+                for func, future, site in lot:
+                    try:
+                        with stats.site(site), self.db_manager.transaction() as savepoint:
+                            resultats.append((True, func(savepoint)))
+                    except sqlite3.OperationalError as e:
+                        if is_busy(e):
+                            raise
+                        resultats.append((False, e))
+                    except Exception as e:
+                        resultats.append((False, e))
+            return resultats
+
+        try:
+            resultats = self.db_manager._retry_busy(run)
+        except Exception as e:
+            for _, future, _ in lot:
+                future.set_exception(e)
+            return
+        self.lots += 1
+        self.ecritures += len(lot)
+        for (_, future, _), (ok, valeur) in zip(lot, resultats):
+            if ok:
+                future.set_result(valeur)
+            else:
+                future.set_exception(valeur)
+
+    def _hors_transaction(self, func, future, site):
+        if not future.set_running_or_notify_cancel():
+            return
+        conn = self.db_manager.get_connection()
+        try:
+            with self.db_manager.query_stats.site(site):
+                resultat = self.db_manager._retry_busy(lambda: func(conn))
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(resultat)
+
+class CohortResults:
+    """Moyennes pondérées par les crédits d'une cohorte, calculées par ResultsEngine.
+
+    Les tableaux sont indexés par étudiant (ordre de `etudiant_ids`) puis par
+    période (`periodes`, couples (année, semestre)) ou par année (`annees`).
+    Une moyenne vaut NaN lorsque l'étudiant n'a aucune note sur la période.
+    """
+
+    def __init__(self, etudiant_ids, periodes, moyennes_semestre, annees, moyennes_annee,
+                 moyenne_generale, credits, nb_notes):
+        self.etudiant_ids = etudiant_ids
+        self.periodes = periodes
+        self.moyennes_semestre = moyennes_semestre
+        self.annees = annees
+        self.moyennes_annee = moyennes_annee
+        self.moyenne_generale = moyenne_generale
+        self.credits = credits
+        self.nb_notes = nb_notes
+        self._index = {int(etudiant_id): i for i, etudiant_id in enumerate(etudiant_ids)}
+
+    def __len__(self):
+        return len(self.etudiant_ids)
+
+    def pour_etudiant(self, etudiant_id):
+        """Retourne les résultats d'un étudiant sous la forme de ResultsEngine.moyennes_etudiant()"""
+        i = self._index.get(etudiant_id)
+        if i is None or not self.nb_notes[i]:
+            return None
+        return {
+            'moyenne_generale': float(self.moyenne_generale[i]),
+            'credits': int(self.credits[i]),
+            'nb_notes': int(self.nb_notes[i]),
+            'semestres': {(int(annee), int(semestre)): float(moyenne)
+                          for (annee, semestre), moyenne in zip(self.periodes, self.moyennes_semestre[i])
+                          if not np.isnan(moyenne)},
+            'annees': {int(annee): float(moyenne)
+                       for annee, moyenne in zip(self.annees, self.moyennes_annee[i])
+                       if not np.isnan(moyenne)},
+        }
+
+class ResultsEngine:
+    """Calcule les moyennes pondérées par les crédits (semestre, année, générale).
+
+    compute_formation() charge en une requête les notes de tous les inscrits
+    d'une formation et calcule les résultats de la cohorte en une passe NumPy ;
+    moyennes_etudiant() lit ceux d'un seul étudiant dans moyennes_cache.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def load_formation(cursor, formation_id):
+        """Retourne (ids des inscrits, notes retenues (etudiant_id, annee, semestre, note, credits))"""
+        cursor.execute("SELECT DISTINCT etudiant_id FROM inscriptions WHERE formation_id = ? ORDER BY etudiant_id",
+                       (formation_id,))
+        etudiant_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute('''
+            SELECT n.etudiant_id, m.annee, n.semestre, n.note, m.credits
+            FROM matieres m
+            JOIN notes_retenues n ON n.matiere_id = m.id
+            WHERE m.formation_id = ? AND n.note IS NOT NULL
+        ''', (formation_id,))
+        return etudiant_ids, cursor.fetchall()
+
+    def compute_formation(self, formation_id, cursor=None):
+        """Calcule les résultats de tous les inscrits d'une formation"""
+        if cursor is None:
+            cursor = self.db_manager.get_connection().cursor()
+        return self.compute(*self.load_formation(cursor, formation_id))
+
+    @staticmethod
+    def compute(etudiant_ids, notes):
+        """Calcul vectorisé à partir des lignes (etudiant_id, annee, semestre, note, credits)"""
+        ids = np.asarray(etudiant_ids, dtype=np.int64)
+        data = np.asarray(notes, dtype=np.float64).reshape(-1, 5)
+
+        # Rattacher chaque note à l'indice de son étudiant (les non-inscrits sont ignorés)
+        order = np.argsort(ids)
+        sorted_ids = ids[order]
+        pos = np.searchsorted(sorted_ids, data[:, 0])
+        pos[pos == len(ids)] = 0
+        inscrit = (sorted_ids[pos] == data[:, 0]) if len(ids) else np.zeros(len(data), dtype=bool)
+        data = data[inscrit]
+        etudiant_idx = order[pos[inscrit]]
+
+        periodes, periode_idx = np.unique(data[:, 1:3].astype(np.int64), axis=0, return_inverse=True)
+        periode_idx = periode_idx.reshape(-1)
+        nb_etudiants, nb_periodes = len(ids), len(periodes)
+
+        # Sommes pondérées et crédits par (étudiant, période) en un seul bincount
+        cellule = etudiant_idx * nb_periodes + periode_idx
+        taille = nb_etudiants * nb_periodes
+        notes_ponderees = np.bincount(cellule, weights=data[:, 3] * data[:, 4], minlength=taille)
+        credits = np.bincount(cellule, weights=data[:, 4], minlength=taille)
+        notes_ponderees = notes_ponderees.reshape(nb_etudiants, nb_periodes)
+        credits = credits.reshape(nb_etudiants, nb_periodes)
+
+        # Regroupement des périodes par année
+        annees, annee_idx = np.unique(periodes[:, 0], return_inverse=True)
+        par_annee = np.zeros((nb_periodes, len(annees)))
+        par_annee[np.arange(nb_periodes), annee_idx.reshape(-1)] = 1
+        ponderees_annee = notes_ponderees @ par_annee
+        credits_annee = credits @ par_annee
+
+        def moyenne(somme, poids):
+            return np.divide(somme, poids, out=np.full(somme.shape, np.nan), where=poids > 0)
+
+        return CohortResults(
+            etudiant_ids=ids,
+            periodes=[tuple(periode) for periode in periodes.tolist()],
+            moyennes_semestre=moyenne(notes_ponderees, credits),
+            annees=annees.tolist(),
+            moyennes_annee=moyenne(ponderees_annee, credits_annee),
+            moyenne_generale=moyenne(notes_ponderees.sum(axis=1), credits.sum(axis=1)),
+            credits=credits.sum(axis=1),
+            nb_notes=np.bincount(etudiant_idx, minlength=nb_etudiants),
+        )
+
+    @staticmethod
+    def moyennes_etudiant(cursor, etudiant_id):
+        """Résultats d'un étudiant lus dans moyennes_cache ; None s'il n'a aucune note"""
+        cursor.execute('''
+            SELECT annee, semestre, somme_ponderee, total_credits, nb_notes
+            FROM moyennes_cache
+            WHERE etudiant_id = ?
+            ORDER BY annee, semestre
+        ''', (etudiant_id,))
+        periodes = cursor.fetchall()
+        nb_notes = sum(periode[4] for periode in periodes)
+        if not nb_notes:
+            return None
+
+        def moyenne(somme, credits):
+            return somme / credits if credits else float('nan')
+
+        annees = {}
+        for annee, _, somme, credits, _ in periodes:
+            cumul = annees.setdefault(annee, [0.0, 0])
+            cumul[0] += somme
+            cumul[1] += credits
+        return {
+            'moyenne_generale': moyenne(sum(p[2] for p in periodes), sum(p[3] for p in periodes)),
+            'credits': sum(p[3] for p in periodes),
+            'nb_notes': nb_notes,
+            'semestres': {(annee, semestre): moyenne(somme, credits)
+                          for annee, semestre, somme, credits, _ in periodes},
+            'annees': {annee: moyenne(*cumul) for annee, cumul in annees.items()},
+        }
+
+class CohortStatistics:
+    """Statistiques d'une cohorte : par matière et sur les moyennes des inscrits, avec leur classement.
+
+    Les notes retenues de la formation (filtrées sur l'année d'étude et/ou le
+    semestre) sont lues en une requête et résumées en une passe NumPy :
+    moyenne, médiane, écart type, minimum, maximum, taux de réussite et
+    histogramme par tranches de 2 points. Les résultats (dict prêt pour
+    JSON) restent en cache jusqu'à la prochaine modification notifiée des
+    notes, matières, inscriptions ou étudiants.
+    """
+
+    BORNES = list(range(0, 21, 2))
+    SEUIL_REUSSITE = 10
+    TABLES = {'notes', 'matieres', 'inscriptions', 'etudiants', 'formations'}
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._cache = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        db_manager.add_listener(self._on_change)
+
+    def _on_change(self, table, kind, ids):
+        if table in self.TABLES:
+            with self._lock:
+                self._generation += 1
+                self._cache.clear()
+
+    def formation(self, formation_id, annee=None, semestre=None, cursor=None):
+        """Statistiques d'une formation, recalculées seulement si les données ont changé depuis"""
+        key = (formation_id, annee, semestre)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            generation = self._generation
+        if cursor is None:
+            cursor = self.db_manager.get_connection().cursor()
+        resultat = self.compute(*self.load(cursor, formation_id, annee, semestre))
+        resultat.update(formation_id=formation_id, annee=annee, semestre=semestre)
+        with self._lock:
+            # Une modification pendant le calcul rend le résultat douteux : il n'est pas gardé
+            if generation == self._generation:
+                self._cache[key] = resultat
+        return resultat
+
+    @staticmethod
+    def load(cursor, formation_id, annee=None, semestre=None):
+        """Retourne (inscrits (id, matricule, nom, prenom), matières (id, nom, annee, semestre, credits),
+        notes (etudiant_id, matiere_id, note, credits))"""
+        cursor.execute('''
+            SELECT id, matricule, nom, prenom FROM etudiants
+            WHERE id IN (SELECT etudiant_id FROM inscriptions WHERE formation_id = ?)
+        ''', (formation_id,))
+        etudiants = cursor.fetchall()
+        cursor.execute('''
+            SELECT id, nom, annee, semestre, credits FROM matieres
+            WHERE formation_id = ? AND (? IS NULL OR annee = ?) AND (? IS NULL OR semestre = ?)
+            ORDER BY annee, semestre, nom
+        ''', (formation_id, annee, annee, semestre, semestre))
+        matieres = cursor.fetchall()
+        cursor.execute('''
+            SELECT n.etudiant_id, n.matiere_id, n.note, m.credits
+            FROM matieres m
+            JOIN notes_retenues n ON n.matiere_id = m.id
+            WHERE m.formation_id = ? AND (? IS NULL OR m.annee = ?) AND (? IS NULL OR m.semestre = ?)
+                AND n.note IS NOT NULL
+        ''', (formation_id, annee, annee, semestre, semestre))
+        return etudiants, matieres, cursor.fetchall()
+
+    @classmethod
+    def _groupes(cls, groupe, valeurs, nb_groupes):
+        """Résumés de `valeurs` regroupées par indice de groupe (0 <= groupe < nb_groupes)"""
+        effectifs = np.bincount(groupe, minlength=nb_groupes)
+        presents = effectifs > 0
+
+        def par_groupe(poids):
+            somme = np.bincount(groupe, weights=poids, minlength=nb_groupes)
+            return np.divide(somme, effectifs, out=np.full(nb_groupes, np.nan), where=presents)
+
+        moyenne = par_groupe(valeurs)
+        variance = np.maximum(par_groupe(valeurs * valeurs) - moyenne * moyenne, 0)
+
+        # Valeurs triées par groupe : minimum, maximum et médiane lus aux positions de chaque groupe
+        ordre = np.lexsort((valeurs, groupe))
+        triees = valeurs[ordre]
+        debut = np.concatenate(([0], np.cumsum(effectifs)[:-1]))
+        fin = debut + effectifs - 1
+        minimum, maximum, mediane = (np.full(nb_groupes, np.nan) for _ in range(3))
+        minimum[presents] = triees[debut[presents]]
+        maximum[presents] = triees[fin[presents]]
+        mediane[presents] = (triees[debut[presents] + (effectifs[presents] - 1) // 2]
+                             + triees[debut[presents] + effectifs[presents] // 2]) / 2
+
+        nb_tranches = len(cls.BORNES) - 1
+        tranche = np.clip((valeurs // cls.BORNES[1]).astype(np.int64), 0, nb_tranches - 1)
+        histogrammes = np.bincount(groupe * nb_tranches + tranche,
+                                   minlength=nb_groupes * nb_tranches).reshape(nb_groupes, nb_tranches)
+        reussite = par_groupe((valeurs >= cls.SEUIL_REUSSITE).astype(np.float64))
+
+        def nombre(valeur):
+            return None if np.isnan(valeur) else float(valeur)
+
+        return [{'nb': int(effectifs[i]), 'moyenne': nombre(moyenne[i]), 'mediane': nombre(mediane[i]),
+                 'ecart_type': nombre(np.sqrt(variance[i])), 'min': nombre(minimum[i]), 'max': nombre(maximum[i]),
+                 'reussite': nombre(reussite[i]), 'histogramme': histogrammes[i].tolist()}
+                for i in range(nb_groupes)]
+
+    @classmethod
+    def compute(cls, etudiants, matieres, notes):
+        """Calcul vectorisé à partir des lignes lues par load()"""
+        etudiant_ids = np.asarray([etudiant[0] for etudiant in etudiants], dtype=np.int64)
+        matiere_ids = np.asarray([matiere[0] for matiere in matieres], dtype=np.int64)
+        data = np.asarray(notes, dtype=np.float64).reshape(-1, 4)
+
+        # Indices de l'étudiant et de la matière de chaque note (les non-inscrits sont ignorés)
+        def indices(ids, valeurs):
+            ordre = np.argsort(ids)
+            pos = np.clip(np.searchsorted(ids[ordre], valeurs), 0, max(len(ids) - 1, 0))
+            trouve = ids[ordre][pos] == valeurs if len(ids) else np.zeros(len(valeurs), dtype=bool)
+            return ordre[pos] if len(ids) else pos, trouve
+
+        etudiant_idx, inscrit = indices(etudiant_ids, data[:, 0].astype(np.int64))
+        matiere_idx, connue = indices(matiere_ids, data[:, 1].astype(np.int64))
+        garder = inscrit & connue
+        data, etudiant_idx, matiere_idx = data[garder], etudiant_idx[garder], matiere_idx[garder]
+
+        stats_matieres = cls._groupes(matiere_idx, data[:, 2], len(matieres))
+        for (matiere_id, nom, annee, semestre, credits), stats in zip(matieres, stats_matieres):
+            stats.update(matiere_id=matiere_id, nom=nom, annee=annee, semestre=semestre, credits=credits)
+
+        # Moyenne pondérée par les crédits de chaque inscrit sur les notes retenues
+        credits = np.bincount(etudiant_idx, weights=data[:, 3], minlength=len(etudiants))
+        ponderees = np.bincount(etudiant_idx, weights=data[:, 2] * data[:, 3], minlength=len(etudiants))
+        notes_etudiant = np.bincount(etudiant_idx, minlength=len(etudiants))
+        notes_presentes = (notes_etudiant > 0) & (credits > 0)
+        moyennes = np.divide(ponderees, credits, out=np.full(len(etudiants), np.nan), where=notes_presentes)
+        classes = np.flatnonzero(notes_presentes)
+        cohorte = cls._groupes(np.zeros(len(classes), dtype=np.int64), moyennes[classes], 1)[0]
+
+        # Rang : 1 + nombre de moyennes strictement supérieures (ex aequo au même rang)
+        triees = np.sort(moyennes[classes])
+        rangs = len(triees) - np.searchsorted(triees, moyennes[classes], side='right') + 1
+        classement = [[int(rang), *etudiants[i], float(moyennes[i]), int(credits[i])]
+                      for rang, i in sorted(zip(rangs.tolist(), classes.tolist()),
+                                            key=lambda rang_i: (rang_i[0], etudiants[rang_i[1]][2:4]))]
+        classement += [[None, *etudiants[i], None, 0]
+                       for i in sorted(np.flatnonzero(~notes_presentes).tolist(), key=lambda i: etudiants[i][2:4])]
+
+        return {'bornes': cls.BORNES, 'seuil': cls.SEUIL_REUSSITE, 'inscrits': len(etudiants),
+                'cohorte': cohorte, 'matieres': stats_matieres, 'classement': classement}
+
+class ImportReport:
+    """Bilan d'un import : lignes lues, insérées et rejetées (numéro de ligne, raison)"""
+
+    def __init__(self):
+        self.lues = 0
+        self.inserees = 0
+        self.rejets = []
+
+    def rejeter(self, ligne, raison):
+        self.rejets.append((ligne, raison))
+
+    def __str__(self):
+        return f"{self.lues} ligne(s) lue(s), {self.inserees} insérée(s), {len(self.rejets)} rejetée(s)"
+
+class BulkImporter:
+    """Import en masse d'étudiants, d'inscriptions et de notes depuis un CSV ou un XLSX.
+
+    Le fichier est lu en flux par blocs de `chunk_size` lignes. Chaque bloc
+    est validé en mémoire (matricules, matières, formations, doublons) puis
+    écrit dans sa propre transaction, par requêtes de BATCH lignes.
+    `progress(lignes_lues)` est appelé après chaque bloc.
+    """
+
+    # Lignes par INSERT multi-lignes (RETURNING donne les ids créés, ce que executemany ne permet pas)
+    BATCH = 250
+
+    COLONNES = {
+        'etudiants': ('matricule', 'nom', 'prenom', 'email', 'telephone'),
+        'inscriptions': ('matricule', 'formation_id', 'annee'),
+        'notes': ('matricule', 'matiere_id', 'note', 'semestre'),
+    }
+
+    def __init__(self, db_manager, chunk_size=5000, progress=None):
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._matricules = None
+
+    @staticmethod
+    def read_rows(path):
+        """Produit (numéro de ligne, dict colonne -> valeur) pour chaque ligne du fichier"""
+        if path.lower().endswith('.xlsx'):
+            from openpyxl import load_workbook
+            workbook = load_workbook(path, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = [str(col or '').strip().lower() for col in next(rows, ())]
+                for ligne, values in enumerate(rows, start=2):
+                    yield ligne, {col: ('' if value is None else str(value).strip())
+                                  for col, value in zip(header, values)}
+            finally:
+                workbook.close()
+        else:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                try:
+                    dialect = csv.Sniffer().sniff(f.read(4096), delimiters=',;\t')
+                except csv.Error:
+                    dialect = csv.excel
+                f.seek(0)
+                reader = csv.reader(f, dialect)
+                header = [col.strip().lower() for col in next(reader, [])]
+                for ligne, values in enumerate(reader, start=2):
+                    yield ligne, {col: value.strip() for col, value in zip(header, values)}
+
+    def _chunks(self, path):
+        rows = self.read_rows(path)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _matricule_ids(self):
+        """Table de correspondance matricule -> id chargée une seule fois"""
+        if self._matricules is None:
+            cursor = self.db_manager.get_connection().cursor()
+            cursor.execute("SELECT matricule, id FROM etudiants")
+            self._matricules = dict(cursor.fetchall())
+        return self._matricules
+
+    def _write_chunk(self, table, sql, params, report):
+        """Insère un bloc validé en une transaction et notifie les ids créés.
+
+        `sql` est un INSERT ... VALUES {values} ; ce peut aussi être une
+        fonction write(cursor, params) qui se charge de l'écriture et des
+        notifications.
+        """
+        if not params:
+            return
+        if callable(sql):
+            self.db_manager.write(lambda cursor: sql(cursor, params))
+            report.inserees += len(params)
+            return
+
+        ligne = '(' + ', '.join(['?'] * len(params[0])) + ')'
+
+        def ecrire(cursor):
+            ids = []
+            for i in range(0, len(params), self.BATCH):
+                batch = params[i:i + self.BATCH]
+                cursor.execute(sql.format(values=', '.join([ligne] * len(batch))) + " RETURNING id",
+                               [value for row in batch for value in row])
+                ids.extend(row[0] for row in cursor.fetchall())
+            self.db_manager.notify_change(table, 'insert', ids)
+
+        self.db_manager.write(ecrire)
+        report.inserees += len(params)
+
+    def _run(self, path, prepare, table, sql):
+        report = ImportReport()
+        for chunk in self._chunks(path):
+            params = []
+            for ligne, row in chunk:
+                report.lues += 1
+                value = prepare(row)
+                if isinstance(value, str):
+                    report.rejeter(ligne, value)
+                else:
+                    params.append(value)
+            self._write_chunk(table, sql, params, report)
+            if self.progress:
+                self.progress(report.lues)
+        return report
+
+    def import_etudiants(self, path):
+        """Importe des étudiants (matricule, nom, prenom[, email, telephone])"""
+        matricules = self._matricule_ids()
+        nouveaux = set()
+
+        def prepare(row):
+            matricule, nom, prenom = row.get('matricule'), row.get('nom'), row.get('prenom')
+            if not (matricule and nom and prenom):
+                return "matricule, nom et prénom sont obligatoires"
+            if matricule in matricules or matricule in nouveaux:
+                return f"matricule {matricule} déjà existant"
+            nouveaux.add(matricule)
+            return matricule, nom, prenom, row.get('email') or None, row.get('telephone') or None
+
+        report = self._run(path, prepare, 'etudiants',
+                           "INSERT INTO etudiants (matricule, nom, prenom, email, telephone) VALUES {values}")
+        self._matricules = None
+        return report
+
+    def import_inscriptions(self, path):
+        """Importe des inscriptions (matricule, formation_id[, annee])"""
+        matricules = self._matricule_ids()
+        cursor = self.db_manager.get_connection().cursor()
+        cursor.execute("SELECT id FROM formations")
+        formations = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT etudiant_id, formation_id, annee_inscription FROM inscriptions")
+        existantes = set(cursor.fetchall())
+        annee_courante = annee_academique_courante()
+
+        def prepare(row):
+            etudiant_id = matricules.get(row.get('matricule'))
+            if etudiant_id is None:
+                return f"matricule inconnu : {row.get('matricule')!r}"
+            try:
+                formation_id = int(row.get('formation_id'))
+                annee = int(row.get('annee') or annee_courante)
+            except (TypeError, ValueError):
+                return "formation_id ou annee invalide"
+            if formation_id not in formations:
+                return f"formation inconnue : {formation_id}"
+            key = (etudiant_id, formation_id, annee)
+            if key in existantes:
+                return "inscription déjà existante"
+            existantes.add(key)
+            return key
+
+        return self._run(path, prepare, 'inscriptions',
+                         "INSERT INTO inscriptions (etudiant_id, formation_id, annee_inscription) VALUES {values}")
+
+    def import_notes(self, path):
+        """Importe des notes (matricule, matiere_id, note[, semestre]) ; une note existante est remplacée"""
+        matricules = self._matricule_ids()
+        cursor = self.db_manager.get_connection().cursor()
+        cursor.execute("SELECT id, semestre FROM matieres")
+        matieres = dict(cursor.fetchall())
+
+        def prepare(row):
+            etudiant_id = matricules.get(row.get('matricule'))
+            if etudiant_id is None:
+                return f"matricule inconnu : {row.get('matricule')!r}"
+            try:
+                matiere_id = int(row.get('matiere_id'))
+                note = float(row.get('note').replace(',', '.'))
+            except (AttributeError, TypeError, ValueError):
+                return "matiere_id ou note invalide"
+            if matiere_id not in matieres:
+                return f"matière inconnue : {matiere_id}"
+            if not 0 <= note <= 20:
+                return f"note hors de l'intervalle 0-20 : {note}"
+            try:
+                semestre = int(row.get('semestre') or matieres[matiere_id])
+            except ValueError:
+                return "semestre invalide"
+            return etudiant_id, matiere_id, note, semestre
+
+        return self._run(path, prepare, 'notes', self.db_manager.upsert_notes)
+
+class Exporter:
+    """Écrit un export de GestionService en CSV, XLSX ou JSON Lines sans le charger en mémoire.
+
+    Les lignes sont lues par paquets de `chunk_size` et chaque paquet est
+    écrit avant la lecture du suivant : la mémoire utilisée ne dépend pas de
+    la taille de l'export (le XLSX est lui aussi écrit au fil de l'eau,
+    voir _xlsx). Le fichier est d'abord écrit sous un nom temporaire puis
+    renommé : un export interrompu ne laisse pas de fichier tronqué.
+    """
+
+    FORMATS = ('csv', 'xlsx', 'jsonl')
+    # Lignes d'une feuille Excel, en-tête compris
+    XLSX_MAX_LIGNES = 1048576
+
+    def __init__(self, service, chunk_size=5000, progress=None):
+        self.service = service
+        self.chunk_size = chunk_size
+        # progress(lignes écrites) : appelé après chaque paquet ; s'il retourne True, l'export est abandonné
+        self.progress = progress
+
+    @classmethod
+    def format_of(cls, path):
+        """Format déduit de l'extension du fichier"""
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        fmt = {'ndjson': 'jsonl', 'json': 'jsonl'}.get(extension, extension)
+        if fmt not in cls.FORMATS:
+            raise ValueError(f"format d'export inconnu : {path} (attendu : {', '.join(cls.FORMATS)})")
+        return fmt
+
+    def export(self, kind, path, formation_id=None, fmt=None, cursor=None):
+        """Exporte `kind` (voir GestionService.EXPORTS) dans `path`.
+
+        Retourne le nombre de lignes écrites, None si l'export a été abandonné.
+        """
+        fmt = fmt or self.format_of(path)
+        if fmt not in self.FORMATS:
+            raise ValueError(f"format d'export inconnu : {fmt}")
+        colonnes, lignes = self.service.export(kind, formation_id, cursor, chunk_size=self.chunk_size)
+        partiel = path + '.partiel'
+        nb = 0
+        abandon = False
+        try:
+            with getattr(self, '_' + fmt)(partiel, colonnes) as ecrire:
+                while True:
+                    paquet = list(itertools.islice(lignes, self.chunk_size))
+                    if not paquet:
+                        break
+                    ecrire(paquet)
+                    nb += len(paquet)
+                    if self.progress and self.progress(nb):
+                        abandon = True
+                        break
+        except BaseException:
+            if os.path.exists(partiel):
+                os.remove(partiel)
+            raise
+        if abandon:
+            os.remove(partiel)
+            return None
+        os.replace(partiel, path)
+        return nb
+
+    @staticmethod
+    @contextmanager
+    def _csv(path, colonnes):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(colonnes)
+            yield writer.writerows
+
+    @staticmethod
+    @contextmanager
+    def _jsonl(path, colonnes):
+        with open(path, 'w', encoding='utf-8') as f:
+            def ecrire(paquet):
+                f.writelines(json.dumps(dict(zip(colonnes, row)), ensure_ascii=False) + '\n' for row in paquet)
+
+            yield ecrire
+
+    # Parties fixes d'un classeur XLSX d'une seule feuille (xl/worksheets/sheet1.xml)
+    XLSX_PARTS = {
+        '[Content_Types].xml':
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/></Types>',
+        '_rels/.rels':
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/officeDocument"/></Relationships>',
+        'xl/workbook.xml':
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        'xl/_rels/workbook.xml.rels':
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/worksheet"/></Relationships>',
+    }
+    # Caractères de contrôle interdits en XML 1.0
+    XML_INTERDITS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+    @classmethod
+    def _cellule(cls, reference, valeur):
+        if valeur is None:
+            return ''
+        if isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            return f'<c r="{reference}"><v>{valeur!r}</v></c>'
+        texte = escape(cls.XML_INTERDITS.sub('', str(valeur)), quote=False)
+        return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{texte}</t></is></c>'
+
+    @classmethod
+    @contextmanager
+    def _xlsx(cls, path, colonnes):
+        """Feuille écrite directement en SpreadsheetML, ligne à ligne dans l'archive zip.
+
+        openpyxl (utilisé pour lire les imports) écrit environ dix fois moins
+        vite : les exports de plusieurs centaines de milliers de lignes
+        prendraient plusieurs minutes.
+        """
+        lettres = []
+        for numero in range(1, len(colonnes) + 1):
+            lettre = ''
+            while numero:
+                numero, reste = divmod(numero - 1, 26)
+                lettre = chr(65 + reste) + lettre
+            lettres.append(lettre)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, xml in cls.XLSX_PARTS.items():
+                archive.writestr(name, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml)
+            with archive.open('xl/worksheets/sheet1.xml', 'w') as raw, \
+                    io.TextIOWrapper(raw, encoding='utf-8') as f:
+                f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+                numero = 0
+
+                def ecrire(paquet):
+                    nonlocal numero
+                    if numero + len(paquet) > cls.XLSX_MAX_LIGNES:
+                        raise ValueError(f"un fichier XLSX est limité à {cls.XLSX_MAX_LIGNES - 1} lignes : "
+                                         "exporter en CSV")
+                    for row in paquet:
+                        numero += 1
+                        f.write(f'<row r="{numero}">'
+                                + ''.join(cls._cellule(f"{lettre}{numero}", valeur)
+                                          for lettre, valeur in zip(lettres, row))
+                                + '</row>')
+
+                ecrire([colonnes])
+                yield ecrire
+                f.write('</sheetData></worksheet>')
+
+def fts_query(text):
+    """Traduit une saisie libre en requête FTS5 : chaque mot est un préfixe, tous doivent figurer"""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+def search_etudiants(cursor, text, limit=20, exclude_formation_id=None):
+    """Retourne les `limit` étudiants (id, matricule, nom, prénom) les plus pertinents pour `text`.
+
+    Avec `exclude_formation_id`, les étudiants déjà inscrits à cette
+    formation sont écartés.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    if exclude_formation_id is None:
+        cursor.execute('''
+            SELECT e.id, e.matricule, e.nom, e.prenom
+            FROM etudiants_fts f
+            JOIN etudiants e ON e.id = f.rowid
+            WHERE etudiants_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (query, limit))
+    else:
+        cursor.execute('''
+            SELECT e.id, e.matricule, e.nom, e.prenom
+            FROM etudiants_fts f
+            JOIN etudiants e ON e.id = f.rowid
+            WHERE etudiants_fts MATCH ?
+            AND NOT EXISTS (SELECT 1 FROM inscriptions i WHERE i.formation_id = ? AND i.etudiant_id = e.id)
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (query, exclude_formation_id, limit))
+    return cursor.fetchall()
+
+# Colonne triable d'une liste d'étudiants (id, matricule, nom, prenom, email, telephone)
+# -> (expressions du tri, colonnes de la ligne portant la clé) ; chaque tri suit un
+# index et se termine par id pour être total
+ETUDIANTS_SORTS = {
+    0: (("id",), (0,)),
+    1: (("matricule", "id"), (1, 0)),
+    2: (("nom COLLATE NOCASE", "prenom COLLATE NOCASE", "id"), (2, 3, 0)),
+    3: (("prenom COLLATE NOCASE", "nom COLLATE NOCASE", "id"), (3, 2, 0)),
+}
+
+# Colonne filtrable -> condition de préfixe, servie par un index
+ETUDIANTS_FILTERS = {
+    1: "matricule >= ? AND matricule < ?",
+    2: "nom LIKE ?",
+    3: "prenom LIKE ?",
+    4: "email LIKE ?",
+}
+
+def etudiants_filter(search='', filters=None, exclude_formation_id=None):
+    """Retourne (conditions, paramètres) du WHERE sélectionnant des étudiants.
+
+    `search` est une recherche plein texte, `filters` associe une colonne de
+    ETUDIANTS_FILTERS au début du texte recherché ; avec `exclude_formation_id`
+    les étudiants déjà inscrits à cette formation sont écartés.
+    """
+    conditions, params = [], []
+    fts = fts_query(search)
+    if fts:
+        conditions.append("id IN (SELECT rowid FROM etudiants_fts WHERE etudiants_fts MATCH ?)")
+        params.append(fts)
+    for column, text in (filters or {}).items():
+        text = text.strip().replace('%', '').replace('_', '')
+        if not text:
+            continue
+        condition = ETUDIANTS_FILTERS[column]
+        conditions.append(condition)
+        # Borne haute du préfixe : le plus grand caractère Unicode
+        params.extend((text + '%',) if 'LIKE' in condition else (text, text + '\U0010ffff'))
+    if exclude_formation_id is not None:
+        conditions.append("NOT EXISTS (SELECT 1 FROM inscriptions i "
+                          "WHERE i.formation_id = ? AND i.etudiant_id = etudiants.id)")
+        params.append(exclude_formation_id)
+    return conditions, params
+
+def etudiants_query(search='', filters=None, sort_column=2, descending=False, exclude_formation_id=None):
+    """Construit (sql, paramètres, keyset) d'une liste d'étudiants pour SqlTableModel.set_query()"""
+    conditions, params = etudiants_filter(search, filters, exclude_formation_id)
+    keys, key_columns = ETUDIANTS_SORTS[sort_column]
+    op, direction = ('<', ' DESC') if descending else ('>', '')
+    if len(keys) == 1:
+        seek = f"{keys[0]} {op} ?"
+    else:
+        # La condition sur la première clé seule permet la recherche dans l'index
+        seek = f"{keys[0]} {op}= ? AND ({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})"
+        key_columns = key_columns[:1] + key_columns
+    sql = (f"SELECT id, matricule, nom, prenom, email, telephone FROM etudiants "
+           f"WHERE {' AND '.join(['{seek}'] + conditions)} "
+           f"ORDER BY {', '.join(key + direction for key in keys)}")
+    return sql, params, (seek, key_columns)
+
+def fetch_rows(cursor, sql, params, limit, offset):
+    """Exécute `sql` avec LIMIT/OFFSET ; utilisable depuis n'importe quel thread"""
+    cursor.execute(f"{sql} LIMIT ? OFFSET ?", tuple(params) + (limit, offset))
+    return cursor.fetchall()
+
+def iter_rows(cursor, chunk_size=5000):
+    """Produit les lignes du curseur, lues par paquets de `chunk_size` (fetchmany)"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+def format_purge(counts, liberes):
+    """Résumé lisible du résultat de DatabaseManager.purge_orphans()"""
+    if not counts:
+        return "Aucune donnée orpheline."
+    lignes = [f"{count} ligne(s) supprimée(s) dans {table}" for table, count in counts.items()]
+    lignes.append(f"{liberes / 1048576:.1f} Mo récupéré(s)")
+    return '\n'.join(lignes)
+
+def appreciation(moyenne):
+    """Appréciation associée à une moyenne sur 20"""
+    if moyenne >= 16:
+        return "Très Bien"
+    elif moyenne >= 14:
+        return "Bien"
+    elif moyenne >= 12:
+        return "Assez Bien"
+    elif moyenne >= 10:
+        return "Passable"
+    return "Insuffisant"
+
+def bulletin_html(etudiant_info, notes, moyenne_result, entete=False):
+    """HTML du bulletin ; avec `entete`, ajoute le titre et l'identité de l'étudiant (PDF)"""
+    content = ""
+    if entete:
+        content += "<h2 align='center'>BULLETIN DE NOTES</h2>"
+        content += (f"<p>Matricule: {escape(str(etudiant_info[0]))}<br>"
+                    f"Nom: {escape(etudiant_info[1])}<br>"
+                    f"Prénom: {escape(etudiant_info[2])}</p>")
+
+    content += "<h3>Détail des Notes</h3>"
+    content += "<table border='1' style='border-collapse: collapse; width: 100%;'>"
+    # Notes avec leur année académique : une colonne de plus
+    avec_annee = bool(notes) and len(notes[0]) > 5
+    content += "<tr>" + ("<th>Année univ.</th>" if avec_annee else "")
+    content += "<th>Matière</th><th>Année</th><th>Semestre</th><th>Note</th><th>Crédits</th></tr>"
+
+    for note in notes:
+        matiere, valeur_note, semestre, credits, annee = note[:5]
+        content += "<tr>" + (f"<td>{libelle_annee(note[5])}</td>" if avec_annee else "")
+        content += f"<td>{escape(matiere)}</td><td>{annee}</td><td>{semestre}</td><td>{valeur_note}</td><td>{credits}</td></tr>"
+
+    content += "</table>"
+
+    # Moyennes
+    if moyenne_result and moyenne_result[0]:
+        moyenne_generale = round(moyenne_result[0], 2)
+        total_credits = moyenne_result[1] or 0
+        content += "<h3>Résultats</h3>"
+        content += f"<p><strong>Moyenne Générale:</strong> {moyenne_generale}/20</p>"
+        content += f"<p><strong>Total Crédits:</strong> {total_credits}</p>"
+        content += f"<p><strong>Appréciation:</strong> {appreciation(moyenne_generale)}</p>"
+
+    return content
+
+class GestionService:
+    """Opérations métier sans interface : inscriptions, notes, moyennes, bulletins, imports.
+
+    Chaque écriture passe par DatabaseManager.write (file d'écriture si elle
+    est active) dans sa propre transaction et est notifiée aux écouteurs. Les lectures acceptent un curseur pour
+    s'exécuter aussi sur le worker de l'interface.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def _cursor(self, cursor=None):
+        return cursor if cursor is not None else self.db_manager.get_connection().cursor()
+
+    # Colonnes renseignées à la création ou à la modification d'une ligne
+    COLONNES = {
+        'departements': ('nom', 'description'),
+        'formations': ('nom', 'nb_annees', 'departement_id'),
+        'etudiants': ('matricule', 'nom', 'prenom', 'email', 'telephone'),
+        'matieres': ('nom', 'formation_id', 'credits', 'annee', 'semestre'),
+    }
+
+    def _colonnes(self, table, valeurs):
+        if table not in self.COLONNES:
+            raise ValueError(f"table inconnue : {table}")
+        colonnes = [colonne for colonne in self.COLONNES[table] if colonne in valeurs]
+        if not colonnes:
+            raise ValueError(f"aucune colonne de {table} à enregistrer")
+        return colonnes
+
+    def creer(self, table, valeurs):
+        """Insère une ligne (dict colonne -> valeur) et retourne son id.
+
+        Lève sqlite3.IntegrityError si une contrainte d'unicité est violée.
+        """
+        colonnes = self._colonnes(table, valeurs)
+
+        def ecrire(cursor):
+            cursor.execute(f"INSERT INTO {table} ({', '.join(colonnes)}) VALUES ({', '.join(['?'] * len(colonnes))})",
+                           [valeurs[colonne] for colonne in colonnes])
+            ligne_id = cursor.lastrowid
+            self.db_manager.notify_change(table, 'insert', [ligne_id])
+            return ligne_id
+
+        return self.db_manager.write(ecrire)
+
+    def modifier(self, table, ligne_id, valeurs):
+        """Modifie les colonnes données (dict colonne -> valeur) d'une ligne"""
+        colonnes = self._colonnes(table, valeurs)
+
+        def ecrire(cursor):
+            cursor.execute(f"UPDATE {table} SET {', '.join(colonne + ' = ?' for colonne in colonnes)} WHERE id = ?",
+                           [valeurs[colonne] for colonne in colonnes] + [ligne_id])
+            self.db_manager.notify_change(table, 'update', [ligne_id])
+
+        self.db_manager.write(ecrire)
+
+    def supprimer(self, table, ids):
+        """Supprime des lignes et celles qui en dépendent ; retourne {table: lignes supprimées}"""
+        if table not in self.COLONNES:
+            raise ValueError(f"table inconnue : {table}")
+        return self.db_manager.write(lambda cursor: self.db_manager.supprimer(cursor, table, ids))
+
+    def inscrire(self, formation_id, etudiant_ids, annee=None):
+        """Inscrit des étudiants à une formation ; retourne le nombre d'inscriptions créées.
+
+        `etudiant_ids` est une liste d'ids ou une fonction etudiant_ids(cursor),
+        appelée dans la transaction de l'écriture. L'année vaut par défaut
+        l'année académique en cours.
+        """
+        if annee is None:
+            annee = annee_academique_courante()
+
+        def ecrire(cursor):
+            ids = etudiant_ids(cursor) if callable(etudiant_ids) else etudiant_ids
+            return self.db_manager.inscrire(cursor, formation_id, ids, annee)
+
+        return self.db_manager.write(ecrire)
+
+    def desinscrire(self, formation_id, etudiant_ids):
+        """Désinscrit des étudiants d'une formation ; retourne le nombre d'inscriptions supprimées"""
+        return self.db_manager.write(lambda cursor: self.db_manager.desinscrire(cursor, formation_id, etudiant_ids))
+
+    def enregistrer_note(self, etudiant_id, matiere_id, note):
+        """Enregistre une note au semestre de la matière ; une note de l'année en cours est remplacée.
+
+        Retourne l'id de la note, None si la matière n'existe pas.
+        """
+        if not 0 <= note <= 20:
+            raise ValueError(f"note hors de l'intervalle 0-20 : {note}")
+
+        def ecrire(cursor):
+            cursor.execute('''
+                INSERT INTO notes (etudiant_id, matiere_id, note, semestre)
+                SELECT ?, id, ?, semestre FROM matieres WHERE id = ?
+                ON CONFLICT (etudiant_id, matiere_id, semestre, annee_academique) DO UPDATE SET note = excluded.note
+                RETURNING id
+            ''', (etudiant_id, note, matiere_id))
+            ids = [row[0] for row in cursor.fetchall()]
+            self.db_manager.notify_change('notes', 'insert', ids)
+            return ids[0] if ids else None
+
+        return self.db_manager.write(ecrire)
+
+    def modifier_note(self, note_id, note, semestre):
+        """Modifie une note ; lève sqlite3.IntegrityError si la matière a déjà une note à ce semestre
+        la même année"""
+        if not 0 <= note <= 20:
+            raise ValueError(f"note hors de l'intervalle 0-20 : {note}")
+
+        def ecrire(cursor):
+            cursor.execute("UPDATE notes SET note = ?, semestre = ? WHERE id = ?", (note, semestre, note_id))
+            self.db_manager.notify_change('notes', 'update', [note_id])
+
+        self.db_manager.write(ecrire)
+
+    def supprimer_note(self, note_id):
+        def ecrire(cursor):
+            cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+            self.db_manager.notify_change('notes', 'delete', [note_id])
+
+        self.db_manager.write(ecrire)
+
+    def saisir_notes(self, upserts, deletes):
+        """Enregistre une saisie en grille en une transaction.
+
+        `upserts` : (etudiant_id, matiere_id, note, semestre) enregistrées ou
+        remplacées ; `deletes` : (etudiant_id, matiere_id, semestre) effacées.
+        Comme les saisies, les effacements portent sur l'année académique en cours.
+        """
+        annee = annee_academique_courante()
+
+        def ecrire(cursor):
+            self.db_manager.upsert_notes(cursor, upserts)
+            ids = []
+            for etudiant_id, matiere_id, semestre in deletes:
+                cursor.execute('''
+                    DELETE FROM notes
+                    WHERE etudiant_id = ? AND matiere_id = ? AND semestre = ? AND annee_academique = ?
+                    RETURNING id
+                ''', (etudiant_id, matiere_id, semestre, annee))
+                ids.extend(row[0] for row in cursor.fetchall())
+            if ids:
+                self.db_manager.notify_change('notes', 'delete', ids)
+
+        self.db_manager.write(ecrire)
+
+    def moyennes_etudiant(self, etudiant_id, cursor=None):
+        """Moyennes d'un étudiant (voir ResultsEngine.moyennes_etudiant)"""
+        return ResultsEngine.moyennes_etudiant(self._cursor(cursor), etudiant_id)
+
+    def resultats_formation(self, formation_id, cursor=None):
+        """Moyennes de tous les inscrits d'une formation (CohortResults)"""
+        return ResultsEngine(self.db_manager).compute_formation(formation_id, self._cursor(cursor))
+
+    def statistiques(self, formation_id, annee=None, semestre=None, cursor=None):
+        """Statistiques de cohorte d'une formation (voir CohortStatistics), filtrées sur l'année d'étude
+        et/ou le semestre"""
+        return self.db_manager.cohort_stats.formation(formation_id, annee, semestre, self._cursor(cursor))
+
+    def recalculer_moyennes(self):
+        """Reconstruit moyennes_cache ; retourne le nombre de lignes incohérentes corrigées"""
+        return self.db_manager.rebuild_moyennes_cache()
+
+    def importer(self, kind, path, progress=None):
+        """Importe un CSV ou un XLSX d'étudiants, d'inscriptions ou de notes (voir BulkImporter)"""
+        if kind not in BulkImporter.COLONNES:
+            raise ValueError(f"import inconnu : {kind}")
+        return getattr(BulkImporter(self.db_manager, progress=progress), f"import_{kind}")(path)
+
+    # Colonnes des exports (voir export)
+    EXPORTS = {
+        'etudiants': ('matricule', 'nom', 'prenom', 'email', 'telephone'),
+        'notes': ('matricule', 'nom', 'prenom', 'matiere', 'annee', 'semestre', 'note', 'credits',
+                  'annee_academique'),
+        'resultats': ('matricule', 'nom', 'prenom', 'moyenne_generale', 'credits', 'nb_notes'),
+    }
+
+    def export(self, kind, formation_id=None, cursor=None, chunk_size=5000):
+        """Retourne (colonnes, lignes) d'un export, limité aux inscrits de `formation_id` s'il est donné.
+
+        Les lignes sont lues au fil de l'itération, par paquets de
+        `chunk_size` (voir Exporter). L'export des résultats demande une formation.
+        """
+        if kind not in self.EXPORTS:
+            raise ValueError(f"export inconnu : {kind}")
+        cursor = self._cursor(cursor)
+        resultats = None
+        if kind == 'resultats':
+            if formation_id is None:
+                raise ValueError("l'export des résultats demande une formation")
+            resultats = self.resultats_formation(formation_id, cursor)
+        if kind != 'notes' and formation_id is None:
+            cursor.execute("SELECT matricule, nom, prenom, email, telephone, id FROM etudiants ORDER BY id")
+        elif kind != 'notes':
+            cursor.execute('''
+                SELECT matricule, nom, prenom, email, telephone, id FROM etudiants
+                WHERE id IN (SELECT etudiant_id FROM inscriptions WHERE formation_id = ?)
+                ORDER BY nom, prenom, id
+            ''', (formation_id,))
+        elif formation_id is None:
+            cursor.execute('''
+                SELECT e.matricule, e.nom, e.prenom, m.nom, m.annee, n.semestre, n.note, m.credits,
+                       n.annee_academique
+                FROM notes n
+                JOIN etudiants e ON e.id = n.etudiant_id
+                JOIN matieres m ON m.id = n.matiere_id
+            ''')
+        else:
+            cursor.execute('''
+                SELECT e.matricule, e.nom, e.prenom, m.nom, m.annee, n.semestre, n.note, m.credits,
+                       n.annee_academique
+                FROM matieres m
+                JOIN notes n ON n.matiere_id = m.id
+                JOIN etudiants e ON e.id = n.etudiant_id
+                WHERE m.formation_id = ?
+                ORDER BY e.nom, e.prenom, e.id, m.annee, n.semestre, m.nom
+            ''', (formation_id,))
+
+        if kind == 'notes':
+            return self.EXPORTS[kind], iter_rows(cursor, chunk_size)
+        if resultats is None:
+            return self.EXPORTS[kind], (row[:5] for row in iter_rows(cursor, chunk_size))
+
+        def lignes():
+            for row in iter_rows(cursor, chunk_size):
+                moyennes = resultats.pour_etudiant(row[5])
+                yield row[:3] + ((moyennes['moyenne_generale'], moyennes['credits'], moyennes['nb_notes'])
+                                 if moyennes else (None, 0, 0))
+
+        return self.EXPORTS[kind], lignes()
+
+    def bulletin(self, etudiant_id, historique=False, cursor=None):
+        """Retourne (infos étudiant, notes, moyenne) pour le bulletin d'un étudiant"""
+        return self.query_bulletin(self._cursor(cursor), etudiant_id, historique)
+
+    @staticmethod
+    def query_bulletin(cursor, etudiant_id, historique=False):
+        """Retourne (infos étudiant, notes, moyenne) pour le bulletin.
+
+        Chaque note (matière, note, semestre, crédits, année, année académique)
+        porte son année académique. Seules les notes retenues (voir
+        DatabaseManager._notes_retenues) sont listées ; avec `historique`,
+        toutes les notes, y compris celles des années archivées.
+        """
+        # Récupérer les informations de l'étudiant
+        cursor.execute("SELECT matricule, nom, prenom FROM etudiants WHERE id = ?", (etudiant_id,))
+        etudiant_info = cursor.fetchone()
+
+        if historique:
+            DatabaseManager.attach_archives(cursor.connection)
+            cursor.execute('''
+                SELECT m.nom, n.note, n.semestre, m.credits, m.annee, n.annee_academique
+                FROM historique_notes n
+                JOIN matieres m ON n.matiere_id = m.id
+                WHERE n.etudiant_id = ?
+                ORDER BY n.annee_academique, m.annee, n.semestre, m.nom
+            ''', (etudiant_id,))
+            notes = cursor.fetchall()
+            # moyennes_cache ne couvre que la base courante : calcul sur toutes les années, avec
+            # la note la plus récente de chaque matière repassée (comme notes_retenues)
+            cursor.execute('''
+                SELECT SUM(note * credits) / SUM(credits), SUM(credits)
+                FROM (
+                    SELECT n.note, m.credits, ROW_NUMBER() OVER (
+                        PARTITION BY n.matiere_id, n.semestre ORDER BY n.annee_academique DESC, n.id DESC) AS rang
+                    FROM historique_notes n
+                    JOIN matieres m ON n.matiere_id = m.id
+                    WHERE n.etudiant_id = ?
+                )
+                WHERE rang = 1 AND note IS NOT NULL
+            ''', (etudiant_id,))
+            moyenne, credits = cursor.fetchone()
+            return etudiant_info, notes, (moyenne, credits) if credits else None
+
+        # Notes retenues, celles des moyennes
+        cursor.execute('''
+            SELECT m.nom, n.note, n.semestre, m.credits, m.annee, n.annee_academique
+            FROM notes_retenues n
+            JOIN matieres m ON n.matiere_id = m.id
+            WHERE n.etudiant_id = ?
+            ORDER BY m.annee, n.semestre, m.nom
+        ''', (etudiant_id,))
+        notes = cursor.fetchall()
+
+        # Moyenne pondérée par les crédits et total des crédits
+        resultats = ResultsEngine.moyennes_etudiant(cursor, etudiant_id)
+        moyenne_result = (resultats['moyenne_generale'], resultats['credits']) if resultats else None
+        return etudiant_info, notes, moyenne_result
+
+    def bulletins_formation(self, formation_id, annee=None, semestre=None, cursor=None):
+        """Retourne [(infos étudiant, notes, moyenne)] pour tous les inscrits d'une formation.
+
+        Les notes sont lues en une requête, filtrées sur l'année d'étude et/ou
+        le semestre ; les moyennes sont calculées par ResultsEngine.compute.
+        """
+        cursor = self._cursor(cursor)
+        cursor.execute('''
+            SELECT DISTINCT e.id, e.matricule, e.nom, e.prenom
+            FROM inscriptions i
+            JOIN etudiants e ON e.id = i.etudiant_id
+            WHERE i.formation_id = ?
+            ORDER BY e.nom, e.prenom, e.id
+        ''', (formation_id,))
+        etudiants = cursor.fetchall()
+
+        cursor.execute('''
+            SELECT n.etudiant_id, m.nom, n.note, n.semestre, m.credits, m.annee, n.annee_academique
+            FROM matieres m
+            JOIN notes_retenues n ON n.matiere_id = m.id
+            WHERE m.formation_id = ? AND (? IS NULL OR m.annee = ?) AND (? IS NULL OR n.semestre = ?)
+            ORDER BY n.etudiant_id, m.annee, n.semestre, m.nom
+        ''', (formation_id, annee, annee, semestre, semestre))
+        notes_par_etudiant = {}
+        lignes_moyenne = []
+        for etudiant_id, matiere, note, semestre_note, credits, annee_matiere, annee_academique in cursor.fetchall():
+            notes_par_etudiant.setdefault(etudiant_id, []).append(
+                (matiere, note, semestre_note, credits, annee_matiere, annee_academique))
+            if note is not None:
+                lignes_moyenne.append((etudiant_id, annee_matiere, semestre_note, note, credits))
+
+        resultats = ResultsEngine.compute([e[0] for e in etudiants], lignes_moyenne)
+        bulletins = []
+        for etudiant_id, matricule, nom, prenom in etudiants:
+            moyennes = resultats.pour_etudiant(etudiant_id)
+            moyenne_result = (moyennes['moyenne_generale'], moyennes['credits']) if moyennes else None
+            bulletins.append(((matricule, nom, prenom), notes_par_etudiant.get(etudiant_id, []), moyenne_result))
+        return bulletins
@@ -0,0 +1,151 @@
+"""Remplit une base avec des données universitaires synthétiques.
+
+Crée des départements, formations, matières, étudiants, inscriptions et
+notes dans le schéma de DatabaseManager.init_database. Les volumes sont
+configurables (jusqu'à plusieurs millions de notes) et le tirage est
+reproductible grâce à --seed.
+
+Usage : python generate_data.py base.db [--etudiants 50000] [--matieres 20] ...
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+from core import DatabaseManager
+
+NOMS = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy",
+        "Moreau", "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux",
+        "Vincent", "Fournier", "Morel", "Girard", "Andre", "Mercier", "Dupont", "Lambert", "Bonnet",
+        "Francois", "Martinez", "Legrand", "Hounkpatin", "Adjovi", "Dossou", "Agbo", "Kouassi"]
+PRENOMS = ["Marie", "Jean", "Pierre", "Michel", "Claude", "Nathalie", "Sophie", "Isabelle", "Nicolas",
+           "Julie", "Camille", "Lucas", "Emma", "Hugo", "Léa", "Louis", "Chloé", "Gabriel", "Manon",
+           "Arthur", "Inès", "Jules", "Sarah", "Adam", "Aïcha", "Koffi", "Rodolphe", "Fatou"]
+DOMAINES = ["Informatique", "Mathématiques", "Physique", "Chimie", "Biologie", "Économie", "Droit",
+            "Lettres", "Histoire", "Gestion", "Génie Civil", "Électronique"]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert_chunks(db, sql, rows, chunk_size):
+    """Insère les lignes par blocs, une transaction par bloc ; retourne le nombre inséré"""
+    total = 0
+    for chunk in chunked(rows, chunk_size):
+        with db.transaction() as cursor:
+            cursor.executemany(sql, chunk)
+        total += len(chunk)
+    return total
+
+
+def generate(db, departements=5, formations=4, nb_annees=3, matieres=20, etudiants=10000,
+             inscriptions=1, taux_notes=1.0, seed=0, chunk_size=20000, log=print):
+    """Génère les données ; `formations` et `matieres` sont donnés par département et par formation"""
+    rng = random.Random(seed)
+    cursor = db.get_connection().cursor()
+    cursor.execute("SELECT COUNT(*) FROM etudiants")
+    premier_etudiant = cursor.fetchone()[0]
+    debut = time.perf_counter()
+
+    # Départements et formations
+    with db.transaction() as cursor:
+        formation_ids = []
+        for d in range(departements):
+            cursor.execute("INSERT INTO departements (nom, description) VALUES (?, ?)",
+                           (f"Département {DOMAINES[d % len(DOMAINES)]} {d + 1}", "Données générées"))
+            departement_id = cursor.lastrowid
+            for f in range(formations):
+                cursor.execute("INSERT INTO formations (nom, departement_id, nb_annees) VALUES (?, ?, ?)",
+                               (f"Formation {d + 1}.{f + 1}", departement_id, nb_annees))
+                formation_ids.append(cursor.lastrowid)
+
+    # Matières réparties sur les années et les semestres de chaque formation
+    with db.transaction() as cursor:
+        matieres_par_formation = {}
+        for formation_id in formation_ids:
+            for m in range(matieres):
+                annee = m * nb_annees // matieres + 1
+                semestre = m % 2 + 1
+                cursor.execute("INSERT INTO matieres (nom, formation_id, credits, annee, semestre) VALUES (?, ?, ?, ?, ?)",
+                               (f"Matière {m + 1}", formation_id, rng.randint(2, 6), annee, semestre))
+                matieres_par_formation.setdefault(formation_id, []).append((cursor.lastrowid, semestre))
+    log(f"{len(formation_ids)} formation(s), {len(formation_ids) * matieres} matière(s)")
+
+    # Étudiants
+    nb = insert_chunks(db, "INSERT INTO etudiants (matricule, nom, prenom, email, telephone) VALUES (?, ?, ?, ?, ?)",
+                       ((f"E{i:08d}", rng.choice(NOMS), rng.choice(PRENOMS), f"e{i}@univ.example",
+                         f"+229 {rng.randint(10000000, 99999999)}")
+                        for i in range(premier_etudiant, premier_etudiant + etudiants)), chunk_size)
+    cursor = db.get_connection().cursor()
+    cursor.execute("SELECT id FROM etudiants ORDER BY id DESC LIMIT ?", (etudiants,))
+    etudiant_ids = sorted(row[0] for row in cursor.fetchall())
+    log(f"{nb} étudiant(s)")
+
+    # Inscriptions : chaque étudiant suit `inscriptions` formations distinctes
+    parcours = [(etudiant_id, rng.sample(formation_ids, min(inscriptions, len(formation_ids))))
+                for etudiant_id in etudiant_ids]
+    annees = {}
+
+    def inscriptions():
+        for etudiant_id, suivies in parcours:
+            for formation_id in suivies:
+                annee = annees[etudiant_id, formation_id] = rng.randint(2020, 2025)
+                yield etudiant_id, formation_id, annee
+
+    nb = insert_chunks(db, "INSERT INTO inscriptions (etudiant_id, formation_id, annee_inscription) VALUES (?, ?, ?)",
+                       inscriptions(), chunk_size)
+    log(f"{nb} inscription(s)")
+
+    # Notes : une note par matière suivie, avec probabilité `taux_notes`, dans l'année de l'inscription
+    def notes():
+        for etudiant_id, suivies in parcours:
+            niveau = rng.gauss(11, 2.5)
+            for formation_id in suivies:
+                for matiere_id, semestre in matieres_par_formation[formation_id]:
+                    if rng.random() < taux_notes:
+                        note = round(min(20.0, max(0.0, rng.gauss(niveau, 3))) * 4) / 4
+                        yield etudiant_id, matiere_id, note, semestre, annees[etudiant_id, formation_id]
+
+    nb = insert_chunks(db, "INSERT INTO notes (etudiant_id, matiere_id, note, semestre, annee_academique) "
+                           "VALUES (?, ?, ?, ?, ?)", notes(), chunk_size)
+    log(f"{nb} note(s) en {time.perf_counter() - debut:.1f} s")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Génère des données synthétiques")
+    parser.add_argument('db', help="fichier de base de données (créé s'il n'existe pas)")
+    parser.add_argument('--departements', type=int, default=5)
+    parser.add_argument('--formations', type=int, default=4, help="formations par département")
+    parser.add_argument('--nb-annees', type=int, default=3, help="années d'étude par formation")
+    parser.add_argument('--matieres', type=int, default=20, help="matières par formation")
+    parser.add_argument('--etudiants', type=int, default=10000)
+    parser.add_argument('--inscriptions', type=int, default=1, help="formations suivies par étudiant")
+    parser.add_argument('--taux-notes', type=float, default=1.0, help="proportion de matières notées")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help="supprime la base existante")
+    args = parser.parse_args(argv)
+
+    if args.force:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    db = DatabaseManager(args.db)
+    try:
+        generate(db, args.departements, args.formations, args.nb_annees, args.matieres, args.etudiants,
+                 args.inscriptions, args.taux_notes, args.seed)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,96 +1,867 @@
 import sys
+import csv
+import logging
+import multiprocessing
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PyQt6.QtWidgets import *
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QFont
+from PyQt6.QtCore import Qt, pyqtSignal, QAbstractTableModel, QModelIndex, QObject, QRectF, QTimer, QThread
+from PyQt6.QtGui import (QColor, QFont, QGuiApplication, QKeySequence, QPageSize, QPainter, QPdfWriter,
+                         QStandardItem, QStandardItemModel, QTextDocument, QValidator)
 import os
 
+from core import (DatabaseManager, BulkImporter, Exporter, ETUDIANTS_FILTERS, ETUDIANTS_SORTS,
+                  annee_academique_courante, libelle_annee, search_etudiants, etudiants_filter, etudiants_query,
+                  fetch_rows, format_purge, bulletin_html)
+from server import RemoteDatabaseManager
 
-class DatabaseManager:
-    def __init__(self, db_name="gestion_etudiants.db"):
-        self.db_name = db_name
-        self.init_database()
+logger = logging.getLogger(__name__)
 
-    def init_database(self):
-        """Initialise la base de données avec toutes les tables nécessaires"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
 
-        # Table des départements
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS departements (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT NOT NULL UNIQUE,
-                description TEXT
-            )
-        ''')
+class SqlTableModel(QAbstractTableModel):
+    """Modèle de table en lecture seule alimenté page par page par une requête SQL.
 
-        # Table des formations
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS formations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT NOT NULL,
-                nb_annees INTEGER NOT NULL,
-                departement_id INTEGER,
-                FOREIGN KEY (departement_id) REFERENCES departements (id)
-            )
-        ''')
+    Les lignes sont chargées au fil du défilement (canFetchMore/fetchMore) et
+    seules `max_pages` pages restent en mémoire ; une page évincée est relue
+    à la demande lorsque la vue l'affiche de nouveau. `key_column` est
+    l'indice de la colonne identifiant une ligne, utilisé par apply_changes().
 
-        # Table des étudiants
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS etudiants (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                matricule TEXT NOT NULL UNIQUE,
-                nom TEXT NOT NULL,
-                prenom TEXT NOT NULL,
-                email TEXT,
-                telephone TEXT
-            )
-        ''')
+    Avec `keyset=(seek, columns)`, les pages sont lues par clé plutôt que par
+    OFFSET : la requête contient un emplacement `{seek}` (première condition
+    du WHERE), remplacé par `seek` avec pour paramètres les valeurs des
+    colonnes `columns` de la dernière ligne déjà lue. Relire une page
+    lointaine ne coûte alors qu'une recherche dans l'index du tri.
 
-        # Table des inscriptions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                etudiant_id INTEGER,
-                formation_id INTEGER,
-                annee_inscription INTEGER,
-                FOREIGN KEY (etudiant_id) REFERENCES etudiants (id),
-                FOREIGN KEY (formation_id) REFERENCES formations (id)
-            )
-        ''')
+    Avec un `worker` (DatabaseWorker), les pages affichées et le comptage
+    de invalidate() sont lus en arrière-plan, et les requêtes en cours sont
+    annulées à chaque refresh().
+    """
 
-        # Table des matières
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS matieres (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT NOT NULL,
-                credits INTEGER NOT NULL,
-                formation_id INTEGER,
-                annee INTEGER NOT NULL,
-                semestre INTEGER NOT NULL,
-                FOREIGN KEY (formation_id) REFERENCES formations (id)
-            )
-        ''')
+    def __init__(self, db_manager, headers, parent=None, page_size=256, max_pages=16, key_column=0,
+                 worker=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.headers = list(headers)
+        self.key_column = key_column
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.worker = worker
+        # Les pages sont aussi lues depuis Qt (data, fetchMore) : site fixe par modèle
+        self.site = f"{type(parent).__name__}.model" if parent is not None else "SqlTableModel"
+        self.sql = None
+        self.params = ()
+        self.keyset = None
+        # Numéro de ligne -> clé de tri de la dernière ligne de chaque bloc lu
+        self._anchors = {}
+        self._pages = OrderedDict()
+        self._row_count = 0
+        self._at_end = True
+        self._generation = 0
+        self._loading = set()
+        self._fetching = False
+        self._requests = set()
+
+    def set_query(self, sql, params=(), keyset=None):
+        """Définit la requête (avec ORDER BY déterministe) et recharge le modèle"""
+        self.sql = sql
+        self.params = tuple(params)
+        self.keyset = keyset
+        self.refresh()
+
+    def refresh(self):
+        """Vide le cache et recharge la première page"""
+        self._cancel_requests()
+        self.beginResetModel()
+        self._pages.clear()
+        self._anchors.clear()
+        self._row_count = 0
+        self._at_end = self.sql is None
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    def _cancel_requests(self):
+        """Abandonne les lectures en arrière-plan devenues obsolètes"""
+        self._generation += 1
+        self._loading.clear()
+        self._fetching = False
+        if self.worker is not None:
+            for request_id in self._requests:
+                self.worker.cancel(request_id)
+        self._requests.clear()
+
+    def _statement(self, start):
+        """Retourne (sql, paramètres, offset) pour lire les lignes à partir de `start`.
+
+        En mode keyset, la lecture repart de la clé connue la plus proche
+        avant `start` ; l'offset restant est nul pour une lecture séquentielle.
+        """
+        if self.keyset is None:
+            return self.sql, self.params, start
+        anchor = max((row for row in self._anchors if row < start), default=None)
+        if anchor is None:
+            return self.sql.format(seek='1'), self.params, start
+        seek, _ = self.keyset
+        return self.sql.format(seek=seek), self._anchors[anchor] + self.params, start - anchor - 1
+
+    def _remember(self, start, rows):
+        """Mémorise la clé de la dernière ligne lue comme point de reprise"""
+        if self.keyset is not None and rows:
+            _, columns = self.keyset
+            self._anchors[start + len(rows) - 1] = tuple(rows[-1][column] for column in columns)
+
+    def _fetch(self, cursor, start):
+        sql, params, skip = self._statement(start)
+        rows = fetch_rows(cursor, sql, params, self.page_size, skip)
+        self._remember(start, rows)
+        return rows
+
+    def _submit(self, offset, callback):
+        """Lit `page_size` lignes à partir de `offset` sur le thread du worker"""
+        generation = self._generation
+        (sql, params, skip), limit = self._statement(offset), self.page_size
+        request_id = None
+
+        def on_result(rows):
+            self._requests.discard(request_id)
+            if generation == self._generation:
+                self._remember(offset, rows)
+                callback(rows)
+
+        request_id = self.worker.submit(lambda cursor: fetch_rows(cursor, sql, params, limit, skip),
+                                        on_result, site=self.site)
+        self._requests.add(request_id)
+
+    def _cursor(self):
+        cursor = self.db_manager.get_connection().cursor()
+        cursor.site = self.site
+        return cursor
+
+    def _store_page(self, page, rows):
+        self._pages[page] = rows
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _load_page(self, page):
+        """Lit une page depuis la base et l'insère dans le cache LRU"""
+        rows = self._fetch(self._cursor(), page * self.page_size)
+        self._store_page(page, rows)
+        return rows
+
+    def _request_page(self, page):
+        """Demande la lecture asynchrone d'une page absente du cache"""
+        if page in self._loading:
+            return
+        self._loading.add(page)
+
+        def on_page(rows):
+            self._loading.discard(page)
+            self._store_page(page, rows)
+            first = page * self.page_size
+            last = min(first + len(rows), self._row_count) - 1
+            if last >= first:
+                self._emit_rows_changed(first, last)
+
+        self._submit(page * self.page_size, on_page)
+
+    def _page(self, page, wait=True):
+        rows = self._pages.get(page)
+        if rows is not None:
+            self._pages.move_to_end(page)
+        elif wait or self.worker is None:
+            rows = self._load_page(page)
+        else:
+            self._request_page(page)
+        return rows
 
-        # Table des notes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                etudiant_id INTEGER,
-                matiere_id INTEGER,
-                note REAL,
-                semestre INTEGER,
-                FOREIGN KEY (etudiant_id) REFERENCES etudiants (id),
-                FOREIGN KEY (matiere_id) REFERENCES matieres (id)
-            )
-        ''')
+    def row_data(self, row, wait=True):
+        """Retourne le tuple complet de la ligne (colonnes masquées comprises).
+
+        Avec wait=False, une page absente du cache est demandée en arrière-plan
+        et None est retourné en attendant.
+        """
+        if not 0 <= row < self._row_count:
+            return None
+        rows = self._page(row // self.page_size, wait)
+        if rows is None:
+            return None
+        offset = row % self.page_size
+        return rows[offset] if offset < len(rows) else None
+
+    def rows_data(self, rows, callback):
+        """Appelle callback([tuple, ...]) avec les lignes `rows` (colonnes masquées comprises).
+
+        Les pages absentes du cache (sélection étendue au-delà des pages
+        gardées) sont lues en arrière-plan avec un worker : callback est alors
+        appelé à leur arrivée, ou jamais si le modèle est rechargé entre-temps.
+        """
+        rows = [row for row in rows if 0 <= row < self._row_count]
+        pages = {row // self.page_size for row in rows}
+        # Gardées à part : une grande sélection peut dépasser max_pages
+        read = {page: self._pages[page] for page in pages if page in self._pages}
+        missing = sorted(pages - set(read))
+        if self.worker is None or not missing:
+            callback([self.row_data(row) for row in rows])
+            return
+
+        def line(row):
+            page_rows = read[row // self.page_size]
+            offset = row % self.page_size
+            return page_rows[offset] if offset < len(page_rows) else None
+
+        def on_page(page, page_rows):
+            read[page] = page_rows
+            self._store_page(page, page_rows)
+            if len(read) == len(pages):
+                callback([line(row) for row in rows])
+
+        for page in missing:
+            self._submit(page * self.page_size, lambda page_rows, page=page: on_page(page, page_rows))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._at_end
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self._at_end or self._fetching:
+            return
+        offset = self._row_count
+        if self.worker is None:
+            self._append_rows(offset, self._fetch(self._cursor(), offset))
+        else:
+            self._fetching = True
+            self._submit(offset, lambda rows: self._append_rows(offset, rows))
+
+    def _append_rows(self, offset, rows):
+        self._fetching = False
+        if offset != self._row_count:
+            # Le nombre de lignes a changé entre-temps : relire plus tard
+            return
+        # Après une suppression, la fin des lignes chargées n'est plus alignée sur une page
+        if offset % self.page_size == 0:
+            self._store_page(offset // self.page_size, rows)
+        if len(rows) < self.page_size:
+            self._at_end = True
+        if rows:
+            self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(rows) - 1)
+            self._row_count += len(rows)
+            self.endInsertRows()
+
+    def _find_rows(self, keys):
+        """Retourne {clé: numéro de ligne} pour les clés présentes dans le cache"""
+        found = {}
+        for page, rows in self._pages.items():
+            for offset, row in enumerate(rows):
+                if row[self.key_column] in keys:
+                    found[row[self.key_column]] = page * self.page_size + offset
+        return found
+
+    def _drop_pages_from(self, page):
+        for cached in [p for p in self._pages if p >= page]:
+            del self._pages[cached]
+        for anchor in [row for row in self._anchors if row >= page * self.page_size]:
+            del self._anchors[anchor]
+
+    def _emit_rows_changed(self, first, last):
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.headers) - 1))
+
+    def apply_changes(self, changes):
+        """Répercute des modifications {'insert'|'update'|'delete'|'reset': ids} sans réinitialiser la vue.
+
+        Les lignes modifiées ou supprimées présentes dans le cache sont traitées
+        individuellement ; sinon (insertions, lignes hors cache, 'reset') le
+        cache est invalidé et le nombre de lignes réajusté.
+        """
+        if self.sql is None:
+            return
+        deleted = set(changes.get('delete', ()))
+        updated = set(changes.get('update', ())) - deleted
+        if self.key_column is None or changes.get('insert') or 'reset' in changes:
+            self.invalidate()
+            return
+
+        found = self._find_rows(deleted)
+        if len(found) < len(deleted):
+            self.invalidate()
+            return
+        self._cancel_requests()
+        for row in sorted(found.values(), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self._row_count -= 1
+            self.endRemoveRows()
+        if found:
+            self._drop_pages_from(min(found.values()) // self.page_size)
+
+        rows = sorted(self._find_rows(updated).values())
+        for page in {row // self.page_size for row in rows}:
+            del self._pages[page]
+        if rows:
+            self._emit_rows_changed(rows[0], rows[-1])
+
+    def invalidate(self):
+        """Vide le cache et réajuste le nombre de lignes sans réinitialiser la vue.
+
+        Avec un worker, le comptage est fait en arrière-plan ; le nombre de
+        lignes est réajusté à son arrivée et fetchMore() attend jusque-là.
+        """
+        if self.sql is None:
+            return
+        self._cancel_requests()
+        self._pages.clear()
+        self._anchors.clear()
+        sql, params, _ = self._statement(0)
+        if self._at_end:
+            sql = f"SELECT COUNT(*) FROM ({sql})"
+        else:
+            # Comptage borné : seul importe de savoir s'il reste des lignes au-delà
+            sql, params = f"SELECT COUNT(*) FROM ({sql} LIMIT ?)", params + (self._row_count + 1,)
+
+        def count(cursor):
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+        if self.worker is None:
+            self._apply_count(count(self._cursor()))
+            return
+        generation = self._generation
+        self._fetching = True
+        request_id = None
+
+        def on_count(result):
+            self._requests.discard(request_id)
+            if generation == self._generation:
+                self._fetching = False
+                self._apply_count(result)
+
+        request_id = self.worker.submit(count, on_count, site=self.site)
+        self._requests.add(request_id)
+
+    def _apply_count(self, count):
+        """Réajuste le nombre de lignes au résultat du comptage de invalidate()"""
+        if count <= self._row_count:
+            self._at_end = True
+            if count < self._row_count:
+                self.beginRemoveRows(QModelIndex(), count, self._row_count - 1)
+                self._row_count = count
+                self.endRemoveRows()
+        elif self._at_end:
+            self.beginInsertRows(QModelIndex(), self._row_count, count - 1)
+            self._row_count = count
+            self.endInsertRows()
+        if self._row_count:
+            self._emit_rows_changed(0, self._row_count - 1)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        row = self.row_data(index.row(), wait=False)
+        if row is None:
+            return None
+        value = row[index.column()]
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+class NotesGridModel(QAbstractTableModel):
+    """Grille de saisie des notes d'une formation : un inscrit par ligne, une matière par colonne.
+
+    Les notes sont lues par blocs de `block_size` étudiants, seulement pour
+    les lignes que la vue affiche. Les saisies restent en mémoire jusqu'à
+    save(), qui les écrit toutes dans une seule transaction ; une cellule
+    vidée supprime la note.
+    """
+    modified = pyqtSignal(int)
+
+    def __init__(self, db_manager, formation_id, parent=None, block_size=64, max_blocks=32, worker=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.formation_id = formation_id
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.worker = worker
+        self.etudiants = []
+        self.matieres = []
+        self._rows = {}
+        self._blocks = OrderedDict()
+        self._loading = set()
+        self._generation = 0
+        self._pending = {}
+
+    def load(self, annee=None):
+        """Charge les inscrits et les matières (de l'année `annee`, ou toutes) ; abandonne les saisies.
+
+        Avec un worker, la grille est vidée puis remplie à l'arrivée de la lecture.
+        """
+        formation_id = self.formation_id
+
+        def read(cursor):
+            cursor.execute('''
+                SELECT DISTINCT e.id, e.matricule, e.nom, e.prenom
+                FROM inscriptions i
+                JOIN etudiants e ON e.id = i.etudiant_id
+                WHERE i.formation_id = ?
+                ORDER BY e.nom, e.prenom, e.id
+            ''', (formation_id,))
+            etudiants = cursor.fetchall()
+            cursor.execute('''
+                SELECT id, nom, annee, semestre FROM matieres
+                WHERE formation_id = ? AND (? IS NULL OR annee = ?)
+                ORDER BY annee, semestre, nom
+            ''', (formation_id, annee, annee))
+            return etudiants, cursor.fetchall()
+
+        if self.worker is None:
+            self._reset(*read(self.db_manager.get_connection().cursor()))
+        else:
+            self._reset([], [])
+            self.worker.submit(read, lambda result: self._reset(*result), group=(self, 'load'))
+
+    def _reset(self, etudiants, matieres):
+        self.beginResetModel()
+        self.etudiants, self.matieres = etudiants, matieres
+        self._rows = {etudiant[0]: row for row, etudiant in enumerate(etudiants)}
+        self._blocks.clear()
+        self._loading.clear()
+        self._generation += 1
+        self._pending.clear()
+        self.endResetModel()
+        self.modified.emit(0)
+
+    @staticmethod
+    def query_block(cursor, formation_id, etudiant_ids, matiere_ids):
+        """Retourne {(etudiant_id, matiere_id): note} pour un bloc d'étudiants ; exécuté par le worker"""
+        if not etudiant_ids or not matiere_ids:
+            return {}
+        cursor.execute(f'''
+            SELECT n.etudiant_id, n.matiere_id, n.note
+            FROM notes n
+            JOIN matieres m ON m.id = n.matiere_id AND m.semestre = n.semestre
+            WHERE n.etudiant_id IN ({', '.join('?' * len(etudiant_ids))}) AND m.formation_id = ?
+            ORDER BY n.annee_academique
+        ''', list(etudiant_ids) + [formation_id])
+        wanted = set(matiere_ids)
+        # Matière repassée : la note de l'année la plus récente, celle que la saisie remplace
+        return {(etudiant_id, matiere_id): note for etudiant_id, matiere_id, note in cursor.fetchall()
+                if matiere_id in wanted}
+
+    def _block_args(self, block):
+        first = block * self.block_size
+        etudiant_ids = [etudiant[0] for etudiant in self.etudiants[first:first + self.block_size]]
+        return self.formation_id, etudiant_ids, [matiere[0] for matiere in self.matieres]
+
+    def _store_block(self, block, notes):
+        self._blocks[block] = notes
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    def _request_block(self, block):
+        """Lit un bloc absent du cache, en arrière-plan si un worker est disponible"""
+        args = self._block_args(block)
+        if self.worker is None:
+            self._store_block(block, self.query_block(self.db_manager.get_connection().cursor(), *args))
+            return
+        if block in self._loading:
+            return
+        self._loading.add(block)
+        generation = self._generation
+
+        def on_block(notes):
+            if generation != self._generation:
+                return
+            self._loading.discard(block)
+            self._store_block(block, notes)
+            first = block * self.block_size
+            last = min(first + self.block_size, len(self.etudiants)) - 1
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.matieres) - 1))
+
+        self.worker.submit(lambda cursor: self.query_block(cursor, *args), on_block,
+                           site="NotesGridModel.query_block")
+
+    def note(self, row, column):
+        """Note affichée dans la cellule (saisie en attente comprise), ou None si pas encore lue"""
+        key = (self.etudiants[row][0], self.matieres[column][0])
+        if key in self._pending:
+            return self._pending[key]
+        block = row // self.block_size
+        notes = self._blocks.get(block)
+        if notes is None:
+            self._request_block(block)
+            notes = self._blocks.get(block)
+            if notes is None:
+                return None
+        else:
+            self._blocks.move_to_end(block)
+        return notes.get(key)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.etudiants)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.matieres)
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            value = self.note(index.row(), index.column())
+            return "" if value is None else f"{value:g}"
+        if role == Qt.ItemDataRole.BackgroundRole:
+            key = (self.etudiants[index.row()][0], self.matieres[index.column()][0])
+            if key in self._pending:
+                return QColor(255, 243, 205)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        text = str(value).strip().replace(',', '.')
+        try:
+            note = float(text) if text else None
+        except ValueError:
+            return False
+        if note is not None and not 0 <= note <= 20:
+            return False
+        key = (self.etudiants[index.row()][0], self.matieres[index.column()][0])
+        self._pending[key] = note
+        self.dataChanged.emit(index, index)
+        self.modified.emit(len(self._pending))
+        return True
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return super().headerData(section, orientation, role)
+        if orientation == Qt.Orientation.Horizontal:
+            _, nom, annee, semestre = self.matieres[section]
+            return f"{nom}\nA{annee} S{semestre}"
+        _, matricule, nom, prenom = self.etudiants[section]
+        return f"{matricule} - {nom} {prenom}"
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def revert(self):
+        """Abandonne les saisies non enregistrées"""
+        self._pending.clear()
+        self.modified.emit(0)
+        if self.etudiants and self.matieres:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.etudiants) - 1, len(self.matieres) - 1))
+
+    def save(self):
+        """Écrit toutes les saisies en attente dans une seule transaction ; retourne leur nombre"""
+        if not self._pending:
+            return 0
+        semestres = {matiere[0]: matiere[3] for matiere in self.matieres}
+        upserts = [(etudiant_id, matiere_id, note, semestres[matiere_id])
+                   for (etudiant_id, matiere_id), note in self._pending.items() if note is not None]
+        deletes = [(etudiant_id, matiere_id, semestres[matiere_id])
+                   for (etudiant_id, matiere_id), note in self._pending.items() if note is None]
+        self.db_manager.service.saisir_notes(upserts, deletes)
+
+        # Les blocs en cache reflètent désormais les valeurs enregistrées
+        for (etudiant_id, matiere_id), note in self._pending.items():
+            notes = self._blocks.get(self._rows[etudiant_id] // self.block_size)
+            if notes is None:
+                continue
+            if note is None:
+                notes.pop((etudiant_id, matiere_id), None)
+            else:
+                notes[(etudiant_id, matiere_id)] = note
+        count = len(self._pending)
+        self._pending.clear()
+        self.modified.emit(0)
+        return count
+
+class ChangeBus(QObject):
+    """Regroupe les modifications signalées par DatabaseManager et les diffuse par rafale.
+
+    `changed` est émis au plus une fois par intervalle de `delay` ms avec un
+    dictionnaire {table: {'insert'|'update'|'delete'|'reset': ensemble d'ids}}.
+    """
+    changed = pyqtSignal(object)
+    _received = pyqtSignal(str, str, object)
+
+    def __init__(self, db_manager, parent=None, delay=30):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self._pending = {}
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self.flush)
+        # Les notifications peuvent venir d'un autre thread : passage par un signal
+        self._received.connect(self._on_received)
+        self._listener = self._received.emit
+        self.db_manager.add_listener(self._listener)
+
+    def _on_received(self, table, kind, ids):
+        self._pending.setdefault(table, {}).setdefault(kind, set()).update(ids)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Diffuse immédiatement les modifications en attente"""
+        self._timer.stop()
+        if self._pending:
+            changes, self._pending = self._pending, {}
+            self.changed.emit(changes)
+
+    def detach(self):
+        """Se désabonne du DatabaseManager"""
+        self.db_manager.remove_listener(self._listener)
+        self._timer.stop()
+        self._pending = {}
+
+class _QueryRunner(QObject):
+    """Exécute les requêtes soumises au DatabaseWorker, dans le thread de celui-ci"""
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, db_manager):
+        super().__init__()
+        self.db_manager = db_manager
+        self._lock = threading.Lock()
+        self._cancelled = set()
+        self._running = None
+        self._last_started = 0
+        self._conn = None
+
+    def cancel(self, request_id):
+        """Annule une requête en attente, ou interrompt celle en cours d'exécution"""
+        with self._lock:
+            if request_id == self._running:
+                self._conn.interrupt()
+                self._cancelled.add(request_id)
+            elif request_id > self._last_started:
+                # Les requêtes sont exécutées dans l'ordre : celle-ci n'a pas encore démarré
+                self._cancelled.add(request_id)
+
+    def run(self, request_id, func):
+        with self._lock:
+            self._last_started = request_id
+            if request_id in self._cancelled:
+                self._cancelled.discard(request_id)
+                return
+            self._conn = self.db_manager.get_connection()
+            self._running = request_id
+        try:
+            result = func(self._conn.cursor())
+        except Exception as e:
+            if not isinstance(e, sqlite3.OperationalError) or request_id not in self._cancelled:
+                self.failed.emit(request_id, str(e))
+        else:
+            self.finished.emit(request_id, result)
+        finally:
+            with self._lock:
+                self._running = None
+                self._cancelled.discard(request_id)
+
+class DatabaseWorker(QObject):
+    """Exécute des lectures sur un QThread dédié et renvoie les résultats par signaux.
+
+    submit(func, callback) exécute func(cursor) dans le thread du worker puis
+    appelle callback(résultat) dans le thread principal. Une nouvelle requête
+    soumise avec le même `group` annule la précédente si elle n'est pas terminée.
+    """
+    _requested = pyqtSignal(int, object)
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self._next_id = 0
+        self._callbacks = {}
+        self._groups = {}
+
+        self._thread = QThread(self)
+        self._runner = _QueryRunner(db_manager)
+        self._runner.moveToThread(self._thread)
+        self._requested.connect(self._runner.run)
+        self._runner.finished.connect(self._on_finished)
+        self._runner.failed.connect(self._on_failed)
+        self._thread.start()
+
+    def submit(self, func, callback, group=None, errback=None, site=None):
+        """Met func(cursor) en file d'attente et retourne l'identifiant de la requête.
+
+        Les requêtes de func sont attribuées à `site` dans les statistiques,
+        par défaut la méthode qui appelle submit().
+        """
+        stats = self.db_manager.query_stats
+        site = site or stats.call_site(skip=1)
+
+        def traced(cursor):
+            with stats.site(site):
+                return func(cursor)
+
+        if group is not None:
+            self.cancel_group(group)
+        self._next_id += 1
+        request_id = self._next_id
+        self._callbacks[request_id] = (callback, errback, group)
+        if group is not None:
+            self._groups[group] = request_id
+        self._requested.emit(request_id, traced)
+        return request_id
+
+    def cancel(self, request_id):
+        """Annule une requête : son résultat ne sera jamais transmis"""
+        entry = self._callbacks.pop(request_id, None)
+        if entry is not None:
+            if entry[2] is not None and self._groups.get(entry[2]) == request_id:
+                del self._groups[entry[2]]
+            self._runner.cancel(request_id)
+
+    def cancel_group(self, group):
+        request_id = self._groups.get(group)
+        if request_id is not None:
+            self.cancel(request_id)
+
+    def _pop(self, request_id):
+        entry = self._callbacks.pop(request_id, None)
+        if entry is not None and entry[2] is not None and self._groups.get(entry[2]) == request_id:
+            del self._groups[entry[2]]
+        return entry
+
+    def _on_finished(self, request_id, result):
+        entry = self._pop(request_id)
+        if entry is not None:
+            entry[0](result)
+
+    def _on_failed(self, request_id, message):
+        entry = self._pop(request_id)
+        if entry is None:
+            return
+        if entry[1] is not None:
+            entry[1](message)
+        else:
+            logger.error("Erreur de requête en arrière-plan : %s", message)
+
+    def stop(self):
+        """Annule les requêtes en attente et arrête le thread"""
+        for request_id in list(self._callbacks):
+            self.cancel(request_id)
+        self._thread.quit()
+        self._thread.wait()
 
-        conn.commit()
-        conn.close()
+class SqlTableView(QTableView):
+    """Vue de table à sélection par ligne pour un SqlTableModel"""
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.verticalHeader().setVisible(False)
+
+    def currentRow(self):
+        return self.currentIndex().row()
+
+    def current_data(self, callback):
+        """Appelle callback(tuple) avec la ligne courante, s'il y en a une (voir SqlTableModel.rows_data)"""
+        row = self.currentRow()
+        if row >= 0:
+            self.model().rows_data([row], lambda rows: callback(rows[0]) if rows else None)
+
+class AnneeAcademiqueSpinBox(QSpinBox):
+    """Choix d'une année académique, affichée '2024-2025' ; vaut par défaut l'année en cours"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setRange(1990, 2100)
+        self.setValue(annee_academique_courante())
+
+    def textFromValue(self, value):
+        return libelle_annee(value)
+
+    def valueFromText(self, text):
+        return int(text.split('-')[0])
+
+    def validate(self, text, pos):
+        if re.fullmatch(r'\d{0,4}(-\d{0,4})?', text):
+            return QValidator.State.Intermediate if len(text) < 4 else QValidator.State.Acceptable, text, pos
+        return QValidator.State.Invalid, text, pos
+
+class StudentSearchBox(QLineEdit):
+    """Champ de recherche d'étudiants : propose les meilleurs résultats FTS5 au fil de la frappe.
+
+    La recherche part `delay` ms après la dernière frappe, sur le worker ;
+    une frappe plus récente annule la recherche en cours. `searched(texte)`
+    est émis à chaque recherche, `selected(id)` quand une proposition est
+    choisie (current_id() la retourne ensuite tant que le texte est inchangé).
+    """
+    searched = pyqtSignal(str)
+    selected = pyqtSignal(int)
+
+    def __init__(self, worker, parent=None, limit=20, delay=150, exclude_formation_id=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.limit = limit
+        self.exclude_formation_id = exclude_formation_id
+        self._selected_id = None
+        self.setPlaceholderText("Rechercher (matricule, nom, prénom, email)...")
+        self.setClearButtonEnabled(True)
+
+        self._results = QStandardItemModel(self)
+        self._completer = QCompleter(self._results, self)
+        self._completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self._completer.setWidget(self)
+        self._completer.activated[QModelIndex].connect(self._on_activated)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self.search)
+        self.textEdited.connect(self._on_edited)
+
+    def current_id(self):
+        return self._selected_id
+
+    def clear_selection(self):
+        self._selected_id = None
+        self.clear()
+
+    def _on_edited(self, text):
+        self._selected_id = None
+        self._timer.start()
+
+    def search(self):
+        text = self.text()
+        self.searched.emit(text)
+        limit, exclude = self.limit, self.exclude_formation_id
+        self.worker.submit(lambda cursor: search_etudiants(cursor, text, limit, exclude),
+                           self._show_results, group=(self, 'recherche'))
+
+    def _show_results(self, rows):
+        self._results.clear()
+        for etudiant_id, matricule, nom, prenom in rows:
+            item = QStandardItem(f"{matricule} - {nom} {prenom}")
+            item.setData(etudiant_id, Qt.ItemDataRole.UserRole)
+            self._results.appendRow(item)
+        if rows and self.hasFocus():
+            self._completer.complete()
+        else:
+            self._completer.popup().hide()
 
-    def get_connection(self):
-        return sqlite3.connect(self.db_name)
+    def _on_activated(self, index):
+        self._selected_id = index.data(Qt.ItemDataRole.UserRole)
+        self.setText(index.data())
+        self.selected.emit(self._selected_id)
 
 class DepartementDialog(QDialog):
     def __init__(self, parent=None, departement_data=None):
@@ -298,12 +1069,109 @@ class MatiereDialog(QDialog):
             'semestre': int(self.semestre_combo.currentText())
         }
 
-class DepartementsTab(QWidget):
-    data_changed = pyqtSignal()
+class BulletinBatchDialog(QDialog):
+    def __init__(self, parent, nb_annees):
+        super().__init__(parent)
+        self.setWindowTitle("Bulletins de la formation")
+        self.setModal(True)
+        self.resize(450, 180)
+        self.nb_annees = nb_annees
+        self.setup_ui()
 
-    def __init__(self, db_manager):
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        form_layout = QFormLayout()
+
+        self.annee_combo = QComboBox()
+        self.annee_combo.addItem("Toutes", None)
+        for annee in range(1, self.nb_annees + 1):
+            self.annee_combo.addItem(str(annee), annee)
+
+        self.semestre_combo = QComboBox()
+        self.semestre_combo.addItem("Tous", None)
+        self.semestre_combo.addItem("1", 1)
+        self.semestre_combo.addItem("2", 2)
+
+        self.dossier_edit = QLineEdit()
+        parcourir_btn = QPushButton("Parcourir...")
+        parcourir_btn.clicked.connect(self.choisir_dossier)
+        dossier_layout = QHBoxLayout()
+        dossier_layout.addWidget(self.dossier_edit)
+        dossier_layout.addWidget(parcourir_btn)
+
+        form_layout.addRow("Année:", self.annee_combo)
+        form_layout.addRow("Semestre:", self.semestre_combo)
+        form_layout.addRow("Dossier:", dossier_layout)
+
+        layout.addLayout(form_layout)
+
+        # Boutons
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok |
+                                      QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        layout.addWidget(button_box)
+        self.setLayout(layout)
+
+    def choisir_dossier(self):
+        dossier = QFileDialog.getExistingDirectory(self, "Dossier des bulletins")
+        if dossier:
+            self.dossier_edit.setText(dossier)
+
+    def get_data(self):
+        return {
+            'annee': self.annee_combo.currentData(),
+            'semestre': self.semestre_combo.currentData(),
+            'dossier': self.dossier_edit.text(),
+        }
+
+def exporter_fichier(parent, db_manager, formation_id=None, formation_nom=None):
+    """Demande les données et le fichier d'un export puis l'écrit (CSV, XLSX ou JSON Lines).
+
+    Sans formation, l'export porte sur toute la base. Les lignes sont écrites
+    au fil de la lecture (Exporter) ; l'export peut être annulé.
+    """
+    types = {"Étudiants": 'etudiants', "Notes": 'notes'}
+    if formation_id is not None:
+        types = {"Étudiants inscrits": 'etudiants', "Notes": 'notes', "Résultats": 'resultats'}
+    portee = f"formation {formation_nom}" if formation_id is not None else "toute la base"
+    choix, ok = QInputDialog.getItem(parent, "Exporter", f"Données à exporter ({portee}) :", list(types), 0, False)
+    if not ok:
+        return
+    extensions = {"CSV (*.csv)": '.csv', "Excel (*.xlsx)": '.xlsx', "JSON Lines (*.jsonl)": '.jsonl'}
+    path, filtre = QFileDialog.getSaveFileName(parent, "Exporter " + choix.lower(), types[choix] + '.csv',
+                                               ';;'.join(extensions))
+    if not path:
+        return
+    if not os.path.splitext(path)[1]:
+        path += extensions.get(filtre, '.csv')
+
+    progress = QProgressDialog("Export en cours...", "Annuler", 0, 0, parent)
+    progress.setWindowModality(Qt.WindowModality.WindowModal)
+    progress.show()
+
+    def avancement(nb):
+        progress.setLabelText(f"{nb} ligne(s) écrite(s)...")
+        QApplication.processEvents()
+        return progress.wasCanceled()
+
+    try:
+        nb = Exporter(db_manager.service, progress=avancement).export(types[choix], path, formation_id)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        progress.close()
+        QMessageBox.warning(parent, "Erreur", f"Export impossible : {e}")
+        return
+    progress.close()
+    if nb is not None:
+        QMessageBox.information(parent, "Export terminé", f"{nb} ligne(s) exportée(s) dans {path}")
+
+class DepartementsTab(QWidget):
+    def __init__(self, db_manager, worker):
         super().__init__()
         self.db_manager = db_manager
+        self.worker = worker
         self.setup_ui()
         self.load_data()
 
@@ -320,102 +1188,77 @@ class DepartementsTab(QWidget):
         self.add_btn = QPushButton("Ajouter Département")
         self.edit_btn = QPushButton("Modifier")
         self.delete_btn = QPushButton("Supprimer")
+        self.export_btn = QPushButton("Exporter...")
 
         self.add_btn.clicked.connect(self.add_departement)
         self.edit_btn.clicked.connect(self.edit_departement)
         self.delete_btn.clicked.connect(self.delete_departement)
+        self.export_btn.clicked.connect(lambda: exporter_fichier(self, self.db_manager))
 
         button_layout.addWidget(self.add_btn)
         button_layout.addWidget(self.edit_btn)
         button_layout.addWidget(self.delete_btn)
+        button_layout.addWidget(self.export_btn)
         button_layout.addStretch()
 
         layout.addLayout(button_layout)
 
         # Table des départements
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["ID", "Nom", "Description"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.model = SqlTableModel(self.db_manager, ["ID", "Nom", "Description"], self, worker=self.worker)
+        self.table = SqlTableView(self.model)
         layout.addWidget(self.table)
 
         self.setLayout(layout)
 
     def load_data(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM departements")
-        data = cursor.fetchall()
-        conn.close()
+        self.model.set_query("SELECT id, nom, description FROM departements ORDER BY id")
 
-        self.table.setRowCount(len(data))
-        for row, item in enumerate(data):
-            for col, value in enumerate(item):
-                self.table.setItem(row, col, QTableWidgetItem(str(value) if value else ""))
+    def on_changes(self, changes):
+        """Applique les modifications diffusées par le ChangeBus"""
+        if 'departements' in changes:
+            self.model.apply_changes(changes['departements'])
 
     def add_departement(self):
         dialog = DepartementDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             data = dialog.get_data()
             if data['nom']:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
                 try:
-                    cursor.execute("INSERT INTO departements (nom, description) VALUES (?, ?)",
-                                   (data['nom'], data['description']))
-                    conn.commit()
-                    self.load_data()
-                    self.data_changed.emit()
+                    self.db_manager.service.creer('departements', data)
                     QMessageBox.information(self, "Succès", "Département ajouté avec succès!")
                 except sqlite3.IntegrityError:
                     QMessageBox.warning(self, "Erreur", "Ce nom de département existe déjà!")
-                finally:
-                    conn.close()
 
     def edit_departement(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            dept_id = int(self.table.item(current_row, 0).text())
-            dept_data = (dept_id,
-                         self.table.item(current_row, 1).text(),
-                         self.table.item(current_row, 2).text())
+        def edit(dept_data):
+            dept_id = dept_data[0]
 
             dialog = DepartementDialog(self, dept_data)
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 data = dialog.get_data()
                 if data['nom']:
-                    conn = self.db_manager.get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE departements SET nom=?, description=? WHERE id=?",
-                                   (data['nom'], data['description'], dept_id))
-                    conn.commit()
-                    conn.close()
-                    self.load_data()
-                    self.data_changed.emit()
+                    self.db_manager.service.modifier('departements', dept_id, data)
                     QMessageBox.information(self, "Succès", "Département modifié avec succès!")
 
+        self.table.current_data(edit)
+
     def delete_departement(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            dept_id = int(self.table.item(current_row, 0).text())
+        def delete(row):
+            dept_id = row[0]
             reply = QMessageBox.question(self, "Confirmation",
-                                         "Êtes-vous sûr de vouloir supprimer ce département?")
+                                         "Êtes-vous sûr de vouloir supprimer ce département, ses formations "
+                                         "et toutes leurs matières, inscriptions et notes?")
             if reply == QMessageBox.StandardButton.Yes:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM departements WHERE id=?", (dept_id,))
-                conn.commit()
-                conn.close()
-                self.load_data()
-                self.data_changed.emit()
+                self.db_manager.service.supprimer('departements', [dept_id])
                 QMessageBox.information(self, "Succès", "Département supprimé avec succès!")
 
-class FormationsTab(QWidget):
-    data_changed = pyqtSignal()
+        self.table.current_data(delete)
 
-    def __init__(self, db_manager):
+class FormationsTab(QWidget):
+    def __init__(self, db_manager, worker):
         super().__init__()
         self.db_manager = db_manager
+        self.worker = worker
         self.setup_ui()
         self.load_data()
 
@@ -434,53 +1277,63 @@ class FormationsTab(QWidget):
         self.delete_btn = QPushButton("Supprimer")
         self.manage_subjects_btn = QPushButton("Gérer Matières")
         self.manage_students_btn = QPushButton("Gérer Étudiants")
+        self.notes_grid_btn = QPushButton("Saisie des Notes")
+        self.bulletins_btn = QPushButton("Bulletins PDF")
+        self.statistiques_btn = QPushButton("Statistiques")
+        self.export_btn = QPushButton("Exporter...")
 
         self.add_btn.clicked.connect(self.add_formation)
         self.edit_btn.clicked.connect(self.edit_formation)
         self.delete_btn.clicked.connect(self.delete_formation)
         self.manage_subjects_btn.clicked.connect(self.manage_subjects)
         self.manage_students_btn.clicked.connect(self.manage_students)
+        self.notes_grid_btn.clicked.connect(self.notes_grid)
+        self.bulletins_btn.clicked.connect(self.generate_bulletins)
+        self.statistiques_btn.clicked.connect(self.show_statistiques)
+        self.export_btn.clicked.connect(self.export_data)
 
         button_layout.addWidget(self.add_btn)
         button_layout.addWidget(self.edit_btn)
         button_layout.addWidget(self.delete_btn)
         button_layout.addWidget(self.manage_subjects_btn)
         button_layout.addWidget(self.manage_students_btn)
+        button_layout.addWidget(self.notes_grid_btn)
+        button_layout.addWidget(self.bulletins_btn)
+        button_layout.addWidget(self.statistiques_btn)
+        button_layout.addWidget(self.export_btn)
         button_layout.addStretch()
 
         layout.addLayout(button_layout)
 
         # Table des formations
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["ID", "Nom", "Nb Années", "Département"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.model = SqlTableModel(self.db_manager, ["ID", "Nom", "Nb Années", "Département"], self,
+                                   worker=self.worker)
+        self.table = SqlTableView(self.model)
         layout.addWidget(self.table)
 
         self.setLayout(layout)
 
     def load_data(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        self.model.set_query('''
             SELECT f.id, f.nom, f.nb_annees, d.nom 
             FROM formations f 
             LEFT JOIN departements d ON f.departement_id = d.id
+            ORDER BY f.id
         ''')
-        data = cursor.fetchall()
-        conn.close()
 
-        self.table.setRowCount(len(data))
-        for row, item in enumerate(data):
-            for col, value in enumerate(item):
-                self.table.setItem(row, col, QTableWidgetItem(str(value) if value else ""))
+    def on_changes(self, changes):
+        """Applique les modifications diffusées par le ChangeBus"""
+        if 'formations' in changes:
+            self.model.apply_changes(changes['formations'])
+        # Le nom du département est affiché : un renommage ou une suppression invalide la vue
+        departements = changes.get('departements', {})
+        if departements.get('update') or departements.get('delete') or 'reset' in departements:
+            self.model.invalidate()
 
     def get_departements(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
+        cursor = self.db_manager.get_connection().cursor()
         cursor.execute("SELECT * FROM departements")
         data = cursor.fetchall()
-        conn.close()
         return data
 
     def add_formation(self):
@@ -493,81 +1346,122 @@ class FormationsTab(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             data = dialog.get_data()
             if data['nom']:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO formations (nom, nb_annees, departement_id) VALUES (?, ?, ?)",
-                               (data['nom'], data['nb_annees'], data['departement_id']))
-                conn.commit()
-                conn.close()
-                self.load_data()
-                self.data_changed.emit()
+                self.db_manager.service.creer('formations', data)
                 QMessageBox.information(self, "Succès", "Formation ajoutée avec succès!")
 
     def edit_formation(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            formation_id = int(self.table.item(current_row, 0).text())
+        def edit(row):
+            formation_id = row[0]
 
             # Récupérer les données complètes
-            conn = self.db_manager.get_connection()
-            cursor = conn.cursor()
+            cursor = self.db_manager.get_connection().cursor()
             cursor.execute("SELECT * FROM formations WHERE id=?", (formation_id,))
             formation_data = cursor.fetchone()
-            conn.close()
 
             departements = self.get_departements()
             dialog = FormationDialog(self, formation_data, departements)
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 data = dialog.get_data()
                 if data['nom']:
-                    conn = self.db_manager.get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE formations SET nom=?, nb_annees=?, departement_id=? WHERE id=?",
-                                   (data['nom'], data['nb_annees'], data['departement_id'], formation_id))
-                    conn.commit()
-                    conn.close()
-                    self.load_data()
-                    self.data_changed.emit()
+                    self.db_manager.service.modifier('formations', formation_id, data)
                     QMessageBox.information(self, "Succès", "Formation modifiée avec succès!")
 
+        self.table.current_data(edit)
+
     def delete_formation(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            formation_id = int(self.table.item(current_row, 0).text())
+        def delete(row):
+            formation_id = row[0]
             reply = QMessageBox.question(self, "Confirmation",
-                                         "Êtes-vous sûr de vouloir supprimer cette formation?")
+                                         "Êtes-vous sûr de vouloir supprimer cette formation, ses matières, "
+                                         "ses inscriptions et les notes associées?")
             if reply == QMessageBox.StandardButton.Yes:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM formations WHERE id=?", (formation_id,))
-                conn.commit()
-                conn.close()
-                self.load_data()
-                self.data_changed.emit()
+                self.db_manager.service.supprimer('formations', [formation_id])
                 QMessageBox.information(self, "Succès", "Formation supprimée avec succès!")
 
+        self.table.current_data(delete)
+
     def manage_subjects(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            formation_id = int(self.table.item(current_row, 0).text())
-            formation_name = self.table.item(current_row, 1).text()
-            dialog = SubjectsManagementDialog(self, self.db_manager, formation_id, formation_name)
+        def manage(row):
+            formation_id, formation_name = row[:2]
+            dialog = SubjectsManagementDialog(self, self.db_manager, formation_id, formation_name, self.worker)
             dialog.exec()
 
+        self.table.current_data(manage)
+
     def manage_students(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            formation_id = int(self.table.item(current_row, 0).text())
-            formation_name = self.table.item(current_row, 1).text()
-            dialog = StudentsManagementDialog(self, self.db_manager, formation_id, formation_name)
+        def manage(row):
+            formation_id, formation_name = row[:2]
+            dialog = StudentsManagementDialog(self, self.db_manager, formation_id, formation_name, self.worker)
+            dialog.exec()
+
+        self.table.current_data(manage)
+
+    def notes_grid(self):
+        def open_grid(row):
+            formation_id, formation_name, nb_annees = row[:3]
+            dialog = NotesGridDialog(self, self.db_manager, formation_id, formation_name, nb_annees, self.worker)
             dialog.exec()
 
+        self.table.current_data(open_grid)
+
+    def generate_bulletins(self):
+        """Génère les bulletins PDF de tous les inscrits de la formation sélectionnée"""
+        self.table.current_data(self._generate_bulletins)
+
+    def _generate_bulletins(self, row):
+        formation_id, _, nb_annees = row[:3]
+        dialog = BulletinBatchDialog(self, nb_annees)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        data = dialog.get_data()
+        if not data['dossier']:
+            QMessageBox.warning(self, "Erreur", "Veuillez choisir un dossier!")
+            return
+
+        progress = QProgressDialog("Génération des bulletins...", "Annuler", 0, 0, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.show()
+
+        def avancement(faits, total):
+            progress.setMaximum(total)
+            progress.setValue(faits)
+            QApplication.processEvents()
+            return progress.wasCanceled()
+
+        batch = BulletinBatch(self.db_manager, formation_id, data['dossier'], data['annee'], data['semestre'])
+        try:
+            generes, deja_faits = batch.run(avancement)
+        except OSError as e:
+            progress.close()
+            QMessageBox.warning(self, "Erreur", f"Génération impossible : {e}")
+            return
+        progress.close()
+        QMessageBox.information(self, "Bulletins",
+                                f"{generes} bulletin(s) généré(s), {deja_faits} déjà présent(s).")
+
+    def show_statistiques(self):
+        def show(row):
+            formation_id, formation_name, nb_annees = row[:3]
+            dialog = StatistiquesDialog(self, self.db_manager, formation_id, formation_name, nb_annees, self.worker)
+            dialog.exec()
+
+        self.table.current_data(show)
+
+    def export_data(self):
+        """Exporte les inscrits, les notes ou les résultats de la formation sélectionnée (toute la base sinon)"""
+        if self.table.currentRow() >= 0:
+            self.table.current_data(lambda row: exporter_fichier(self, self.db_manager, *row[:2]))
+        else:
+            exporter_fichier(self, self.db_manager)
+
 class SubjectsManagementDialog(QDialog):
-    def __init__(self, parent, db_manager, formation_id, formation_name):
+    def __init__(self, parent, db_manager, formation_id, formation_name, worker):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.worker = worker
         self.formation_id = formation_id
         self.formation_name = formation_name
+        self.matieres = []
         self.setWindowTitle(f"Gestion des Matières - {formation_name}")
         self.setModal(True)
         self.resize(600, 400)
@@ -614,13 +1508,17 @@ class SubjectsManagementDialog(QDialog):
         self.setLayout(layout)
 
     def load_data(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM matieres WHERE formation_id=? ORDER BY annee, nom",
-                       (self.formation_id,))
-        data = cursor.fetchall()
-        conn.close()
+        """Lit les matières sur le worker ; le tableau est rempli à leur arrivée"""
+        formation_id = self.formation_id
+
+        def matieres(cursor):
+            cursor.execute("SELECT * FROM matieres WHERE formation_id=? ORDER BY annee, nom", (formation_id,))
+            return cursor.fetchall()
+
+        self.worker.submit(matieres, self.show_data, group=(self, 'matieres'))
 
+    def show_data(self, data):
+        self.matieres = data
         self.table.setRowCount(len(data))
         for row, item in enumerate(data):
             for col in range(5):  # Afficher les 4 colonnes
@@ -632,38 +1530,24 @@ class SubjectsManagementDialog(QDialog):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             data = dialog.get_data()
             if data['nom']:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO matieres (nom, credits, formation_id, annee, semestre) VALUES (?, ?, ?, ?, ?)",
-                    (data['nom'], data['credits'], self.formation_id, data['annee'], data['semestre']))
-                conn.commit()
-                conn.close()
+                self.db_manager.service.creer('matieres', dict(data, formation_id=self.formation_id))
                 self.load_data()
                 QMessageBox.information(self, "Succès", "Matière ajoutée avec succès!")
 
     def edit_matiere(self):
         current_row = self.table.currentRow()
         if current_row >= 0:
-            matiere_id = int(self.table.item(current_row, 0).text())
-
-            # Récupérer les données complètes
-            conn = self.db_manager.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM matieres WHERE id=?", (matiere_id,))
-            matiere_data = cursor.fetchone()
-            conn.close()
+            # Données complètes, lues avec le tableau
+            matiere_data = self.matieres[current_row]
+            matiere_id = matiere_data[0]
 
             dialog = MatiereDialog(self, matiere_data)
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 data = dialog.get_data()
                 if data['nom']:
-                    conn = self.db_manager.get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE matieres SET nom=?, credits=?, annee=? WHERE id=?",
-                                   (data['nom'], data['credits'], data['annee'], matiere_id))
-                    conn.commit()
-                    conn.close()
+                    # Le semestre n'est pas modifiable : les notes déjà saisies portent le leur
+                    self.db_manager.service.modifier('matieres', matiere_id,
+                                                     {colonne: data[colonne] for colonne in ('nom', 'credits', 'annee')})
                     self.load_data()
                     QMessageBox.information(self, "Succès", "Matière modifiée avec succès!")
 
@@ -672,20 +1556,22 @@ class SubjectsManagementDialog(QDialog):
         if current_row >= 0:
             matiere_id = int(self.table.item(current_row, 0).text())
             reply = QMessageBox.question(self, "Confirmation",
-                                         "Êtes-vous sûr de vouloir supprimer cette matière?")
+                                         "Êtes-vous sûr de vouloir supprimer cette matière et ses notes?")
             if reply == QMessageBox.StandardButton.Yes:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM matieres WHERE id=?", (matiere_id,))
-                conn.commit()
-                conn.close()
+                self.db_manager.service.supprimer('matieres', [matiere_id])
                 self.load_data()
                 QMessageBox.information(self, "Succès", "Matière supprimée avec succès!")
 
+    def done(self, result):
+        self.worker.cancel_group((self, 'matieres'))
+        super().done(result)
+
 class StudentsManagementDialog(QDialog):
-    def __init__(self, parent, db_manager, formation_id, formation_name):
+    def __init__(self, parent, db_manager, formation_id, formation_name, worker):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.service = db_manager.service
+        self.worker = worker
         self.formation_id = formation_id
         self.formation_name = formation_name
         self.setWindowTitle(f"Gestion des Étudiants - {formation_name}")
@@ -694,6 +1580,9 @@ class StudentsManagementDialog(QDialog):
         self.setup_ui()
         self.load_data()
 
+        self.change_bus = ChangeBus(self.db_manager, self)
+        self.change_bus.changed.connect(self.on_changes)
+
     def setup_ui(self):
         layout = QVBoxLayout()
 
@@ -706,15 +1595,26 @@ class StudentsManagementDialog(QDialog):
         inscription_group = QGroupBox("Inscrire un étudiant")
         inscription_layout = QHBoxLayout()
 
-        self.etudiant_combo = QComboBox()
-        self.load_available_students()
+        # Recherche plein texte parmi les étudiants non inscrits
+        self.etudiant_search = StudentSearchBox(self.worker, self, exclude_formation_id=self.formation_id)
+        self.etudiant_search.setMinimumWidth(350)
+
+        self.annee_spin = AnneeAcademiqueSpinBox()
 
         self.inscrire_btn = QPushButton("Inscrire")
         self.inscrire_btn.clicked.connect(self.inscrire_etudiant)
+        self.inscrire_plusieurs_btn = QPushButton("Inscrire plusieurs...")
+        self.inscrire_plusieurs_btn.clicked.connect(self.inscrire_plusieurs)
+        self.copier_btn = QPushButton("Copier depuis...")
+        self.copier_btn.clicked.connect(self.copier_inscriptions)
 
         inscription_layout.addWidget(QLabel("Étudiant:"))
-        inscription_layout.addWidget(self.etudiant_combo)
+        inscription_layout.addWidget(self.etudiant_search)
+        inscription_layout.addWidget(QLabel("Année:"))
+        inscription_layout.addWidget(self.annee_spin)
         inscription_layout.addWidget(self.inscrire_btn)
+        inscription_layout.addWidget(self.inscrire_plusieurs_btn)
+        inscription_layout.addWidget(self.copier_btn)
         inscription_layout.addStretch()
 
         inscription_group.setLayout(inscription_layout)
@@ -735,10 +1635,10 @@ class StudentsManagementDialog(QDialog):
         layout.addLayout(button_layout)
 
         # Table des étudiants inscrits
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Matricule", "Nom", "Prénom", "Email", "Téléphone"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.model = SqlTableModel(self.db_manager, ["Matricule", "Nom", "Prénom", "Email", "Téléphone"], self,
+                                   key_column=5, worker=self.worker)
+        self.table = SqlTableView(self.model)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         layout.addWidget(self.table)
 
         # Bouton fermer
@@ -748,105 +1648,579 @@ class StudentsManagementDialog(QDialog):
 
         self.setLayout(layout)
 
-    def load_available_students(self):
-        """Charge les étudiants non inscrits à cette formation"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT e.id, e.matricule, e.nom, e.prenom 
-            FROM etudiants e 
-            WHERE e.id NOT IN (
-                SELECT i.etudiant_id 
-                FROM inscriptions i 
-                WHERE i.formation_id = ?
-            )
-        ''', (self.formation_id,))
-        data = cursor.fetchall()
-        conn.close()
-
-        self.etudiant_combo.clear()
-        for etudiant in data:
-            self.etudiant_combo.addItem(f"{etudiant[1]} - {etudiant[2]} {etudiant[3]}", etudiant[0])
-
     def load_data(self):
-        """Charge les étudiants inscrits à cette formation"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT e.matricule, e.nom, e.prenom, e.email, e.telephone
+        """Charge les étudiants inscrits à cette formation, une ligne par étudiant quelles que soient les années"""
+        # La dernière colonne (id) n'est pas affichée
+        self.model.set_query('''
+            SELECT e.matricule, e.nom, e.prenom, e.email, e.telephone, e.id
             FROM etudiants e
-            JOIN inscriptions i ON e.id = i.etudiant_id
-            WHERE i.formation_id = ?
+            WHERE e.id IN (SELECT etudiant_id FROM inscriptions WHERE formation_id = ?)
+            ORDER BY e.nom, e.prenom, e.id
         ''', (self.formation_id,))
-        data = cursor.fetchall()
-        conn.close()
 
-        self.table.setRowCount(len(data))
-        for row, item in enumerate(data):
-            for col in range(5):
-                self.table.setItem(row, col, QTableWidgetItem(str(item[col]) if item[col] else ""))
+    def on_changes(self, changes):
+        """Applique les modifications diffusées par le ChangeBus"""
+        if 'inscriptions' in changes:
+            self.model.invalidate()
+        elif 'etudiants' in changes:
+            self.model.apply_changes(changes['etudiants'])
 
-        # Recharger les étudiants disponibles
-        self.load_available_students()
+    def done(self, result):
+        self.change_bus.detach()
+        self.worker.cancel_group((self.etudiant_search, 'recherche'))
+        super().done(result)
 
-    def inscrire_etudiant(self):
-        if self.etudiant_combo.currentData():
-            etudiant_id = self.etudiant_combo.currentData()
+    def inscrire(self, etudiant_ids):
+        """Inscrit les étudiants dont `etudiant_ids(cursor)` retourne les ids, en une transaction.
 
-            conn = self.db_manager.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO inscriptions (etudiant_id, formation_id, annee_inscription) VALUES (?, ?, ?)",
-                           (etudiant_id, self.formation_id, 2024))  # Année par défaut
-            conn.commit()
-            conn.close()
+        La liste est lue dans la même transaction que l'écriture ; retourne le
+        nombre d'inscriptions créées.
+        """
+        # La vue est mise à jour par le ChangeBus, une seule fois pour tout le lot
+        return self.service.inscrire(self.formation_id, etudiant_ids, self.annee_spin.value())
 
-            self.load_data()
+    def inscrire_etudiant(self):
+        if self.etudiant_search.current_id():
+            etudiant_id = self.etudiant_search.current_id()
+            self.inscrire(lambda cursor: [etudiant_id])
+            self.etudiant_search.clear_selection()
             QMessageBox.information(self, "Succès", "Étudiant inscrit avec succès!")
 
-    def desinscrire_etudiant(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            matricule = self.table.item(current_row, 0).text()
+    def inscrire_plusieurs(self):
+        dialog = InscriptionMultipleDialog(self, self.db_manager, self.formation_id, self.worker)
+        dialog.exec()
 
-            # Récupérer l'ID de l'étudiant
-            conn = self.db_manager.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM etudiants WHERE matricule = ?", (matricule,))
-            etudiant_id = cursor.fetchone()[0]
+    def copier_inscriptions(self):
+        dialog = CopieInscriptionsDialog(self, self.db_manager, self.formation_id)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        formation_id, annee = dialog.get_data()
+        if formation_id is None:
+            return
+
+        def etudiant_ids(cursor):
+            if annee is None:
+                cursor.execute("SELECT DISTINCT etudiant_id FROM inscriptions WHERE formation_id = ?",
+                               (formation_id,))
+            else:
+                cursor.execute('''
+                    SELECT DISTINCT etudiant_id FROM inscriptions
+                    WHERE formation_id = ? AND annee_inscription = ?
+                ''', (formation_id, annee))
+            return [row[0] for row in cursor.fetchall()]
+
+        count = self.inscrire(etudiant_ids)
+        QMessageBox.information(self, "Succès", f"{count} étudiant(s) inscrit(s).")
+
+    def desinscrire_etudiant(self):
+        def desinscrire(lignes):
+            etudiant_ids = [ligne[5] for ligne in lignes]
 
             reply = QMessageBox.question(self, "Confirmation",
-                                         "Êtes-vous sûr de vouloir désinscrire cet étudiant?")
+                                         "Êtes-vous sûr de vouloir désinscrire cet étudiant?" if len(lignes) == 1
+                                         else f"Êtes-vous sûr de vouloir désinscrire ces {len(lignes)} étudiants?")
             if reply == QMessageBox.StandardButton.Yes:
-                cursor.execute("DELETE FROM inscriptions WHERE etudiant_id = ? AND formation_id = ?",
-                               (etudiant_id, self.formation_id))
-                conn.commit()
-                conn.close()
+                self.service.desinscrire(self.formation_id, etudiant_ids)
+                QMessageBox.information(self, "Succès", "Désinscription effectuée avec succès!")
 
-                self.load_data()
-                QMessageBox.information(self, "Succès", "Étudiant désinscrit avec succès!")
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        if rows:
+            self.model.rows_data(rows, desinscrire)
 
     def gerer_notes(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            matricule = self.table.item(current_row, 0).text()
-            nom = self.table.item(current_row, 1).text()
-            prenom = self.table.item(current_row, 2).text()
-
-            # Récupérer l'ID de l'étudiant
-            conn = self.db_manager.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM etudiants WHERE matricule = ?", (matricule,))
-            etudiant_id = cursor.fetchone()[0]
-            conn.close()
+        def gerer(row):
+            _, nom, prenom, _, _, etudiant_id = row
 
             dialog = NotesManagementDialog(self, self.db_manager, etudiant_id,
-                                           f"{nom} {prenom}", self.formation_id)
+                                           f"{nom} {prenom}", self.formation_id, self.worker)
             dialog.exec()
 
+        self.table.current_data(gerer)
+
+class InscriptionMultipleDialog(QDialog):
+    """Inscription d'une sélection d'étudiants, ou de tous ceux qui correspondent aux filtres"""
+
+    FILTERS = {1: "Matricule", 2: "Nom", 3: "Prénom", 4: "Email"}
+
+    def __init__(self, parent, db_manager, formation_id, worker):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.worker = worker
+        self.formation_id = formation_id
+        self.setWindowTitle("Inscrire plusieurs étudiants")
+        self.setModal(True)
+        self.resize(800, 500)
+        self.setup_ui()
+        self.load_data()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        # Recherche plein texte et filtres par colonne (début du texte)
+        filter_layout = QHBoxLayout()
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.load_data)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Rechercher...")
+        self.search_edit.textChanged.connect(self.filter_timer.start)
+        filter_layout.addWidget(self.search_edit)
+        self.filters = {}
+        for column, label in self.FILTERS.items():
+            edit = QLineEdit()
+            edit.setPlaceholderText(f"{label} commence par...")
+            edit.setClearButtonEnabled(True)
+            edit.textChanged.connect(self.filter_timer.start)
+            filter_layout.addWidget(edit)
+            self.filters[column] = edit
+        layout.addLayout(filter_layout)
+
+        # Étudiants non encore inscrits à la formation
+        self.model = SqlTableModel(self.db_manager, EtudiantsTab.COLUMNS, self, worker=self.worker)
+        self.table = SqlTableView(self.model)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setColumnHidden(0, True)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.selection_btn = QPushButton("Inscrire la sélection")
+        self.filtre_btn = QPushButton("Inscrire tous les résultats")
+        close_btn = QPushButton("Fermer")
+        self.selection_btn.clicked.connect(self.inscrire_selection)
+        self.filtre_btn.clicked.connect(self.inscrire_filtre)
+        close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(self.selection_btn)
+        button_layout.addWidget(self.filtre_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def filter_values(self):
+        return self.search_edit.text(), {column: edit.text() for column, edit in self.filters.items()}
+
+    def load_data(self):
+        self.filter_timer.stop()
+        search, filters = self.filter_values()
+        self.model.set_query(*etudiants_query(search, filters, exclude_formation_id=self.formation_id))
+
+    def _inscrire(self, etudiant_ids):
+        count = self.parent().inscrire(etudiant_ids)
+        # Les étudiants inscrits disparaissent de la liste
+        self.model.invalidate()
+        QMessageBox.information(self, "Succès", f"{count} étudiant(s) inscrit(s).")
+
+    def inscrire_selection(self):
+        def inscrire(lignes):
+            etudiant_ids = [ligne[0] for ligne in lignes]
+            self.table.clearSelection()
+            self._inscrire(lambda cursor: etudiant_ids)
+
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        if rows:
+            self.model.rows_data(rows, inscrire)
+
+    def inscrire_filtre(self):
+        conditions, params = etudiants_filter(*self.filter_values(), exclude_formation_id=self.formation_id)
+        where = ' AND '.join(conditions)
+
+        def compter(cursor):
+            cursor.execute(f"SELECT COUNT(*) FROM etudiants WHERE {where}", params)
+            return cursor.fetchone()[0]
+
+        def etudiant_ids(cursor):
+            cursor.execute(f"SELECT id FROM etudiants WHERE {where}", params)
+            return [row[0] for row in cursor.fetchall()]
+
+        def confirmer(count):
+            if not count:
+                return
+            reply = QMessageBox.question(self, "Confirmation",
+                                         f"Inscrire les {count} étudiant(s) correspondant à la recherche ?")
+            if reply == QMessageBox.StandardButton.Yes:
+                self._inscrire(etudiant_ids)
+
+        self.worker.submit(compter, confirmer, group=(self, 'compter'))
+
+class CopieInscriptionsDialog(QDialog):
+    """Choix de la formation (et de l'année d'inscription) dont on copie les inscrits"""
+
+    def __init__(self, parent, db_manager, formation_id):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.formation_id = formation_id
+        self.setWindowTitle("Copier les inscriptions")
+        self.setModal(True)
+        self.resize(400, 150)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        form_layout = QFormLayout()
+
+        self.formation_combo = QComboBox()
+        cursor = self.db_manager.get_connection().cursor()
+        cursor.execute("SELECT id, nom FROM formations WHERE id != ? ORDER BY nom", (self.formation_id,))
+        for formation_id, nom in cursor.fetchall():
+            self.formation_combo.addItem(nom, formation_id)
+        self.formation_combo.currentIndexChanged.connect(self.load_annees)
+
+        self.annee_combo = QComboBox()
+        self.load_annees()
+
+        form_layout.addRow("Formation:", self.formation_combo)
+        form_layout.addRow("Année d'inscription:", self.annee_combo)
+        layout.addLayout(form_layout)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok |
+                                      QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.setLayout(layout)
+
+    def load_annees(self):
+        self.annee_combo.clear()
+        self.annee_combo.addItem("Toutes", None)
+        formation_id = self.formation_combo.currentData()
+        if formation_id is None:
+            return
+        cursor = self.db_manager.get_connection().cursor()
+        cursor.execute('''
+            SELECT DISTINCT annee_inscription FROM inscriptions
+            WHERE formation_id = ? AND annee_inscription IS NOT NULL
+            ORDER BY annee_inscription DESC
+        ''', (formation_id,))
+        for (annee,) in cursor.fetchall():
+            self.annee_combo.addItem(libelle_annee(annee), annee)
+
+    def get_data(self):
+        return self.formation_combo.currentData(), self.annee_combo.currentData()
+
+class NotesGridView(QTableView):
+    """Vue tableur : collage d'un bloc (Ctrl+V) et effacement de la sélection (Suppr)"""
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.AnyKeyPressed |
+                             QAbstractItemView.EditTrigger.DoubleClicked |
+                             QAbstractItemView.EditTrigger.EditKeyPressed)
+        self.horizontalHeader().setDefaultSectionSize(90)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Paste):
+            self.paste()
+        elif event.key() in (Qt.Key.Key_Delete, Qt.Key.Key_Backspace) and self.state() != self.State.EditingState:
+            for index in self.selectedIndexes():
+                self.model().setData(index, "")
+        else:
+            super().keyPressEvent(event)
+
+    def paste(self):
+        """Colle un bloc copié depuis un tableur à partir de la cellule courante"""
+        start = self.currentIndex()
+        if not start.isValid():
+            return
+        model = self.model()
+        lines = QApplication.clipboard().text().rstrip('\n').split('\n')
+        for i, line in enumerate(lines):
+            for j, value in enumerate(line.rstrip('\r').split('\t')):
+                index = model.index(start.row() + i, start.column() + j)
+                if index.isValid():
+                    model.setData(index, value)
+
+class NotesGridDialog(QDialog):
+    def __init__(self, parent, db_manager, formation_id, formation_name, nb_annees, worker):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.worker = worker
+        self.formation_id = formation_id
+        self.nb_annees = nb_annees
+        self.setWindowTitle(f"Saisie des Notes - {formation_name}")
+        self.setModal(True)
+        self.resize(1100, 650)
+        self.setup_ui()
+        self.load_data()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        # Filtre sur l'année d'étude
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Année:"))
+        self.annee_combo = QComboBox()
+        self.annee_combo.addItem("Toutes", None)
+        for annee in range(1, self.nb_annees + 1):
+            self.annee_combo.addItem(str(annee), annee)
+        self.annee_index = 0
+        self.annee_combo.currentIndexChanged.connect(self.change_annee)
+        filter_layout.addWidget(self.annee_combo)
+        filter_layout.addStretch()
+        self.status_label = QLabel()
+        filter_layout.addWidget(self.status_label)
+        layout.addLayout(filter_layout)
+
+        # Grille étudiants × matières
+        self.model = NotesGridModel(self.db_manager, self.formation_id, self, worker=self.worker)
+        self.model.modified.connect(self.update_status)
+        self.table = NotesGridView(self.model)
+        layout.addWidget(self.table)
+
+        # Boutons
+        button_layout = QHBoxLayout()
+        self.save_btn = QPushButton("Enregistrer")
+        self.revert_btn = QPushButton("Annuler les modifications")
+        close_btn = QPushButton("Fermer")
+
+        self.save_btn.clicked.connect(self.save)
+        self.revert_btn.clicked.connect(self.model.revert)
+        close_btn.clicked.connect(self.reject)
+
+        button_layout.addWidget(self.save_btn)
+        button_layout.addWidget(self.revert_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(close_btn)
+
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def load_data(self):
+        self.model.load(self.annee_combo.currentData())
+
+    def update_status(self, count):
+        self.status_label.setText(f"{count} modification(s) non enregistrée(s)" if count else "")
+        self.save_btn.setEnabled(count > 0)
+        self.revert_btn.setEnabled(count > 0)
+
+    def confirm_discard(self):
+        """Propose d'enregistrer les saisies en attente ; retourne False pour rester dans la grille"""
+        if not self.model.pending_count():
+            return True
+        reply = QMessageBox.question(self, "Modifications non enregistrées",
+                                     "Enregistrer les notes saisies?",
+                                     QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard |
+                                     QMessageBox.StandardButton.Cancel)
+        if reply == QMessageBox.StandardButton.Save:
+            return self.save()
+        return reply == QMessageBox.StandardButton.Discard
+
+    def change_annee(self):
+        if self.confirm_discard():
+            self.annee_index = self.annee_combo.currentIndex()
+            self.load_data()
+        else:
+            # Rester sur l'année dont les saisies sont en cours
+            self.annee_combo.blockSignals(True)
+            self.annee_combo.setCurrentIndex(self.annee_index)
+            self.annee_combo.blockSignals(False)
+
+    def save(self):
+        try:
+            count = self.model.save()
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Erreur", f"Enregistrement impossible : {e}")
+            return False
+        self.status_label.setText(f"{count} note(s) enregistrée(s)")
+        return True
+
+    def done(self, result):
+        if not self.confirm_discard():
+            return
+        super().done(result)
+
+class HistogrammeWidget(QWidget):
+    """Histogramme des notes par tranches ; les tranches sous le seuil de réussite sont en rouge"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bornes = []
+        self.effectifs = []
+        self.seuil = None
+        self.titre = ""
+        self.setMinimumHeight(180)
+
+    def set_data(self, bornes, effectifs, seuil, titre=""):
+        self.bornes = bornes
+        self.effectifs = effectifs
+        self.seuil = seuil
+        self.titre = titre
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        metrics = painter.fontMetrics()
+        hauteur_texte = metrics.height()
+        zone = QRectF(self.rect()).adjusted(10, hauteur_texte + 8, -10, -hauteur_texte - 6)
+        painter.drawText(QRectF(0, 2, self.width(), hauteur_texte), Qt.AlignmentFlag.AlignCenter, self.titre)
+        if not self.effectifs or zone.width() <= 0 or zone.height() <= 0:
+            return
+
+        maximum = max(max(self.effectifs), 1)
+        largeur = zone.width() / len(self.effectifs)
+        for i, nb in enumerate(self.effectifs):
+            hauteur = (zone.height() - hauteur_texte) * nb / maximum
+            barre = QRectF(zone.left() + i * largeur + 2, zone.bottom() - hauteur, largeur - 4, hauteur)
+            sous_seuil = self.seuil is not None and self.bornes[i + 1] <= self.seuil
+            painter.fillRect(barre, QColor("#e57373") if sous_seuil else QColor("#64b5f6"))
+            if nb:
+                painter.drawText(QRectF(barre.left(), barre.top() - hauteur_texte, barre.width(), hauteur_texte),
+                                 Qt.AlignmentFlag.AlignCenter, str(nb))
+            painter.drawText(QRectF(barre.left(), zone.bottom() + 4, barre.width(), hauteur_texte),
+                             Qt.AlignmentFlag.AlignCenter, f"{self.bornes[i]}-{self.bornes[i + 1]}")
+        painter.drawLine(zone.bottomLeft(), zone.bottomRight())
+
+class StatistiquesDialog(QDialog):
+    """Tableau de bord d'une formation : statistiques par matière, de la cohorte et classement"""
+
+    COLONNES_MATIERES = ["Matière", "Année", "Sem.", "Notes", "Moyenne", "Médiane", "Écart type",
+                         "Min", "Max", "Réussite %"]
+    COLONNES_CLASSEMENT = ["Rang", "Matricule", "Nom", "Prénom", "Moyenne", "Crédits"]
+
+    def __init__(self, parent, db_manager, formation_id, formation_name, nb_annees, worker):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.service = db_manager.service
+        self.worker = worker
+        self.formation_id = formation_id
+        self.nb_annees = nb_annees
+        self.data = None
+        self.setWindowTitle(f"Statistiques - {formation_name}")
+        self.resize(1000, 700)
+        self.setup_ui()
+        self.load_data()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        # Filtres année d'étude / semestre
+        filter_layout = QHBoxLayout()
+        self.annee_combo = QComboBox()
+        self.annee_combo.addItem("Toutes", None)
+        for annee in range(1, self.nb_annees + 1):
+            self.annee_combo.addItem(str(annee), annee)
+        self.semestre_combo = QComboBox()
+        self.semestre_combo.addItem("Tous", None)
+        self.semestre_combo.addItem("1", 1)
+        self.semestre_combo.addItem("2", 2)
+        self.annee_combo.currentIndexChanged.connect(self.load_data)
+        self.semestre_combo.currentIndexChanged.connect(self.load_data)
+        filter_layout.addWidget(QLabel("Année:"))
+        filter_layout.addWidget(self.annee_combo)
+        filter_layout.addWidget(QLabel("Semestre:"))
+        filter_layout.addWidget(self.semestre_combo)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
+        self.resume_label = QLabel()
+        layout.addWidget(self.resume_label)
+
+        self.histogramme = HistogrammeWidget()
+        layout.addWidget(self.histogramme)
+
+        onglets = QTabWidget()
+        self.matieres_table = self.create_table(self.COLONNES_MATIERES)
+        self.matieres_table.itemSelectionChanged.connect(self.show_histogramme)
+        self.classement_table = self.create_table(self.COLONNES_CLASSEMENT)
+        onglets.addTab(self.matieres_table, "Matières")
+        onglets.addTab(self.classement_table, "Classement")
+        layout.addWidget(onglets, 1)
+
+        button_layout = QHBoxLayout()
+        refresh_btn = QPushButton("Actualiser")
+        close_btn = QPushButton("Fermer")
+        refresh_btn.clicked.connect(self.load_data)
+        close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(refresh_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(close_btn)
+
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    @staticmethod
+    def create_table(colonnes):
+        table = QTableWidget()
+        table.setColumnCount(len(colonnes))
+        table.setHorizontalHeaderLabels(colonnes)
+        table.horizontalHeader().setDefaultSectionSize(75)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        table.verticalHeader().setVisible(False)
+        return table
+
+    @staticmethod
+    def fill_table(table, rows):
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                table.setItem(row, col, QTableWidgetItem("" if value is None else str(value)))
+        table.setUpdatesEnabled(True)
+
+    def load_data(self):
+        formation_id = self.formation_id
+        annee, semestre = self.annee_combo.currentData(), self.semestre_combo.currentData()
+        self.worker.cancel_group((self, 'statistiques'))
+        self.resume_label.setText("Calcul en cours...")
+        self.worker.submit(lambda cursor: self.service.statistiques(formation_id, annee, semestre, cursor),
+                           self.show_data, group=(self, 'statistiques'))
+
+    def show_data(self, data):
+        self.data = data
+        cohorte = data['cohorte']
+        if cohorte['nb']:
+            self.resume_label.setText(
+                f"{data['inscrits']} inscrit(s), {cohorte['nb']} avec des notes — moyenne {cohorte['moyenne']:.2f}, "
+                f"médiane {cohorte['mediane']:.2f}, écart type {cohorte['ecart_type']:.2f}, "
+                f"min {cohorte['min']:.2f}, max {cohorte['max']:.2f}, réussite {cohorte['reussite']:.0%}")
+        else:
+            self.resume_label.setText(f"{data['inscrits']} inscrit(s), aucune note")
+
+        def fmt(valeur):
+            return None if valeur is None else f"{valeur:.2f}"
+
+        self.matieres_table.blockSignals(True)
+        self.fill_table(self.matieres_table, [
+            (m['nom'], m['annee'], m['semestre'], m['nb'], fmt(m['moyenne']), fmt(m['mediane']),
+             fmt(m['ecart_type']), fmt(m['min']), fmt(m['max']),
+             None if m['reussite'] is None else f"{m['reussite']:.0%}")
+            for m in data['matieres']])
+        self.matieres_table.clearSelection()
+        self.matieres_table.blockSignals(False)
+        self.fill_table(self.classement_table, [
+            (rang, matricule, nom, prenom, fmt(moyenne), credits)
+            for rang, _, matricule, nom, prenom, moyenne, credits in data['classement']])
+        self.show_histogramme()
+
+    def show_histogramme(self):
+        """Histogramme de la matière sélectionnée, des moyennes de la cohorte sinon"""
+        if self.data is None:
+            return
+        row = self.matieres_table.currentRow() if self.matieres_table.selectedItems() else -1
+        if row >= 0:
+            matiere = self.data['matieres'][row]
+            effectifs, titre = matiere['histogramme'], f"Notes - {matiere['nom']}"
+        else:
+            effectifs, titre = self.data['cohorte']['histogramme'], "Moyennes de la cohorte"
+        self.histogramme.set_data(self.data['bornes'], effectifs, self.data['seuil'], titre)
+
+    def done(self, result):
+        self.worker.cancel_group((self, 'statistiques'))
+        super().done(result)
+
 class NotesManagementDialog(QDialog):
-    def __init__(self, parent, db_manager, etudiant_id, etudiant_name, formation_id):
+    def __init__(self, parent, db_manager, etudiant_id, etudiant_name, formation_id, worker):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.service = db_manager.service
+        self.worker = worker
         self.etudiant_id = etudiant_id
         self.etudiant_name = etudiant_name
         self.formation_id = formation_id
@@ -891,6 +2265,8 @@ class NotesManagementDialog(QDialog):
         self.edit_btn = QPushButton("Modifier Note")
         self.delete_btn = QPushButton("Supprimer Note")
         self.bulletin_btn = QPushButton("Générer Bulletin")
+        # Inclut les années archivées (voir DatabaseManager.archiver_annee)
+        self.historique_check = QCheckBox("Historique complet")
 
         self.edit_btn.clicked.connect(self.edit_note)
         self.delete_btn.clicked.connect(self.delete_note)
@@ -899,14 +2275,15 @@ class NotesManagementDialog(QDialog):
         button_layout.addWidget(self.edit_btn)
         button_layout.addWidget(self.delete_btn)
         button_layout.addWidget(self.bulletin_btn)
+        button_layout.addWidget(self.historique_check)
         button_layout.addStretch()
 
         layout.addLayout(button_layout)
 
         # Table des notes
         self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Matière", "Note", "Semestre", "Crédits", "Année"])
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["Matière", "Note", "Semestre", "Crédits", "Année", "Année univ."])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.table)
 
@@ -924,112 +2301,96 @@ class NotesManagementDialog(QDialog):
 
         self.load_matieres()
 
+    def done(self, result):
+        # Les résultats attendus ne concernent plus personne
+        for group in ('matieres', 'notes', 'moyennes', 'bulletin'):
+            self.worker.cancel_group((self, group))
+        super().done(result)
+
     def load_matieres(self):
         """Charge les matières de la formation"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, nom, credits, annee FROM matieres WHERE formation_id = ? ORDER BY annee, nom",
-                       (self.formation_id,))
-        data = cursor.fetchall()
-        conn.close()
+        formation_id = self.formation_id
+
+        def query(cursor):
+            cursor.execute("SELECT id, nom, credits, annee FROM matieres WHERE formation_id = ? ORDER BY annee, nom",
+                           (formation_id,))
+            return cursor.fetchall()
 
+        self.worker.submit(query, self.show_matieres, group=(self, 'matieres'))
+
+    def show_matieres(self, data):
         self.matiere_combo.clear()
         for matiere in data:
             self.matiere_combo.addItem(f"{matiere[1]} (Année {matiere[3]})", matiere[0])
 
     def load_data(self):
         """Charge les notes de l'étudiant"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.nom, n.note, n.semestre, m.credits, m.annee
-            FROM notes n
-            JOIN matieres m ON n.matiere_id = m.id
-            WHERE n.etudiant_id = ?
-            ORDER BY m.annee, m.nom, n.semestre
-        ''', (self.etudiant_id,))
-        data = cursor.fetchall()
-        conn.close()
+        etudiant_id = self.etudiant_id
+
+        def query(cursor):
+            cursor.execute('''
+                SELECT m.nom, n.note, n.semestre, m.credits, m.annee, n.annee_academique, n.id, n.matiere_id
+                FROM notes n
+                JOIN matieres m ON n.matiere_id = m.id
+                WHERE n.etudiant_id = ?
+                ORDER BY m.annee, m.nom, n.semestre, n.annee_academique
+            ''', (etudiant_id,))
+            return cursor.fetchall()
+
+        self.worker.submit(query, self.show_data, group=(self, 'notes'))
+        self.calculate_moyennes()
 
+    def show_data(self, data):
         self.table.setRowCount(len(data))
         for row, item in enumerate(data):
             for col in range(5):
-                self.table.setItem(row, col, QTableWidgetItem(str(item[col]) if item[col] else ""))
-
-        self.calculate_moyennes()
+                self.table.setItem(row, col, QTableWidgetItem("" if item[col] is None else str(item[col])))
+            # Une matière repassée a une note par année académique
+            self.table.setItem(row, 5, QTableWidgetItem(libelle_annee(item[5])))
+            # Clés de la note (notes.id, matiere_id) conservées derrière la ligne
+            self.table.item(row, 0).setData(Qt.ItemDataRole.UserRole, (item[6], item[7]))
 
     def calculate_moyennes(self):
-        """Calcule et affiche les moyennes"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
+        """Calcule et affiche les moyennes pondérées par les crédits"""
+        etudiant_id = self.etudiant_id
+        self.worker.submit(lambda cursor: self.service.moyennes_etudiant(etudiant_id, cursor),
+                           self.show_moyennes, group=(self, 'moyennes'))
 
-        # Moyenne générale
-        cursor.execute('''
-            SELECT AVG(n.note), SUM(m.credits)
-            FROM notes n
-            JOIN matieres m ON n.matiere_id = m.id
-            WHERE n.etudiant_id = ?
-        ''', (self.etudiant_id,))
-        result = cursor.fetchone()
-
-        if result and result[0]:
-            moyenne_generale = round(result[0], 2)
-            total_credits = result[1] or 0
-
-            # Moyenne par semestre
-            cursor.execute('''
-                SELECT n.semestre, AVG(n.note), COUNT(*)
-                FROM notes n
-                WHERE n.etudiant_id = ?
-                GROUP BY n.semestre
-            ''', (self.etudiant_id,))
-            moyennes_semestre = cursor.fetchall()
+    def show_moyennes(self, resultats):
+        if resultats:
+            moyenne_generale = round(resultats['moyenne_generale'], 2)
+            total_credits = resultats['credits']
 
             text = f"Moyenne générale: {moyenne_generale}/20 (Total crédits: {total_credits})\n"
-            for sem in moyennes_semestre:
-                text += f"Semestre {sem[0]}: {round(sem[1], 2)}/20 ({sem[2]} matières)\n"
+            for annee, moyenne in resultats['annees'].items():
+                text += f"Année {annee}: {round(moyenne, 2)}/20"
+                semestres = [f"S{semestre}: {round(moyenne_sem, 2)}"
+                             for (annee_sem, semestre), moyenne_sem in resultats['semestres'].items()
+                             if annee_sem == annee]
+                text += f" ({', '.join(semestres)})\n"
 
             self.moyennes_label.setText(text)
         else:
             self.moyennes_label.setText("Aucune note saisie")
 
-        conn.close()
 
     def add_note(self):
         if self.matiere_combo.currentData():
             matiere_id = self.matiere_combo.currentData()
             note = self.note_spin.value()
-            conn = self.db_manager.get_connection()
-
 
-            cursor = conn.cursor()
+            # Le semestre est celui de la matière ; une note existante est remplacée
+            self.service.enregistrer_note(self.etudiant_id, matiere_id, note)
 
-            # Récupérer le semestre de la matière
-            cursor.execute("SELECT semestre FROM matieres WHERE id = ?", (matiere_id,))
-            semestre = cursor.fetchone()[0]
-
-            cursor.execute("SELECT id FROM notes WHERE etudiant_id = ? AND matiere_id = ? AND semestre = ?",
-                           (self.etudiant_id, matiere_id, semestre))
-
-            existing = cursor.fetchone()
-
-            if existing:
-                QMessageBox.warning(self, "Erreur", "Une note existe déjà pour cette matière et ce semestre!")
-            else:
-                cursor.execute("INSERT INTO notes (etudiant_id, matiere_id, note, semestre) VALUES (?, ?, ?, ?)",
-                               (self.etudiant_id, matiere_id, note, semestre))
-
-                conn.commit()
-                self.load_data()
-                QMessageBox.information(self, "Succès", "Note ajoutée avec succès!")
-
-            conn.close()
+            self.load_data()
+            QMessageBox.information(self, "Succès", "Note enregistrée avec succès!")
 
     def edit_note(self):
         current_row = self.table.currentRow()
         if current_row >= 0:
             matiere = self.table.item(current_row, 0).text()
-            note_value = float(self.table.item(current_row, 1).text())
+            note_id, _ = self.table.item(current_row, 0).data(Qt.ItemDataRole.UserRole)
+            note_value = float(self.table.item(current_row, 1).text() or 0)
             semestre = int(self.table.item(current_row, 2).text())
 
             # Dialog simple pour modifier la note
@@ -1063,17 +2424,11 @@ class NotesManagementDialog(QDialog):
                 new_note = note_spin.value()
                 new_semestre = int(semestre_combo.currentText())
 
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE notes 
-                    SET note = ?, semestre = ? 
-                    WHERE etudiant_id = ? 
-                    AND matiere_id = (SELECT id FROM matieres WHERE nom = ?)
-                    AND semestre = ?
-                ''', (new_note, new_semestre, self.etudiant_id, matiere, semestre))
-                conn.commit()
-                conn.close()
+                try:
+                    self.service.modifier_note(note_id, new_note, new_semestre)
+                except sqlite3.IntegrityError:
+                    QMessageBox.warning(self, "Erreur", "Une note existe déjà pour cette matière et ce semestre!")
+                    return
 
                 self.load_data()
                 QMessageBox.information(self, "Succès", "Note modifiée avec succès!")
@@ -1081,59 +2436,117 @@ class NotesManagementDialog(QDialog):
     def delete_note(self):
         current_row = self.table.currentRow()
         if current_row >= 0:
-            matiere = self.table.item(current_row, 0).text()
-            semestre = int(self.table.item(current_row, 2).text())
+            note_id, _ = self.table.item(current_row, 0).data(Qt.ItemDataRole.UserRole)
 
             reply = QMessageBox.question(self, "Confirmation",
                                          "Êtes-vous sûr de vouloir supprimer cette note?")
             if reply == QMessageBox.StandardButton.Yes:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
-                    DELETE FROM notes 
-                    WHERE etudiant_id = ? 
-                    AND matiere_id = (SELECT id FROM matieres WHERE nom = ?)
-                    AND semestre = ?
-                ''', (self.etudiant_id, matiere, semestre))
-                conn.commit()
-                conn.close()
+                self.service.supprimer_note(note_id)
 
                 self.load_data()
                 QMessageBox.information(self, "Succès", "Note supprimée avec succès!")
 
     def generate_bulletin(self):
         """Génère un bulletin de notes"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
+        etudiant_id = self.etudiant_id
+        historique = self.historique_check.isChecked()
+        self.bulletin_btn.setEnabled(False)
+        self.worker.submit(lambda cursor: self.service.bulletin(etudiant_id, historique, cursor),
+                           self.show_bulletin, group=(self, 'bulletin'),
+                           errback=lambda message: self.bulletin_btn.setEnabled(True))
+
+    def show_bulletin(self, bulletin_data):
+        self.bulletin_btn.setEnabled(True)
+        # Créer le bulletin
+        bulletin = BulletinDialog(self, *bulletin_data)
+        bulletin.exec()
 
-        # Récupérer les informations de l'étudiant
-        cursor.execute("SELECT matricule, nom, prenom FROM etudiants WHERE id = ?", (self.etudiant_id,))
-        etudiant_info = cursor.fetchone()
+def write_pdf(path, html):
+    """Écrit le document HTML en PDF A4 ; le fichier n'apparaît qu'une fois complet"""
+    tmp_path = path + '.part'
+    writer = QPdfWriter(tmp_path)
+    writer.setPageSize(QPageSize(QPageSize.PageSizeId.A4))
+    document = QTextDocument()
+    document.setHtml(html)
+    document.print(writer)
+    del writer
+    os.replace(tmp_path, path)
+
+def _init_pdf_process():
+    """Initialise Qt sans affichage dans un processus de rendu"""
+    global _pdf_app
+    if QGuiApplication.instance() is None:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        _pdf_app = QGuiApplication([])
+
+def _render_pdfs(jobs):
+    """Rend une liste de (chemin, html) ; exécuté dans un processus du pool"""
+    for path, html in jobs:
+        write_pdf(path, html)
+    return len(jobs)
+
+class BulletinBatch:
+    """Génère en lot les bulletins PDF des inscrits d'une formation.
+
+    Les notes de tous les inscrits sont lues en une requête (filtrées sur
+    l'année d'étude et/ou le semestre) et les PDF sont rendus par un pool de
+    processus. Les bulletins déjà présents dans `output_dir` sont conservés,
+    ce qui permet de reprendre un lot interrompu.
+    """
+
+    def __init__(self, db_manager, formation_id, output_dir, annee=None, semestre=None,
+                 processes=None, chunk_size=50):
+        self.db_manager = db_manager
+        self.formation_id = formation_id
+        self.output_dir = output_dir
+        self.annee = annee
+        self.semestre = semestre
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
 
-        # Récupérer toutes les notes avec détails
-        cursor.execute('''
-            SELECT m.nom, n.note, n.semestre, m.credits, m.annee
-            FROM notes n
-            JOIN matieres m ON n.matiere_id = m.id
-            WHERE n.etudiant_id = ?
-            ORDER BY m.annee, n.semestre, m.nom
-        ''', (self.etudiant_id,))
-        notes = cursor.fetchall()
+    def path_for(self, matricule):
+        return os.path.join(self.output_dir, "bulletin_" + re.sub(r'[^\w.-]', '_', str(matricule)) + ".pdf")
 
-        # Calculs des moyennes
-        cursor.execute('''
-            SELECT AVG(n.note), SUM(m.credits)
-            FROM notes n
-            JOIN matieres m ON n.matiere_id = m.id
-            WHERE n.etudiant_id = ?
-        ''', (self.etudiant_id,))
-        moyenne_result = cursor.fetchone()
+    def query(self, cursor):
+        """Retourne [(infos étudiant, notes, moyenne)] pour tous les inscrits de la formation"""
+        return self.db_manager.service.bulletins_formation(self.formation_id, self.annee, self.semestre, cursor)
 
-        conn.close()
+    def run(self, progress=None):
+        """Génère les bulletins manquants et retourne (générés, déjà présents).
 
-        # Créer le bulletin
-        bulletin = BulletinDialog(self, etudiant_info, notes, moyenne_result)
-        bulletin.exec()
+        `progress(faits, total)` est appelé après chaque paquet ; s'il retourne
+        True, le lot est interrompu (les bulletins déjà écrits sont conservés).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        bulletins = self.query(self.db_manager.get_connection().cursor())
+        jobs = [(self.path_for(info[0]), bulletin_html(info, notes, moyenne, entete=True))
+                for info, notes, moyenne in bulletins
+                if not os.path.exists(self.path_for(info[0]))]
+        deja_faits = len(bulletins) - len(jobs)
+        total, faits = len(bulletins), deja_faits
+        if progress and progress(faits, total):
+            return 0, deja_faits
+
+        paquets = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        if self.processes <= 1:
+            _init_pdf_process()
+            for paquet in paquets:
+                faits += _render_pdfs(paquet)
+                if progress and progress(faits, total):
+                    break
+        else:
+            # spawn : les processus de rendu ne doivent pas hériter de l'état Qt du parent
+            with ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_pdf_process) as pool:
+                futures = [pool.submit(_render_pdfs, paquet) for paquet in paquets]
+                for future in as_completed(futures):
+                    faits += future.result()
+                    if progress and progress(faits, total):
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        break
+
+        # Les paquets déjà transmis au pool peuvent se terminer après une interruption
+        return sum(os.path.exists(path) for path, _ in jobs), deja_faits
 
 class BulletinDialog(QDialog):
     def __init__(self, parent, etudiant_info, notes, moyenne_result):
@@ -1168,40 +2581,7 @@ class BulletinDialog(QDialog):
         # Tableau des notes
         bulletin_text = QTextEdit()
         bulletin_text.setReadOnly(True)
-
-        content = "<h3>Détail des Notes</h3>"
-        content += "<table border='1' style='border-collapse: collapse; width: 100%;'>"
-        content += "<tr><th>Matière</th><th>Année</th><th>Semestre</th><th>Note</th><th>Crédits</th></tr>"
-
-        for note in self.notes:
-            matiere, valeur_note, semestre, credits, annee = note
-            content += f"<tr><td>{matiere}</td><td>{annee}</td><td>{semestre}</td><td>{valeur_note}</td><td>{credits}</td></tr>"
-
-        content += "</table>"
-
-        # Moyennes
-        if self.moyenne_result and self.moyenne_result[0]:
-            moyenne_generale = round(self.moyenne_result[0], 2)
-            total_credits = self.moyenne_result[1] or 0
-            content += f"<h3>Résultats</h3>"
-            content += f"<p><strong>Moyenne Générale:</strong> {moyenne_generale}/20</p>"
-            content += f"<p><strong>Total Crédits:</strong> {total_credits}</p>"
-
-            # Appréciation
-            if moyenne_generale >= 16:
-                appreciation = "Très Bien"
-            elif moyenne_generale >= 14:
-                appreciation = "Bien"
-            elif moyenne_generale >= 12:
-                appreciation = "Assez Bien"
-            elif moyenne_generale >= 10:
-                appreciation = "Passable"
-            else:
-                appreciation = "Insuffisant"
-
-            content += f"<p><strong>Appréciation:</strong> {appreciation}</p>"
-
-        bulletin_text.setHtml(content)
+        bulletin_text.setHtml(bulletin_html(self.etudiant_info, self.notes, self.moyenne_result))
         layout.addWidget(bulletin_text)
 
         # Boutons
@@ -1219,14 +2599,23 @@ class BulletinDialog(QDialog):
         self.setLayout(layout)
 
     def print_bulletin(self):
-        QMessageBox.information(self, "Impression", "Fonctionnalité d'impression à implémenter")
+        """Enregistre le bulletin au format PDF"""
+        path, _ = QFileDialog.getSaveFileName(self, "Enregistrer le bulletin",
+                                              f"bulletin_{self.etudiant_info[0]}.pdf", "PDF (*.pdf)")
+        if path:
+            write_pdf(path, bulletin_html(self.etudiant_info, self.notes, self.moyenne_result, entete=True))
+            QMessageBox.information(self, "Succès", "Bulletin enregistré avec succès!")
 
 class EtudiantsTab(QWidget):
-    data_changed = pyqtSignal()
+    COLUMNS = ["ID", "Matricule", "Nom", "Prénom", "Email", "Téléphone"]
 
-    def __init__(self, db_manager):
+    SORTS = ETUDIANTS_SORTS
+    FILTERS = ETUDIANTS_FILTERS
+
+    def __init__(self, db_manager, worker):
         super().__init__()
         self.db_manager = db_manager
+        self.worker = worker
         self.setup_ui()
         self.load_data()
 
@@ -1243,102 +2632,229 @@ class EtudiantsTab(QWidget):
         self.add_btn = QPushButton("Ajouter Étudiant")
         self.edit_btn = QPushButton("Modifier")
         self.delete_btn = QPushButton("Supprimer")
+        self.import_btn = QPushButton("Importer...")
+        self.export_btn = QPushButton("Exporter...")
 
         self.add_btn.clicked.connect(self.add_etudiant)
         self.edit_btn.clicked.connect(self.edit_etudiant)
         self.delete_btn.clicked.connect(self.delete_etudiant)
+        self.import_btn.clicked.connect(self.import_fichier)
+        self.export_btn.clicked.connect(lambda: exporter_fichier(self, self.db_manager))
 
         button_layout.addWidget(self.add_btn)
         button_layout.addWidget(self.edit_btn)
         button_layout.addWidget(self.delete_btn)
+        button_layout.addWidget(self.import_btn)
+        button_layout.addWidget(self.export_btn)
         button_layout.addStretch()
 
+        # Recherche : filtre la liste et propose les meilleurs résultats
+        self.search_box = StudentSearchBox(self.worker, self)
+        self.search_box.setMinimumWidth(300)
+        self.search_box.searched.connect(lambda text: self.load_data())
+        button_layout.addWidget(self.search_box)
+
         layout.addLayout(button_layout)
 
-        # Table des étudiants
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["ID", "Matricule", "Nom", "Prénom", "Email", "Téléphone"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        # Filtres par colonne (début du texte)
+        filter_layout = QHBoxLayout()
+        self.filters = {}
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.load_data)
+        for column in self.FILTERS:
+            edit = QLineEdit()
+            edit.setPlaceholderText(f"{self.COLUMNS[column]} commence par...")
+            edit.setClearButtonEnabled(True)
+            edit.textChanged.connect(self.filter_timer.start)
+            filter_layout.addWidget(edit)
+            self.filters[column] = edit
+        layout.addLayout(filter_layout)
+
+        # Table des étudiants, triée par clic sur l'en-tête des colonnes indexées
+        self.model = SqlTableModel(self.db_manager, self.COLUMNS, self, worker=self.worker)
+        self.table = SqlTableView(self.model)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        header = self.table.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(2, Qt.SortOrder.AscendingOrder)
+        self.sort = (2, Qt.SortOrder.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.sort_changed)
         layout.addWidget(self.table)
 
         self.setLayout(layout)
 
-    def load_data(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM etudiants ORDER BY nom, prenom")
-        data = cursor.fetchall()
-        conn.close()
+    def sort_changed(self, column, order):
+        if column not in self.SORTS:
+            # Colonne non indexée : on garde le tri courant
+            header = self.table.horizontalHeader()
+            header.blockSignals(True)
+            header.setSortIndicator(*self.sort)
+            header.blockSignals(False)
+            return
+        self.sort = (column, order)
+        self.load_data()
 
-        self.table.setRowCount(len(data))
-        for row, item in enumerate(data):
-            for col, value in enumerate(item):
-                self.table.setItem(row, col, QTableWidgetItem(str(value) if value else ""))
+    def load_data(self):
+        self.filter_timer.stop()
+        column, order = self.sort
+        filters = {column: edit.text() for column, edit in self.filters.items()}
+        sql, params, keyset = etudiants_query(self.search_box.text(), filters, column,
+                                              order == Qt.SortOrder.DescendingOrder)
+        self.model.set_query(sql, params, keyset)
+
+    def on_changes(self, changes):
+        """Applique les modifications diffusées par le ChangeBus"""
+        if 'etudiants' in changes:
+            self.model.apply_changes(changes['etudiants'])
 
     def add_etudiant(self):
         dialog = EtudiantDialog(self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             data = dialog.get_data()
             if data['matricule'] and data['nom'] and data['prenom']:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
                 try:
-                    cursor.execute(
-                        "INSERT INTO etudiants (matricule, nom, prenom, email, telephone) VALUES (?, ?, ?, ?, ?)",
-                        (data['matricule'], data['nom'], data['prenom'], data['email'], data['telephone']))
-                    conn.commit()
-                    self.load_data()
-                    self.data_changed.emit()
+                    self.db_manager.service.creer('etudiants', data)
                     QMessageBox.information(self, "Succès", "Étudiant ajouté avec succès!")
                 except sqlite3.IntegrityError:
                     QMessageBox.warning(self, "Erreur", "Ce matricule existe déjà!")
-                finally:
-                    conn.close()
 
     def edit_etudiant(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            etudiant_id = int(self.table.item(current_row, 0).text())
-            etudiant_data = []
-            for col in range(6):
-                etudiant_data.append(self.table.item(current_row, col).text())
+        def edit(etudiant_data):
+            etudiant_id = etudiant_data[0]
 
             dialog = EtudiantDialog(self, etudiant_data)
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 data = dialog.get_data()
                 if data['matricule'] and data['nom'] and data['prenom']:
-                    conn = self.db_manager.get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE etudiants SET matricule=?, nom=?, prenom=?, email=?, telephone=? WHERE id=?",
-                                   (data['matricule'], data['nom'], data['prenom'], data['email'], data['telephone'],
-                                    etudiant_id))
-                    conn.commit()
-                    conn.close()
-                    self.load_data()
-                    self.data_changed.emit()
+                    self.db_manager.service.modifier('etudiants', etudiant_id, data)
                     QMessageBox.information(self, "Succès", "Étudiant modifié avec succès!")
 
+        self.table.current_data(edit)
+
     def delete_etudiant(self):
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            etudiant_id = int(self.table.item(current_row, 0).text())
+        def supprimer(lignes):
+            etudiant_ids = [ligne[0] for ligne in lignes]
             reply = QMessageBox.question(self, "Confirmation",
-                                         "Êtes-vous sûr de vouloir supprimer cet étudiant?")
+                                         "Êtes-vous sûr de vouloir supprimer cet étudiant, ses inscriptions "
+                                         "et ses notes?" if len(lignes) == 1 else
+                                         f"Êtes-vous sûr de vouloir supprimer ces {len(lignes)} étudiants, "
+                                         "leurs inscriptions et leurs notes?")
             if reply == QMessageBox.StandardButton.Yes:
-                conn = self.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM etudiants WHERE id=?", (etudiant_id,))
-                conn.commit()
-                conn.close()
-                self.load_data()
-                self.data_changed.emit()
-                QMessageBox.information(self, "Succès", "Étudiant supprimé avec succès!")
+                self.db_manager.service.supprimer('etudiants', etudiant_ids)
+                QMessageBox.information(self, "Succès", "Suppression effectuée avec succès!")
+
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        if rows:
+            self.model.rows_data(rows, supprimer)
+
+    def import_fichier(self):
+        """Importe des étudiants, des inscriptions ou des notes depuis un CSV/XLSX"""
+        types = {"Étudiants": 'etudiants', "Inscriptions": 'inscriptions', "Notes": 'notes'}
+        choix, ok = QInputDialog.getItem(self, "Importer", "Données à importer :", list(types), 0, False)
+        if not ok:
+            return
+        kind = types[choix]
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Importer " + choix.lower(), "",
+            f"Colonnes : {', '.join(BulkImporter.COLONNES[kind])} (*.csv *.xlsx)")
+        if not path:
+            return
+
+        progress = QProgressDialog("Import en cours...", None, 0, 0, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.show()
+
+        def avancement(lues):
+            progress.setLabelText(f"{lues} ligne(s) traitée(s)...")
+            QApplication.processEvents()
+
+        try:
+            report = self.db_manager.service.importer(kind, path, progress=avancement)
+        except (OSError, ImportError, csv.Error, sqlite3.Error) as e:
+            progress.close()
+            QMessageBox.warning(self, "Erreur", f"Import impossible : {e}")
+            return
+        progress.close()
+
+        box = QMessageBox(QMessageBox.Icon.Information, "Import terminé", str(report), parent=self)
+        if report.rejets:
+            box.setDetailedText('\n'.join(f"Ligne {ligne} : {raison}" for ligne, raison in report.rejets[:1000]))
+        box.exec()
+
+class QueryStatsDialog(QDialog):
+    """Latences SQL par site d'appel (p50/p95/p99), depuis le lancement"""
+
+    COLONNES = ["Site", "Nb", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)", "Total (ms)", "Lignes"]
+
+    def __init__(self, parent, query_stats):
+        super().__init__(parent)
+        self.query_stats = query_stats
+        self.setWindowTitle("Statistiques des requêtes")
+        self.resize(900, 500)
+        self.setup_ui()
+        self.load_data()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.COLONNES))
+        self.table.setHorizontalHeaderLabels(self.COLONNES)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        refresh_btn = QPushButton("Actualiser")
+        reset_btn = QPushButton("Réinitialiser")
+        close_btn = QPushButton("Fermer")
+
+        refresh_btn.clicked.connect(self.load_data)
+        reset_btn.clicked.connect(self.reset)
+        close_btn.clicked.connect(self.accept)
+
+        button_layout.addWidget(refresh_btn)
+        button_layout.addWidget(reset_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(close_btn)
+
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def load_data(self):
+        summary = self.query_stats.summary()
+        self.table.setRowCount(len(summary))
+        for row, stats in enumerate(summary):
+            values = [stats['site'], stats['nb'], f"{stats['p50']:.2f}", f"{stats['p95']:.2f}",
+                      f"{stats['p99']:.2f}", f"{stats['max']:.2f}", f"{stats['total']:.1f}", stats['lignes']]
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(str(value)))
+
+    def reset(self):
+        self.query_stats.reset()
+        self.load_data()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # Intervalle de relecture des modifications faites par les autres postes (mode client)
+    POLL_MS = 2000
+
+    def __init__(self, serveur=None):
         super().__init__()
-        self.db_manager = DatabaseManager()
+        self.migration_dialog = None
+        if serveur:
+            # Mode client : la base est ouverte par server.py, partagée entre les postes
+            self.db_manager = RemoteDatabaseManager(serveur, slow_query_log="requetes_lentes.log")
+        else:
+            self.db_manager = DatabaseManager(slow_query_log="requetes_lentes.log",
+                                              migration_progress=self.migration_progress)
+            # Écritures validées par lots, rejouées si un autre programme tient la base
+            self.db_manager.start_write_queue()
+        if self.migration_dialog is not None:
+            self.migration_dialog.close()
+        self.db_worker = DatabaseWorker(self.db_manager, self)
         self.setWindowTitle("Système de Gestion des Étudiants")
         self.setGeometry(100, 100, 1200, 800)
 
@@ -1347,6 +2863,25 @@ class MainWindow(QMainWindow):
         # Connecter les signaux pour la mise à jour automatique
         self.connect_update_signals()
 
+        if serveur:
+            self.poll_timer = QTimer(self)
+            self.poll_timer.timeout.connect(self.poll_changes)
+            self.poll_timer.start(self.POLL_MS)
+
+    def poll_changes(self):
+        """Relit sur le worker les modifications des autres postes ; ChangeBus met les onglets à jour"""
+        self.db_worker.submit(lambda cursor: self.db_manager.poll_changes(), lambda count: None,
+                              group=(self, 'changements'))
+
+    def migration_progress(self, numero, total, description):
+        """Affiche l'avancement de la mise à jour du schéma (seulement si elle dure)"""
+        if self.migration_dialog is None:
+            self.migration_dialog = QProgressDialog("Mise à jour de la base de données...", None, 0, total)
+            self.migration_dialog.setWindowTitle("Mise à jour")
+        self.migration_dialog.setLabelText(f"Mise à jour de la base de données : {description}...")
+        self.migration_dialog.setValue(numero - 1)
+        QApplication.processEvents()
+
     def setup_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -1363,9 +2898,9 @@ class MainWindow(QMainWindow):
         self.tab_widget = QTabWidget()
 
         # Créer les onglets
-        self.departements_tab = DepartementsTab(self.db_manager)
-        self.formations_tab = FormationsTab(self.db_manager)
-        self.etudiants_tab = EtudiantsTab(self.db_manager)
+        self.departements_tab = DepartementsTab(self.db_manager, self.db_worker)
+        self.formations_tab = FormationsTab(self.db_manager, self.db_worker)
+        self.etudiants_tab = EtudiantsTab(self.db_manager, self.db_worker)
 
         # Ajouter les onglets
         self.tab_widget.addTab(self.departements_tab, "Départements")
@@ -1375,25 +2910,80 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.tab_widget)
         central_widget.setLayout(layout)
 
-    def connect_update_signals(self):
-        """Connecte les signaux pour la mise à jour automatique des onglets"""
-        # Quand les départements changent, mettre à jour les formations
-        self.departements_tab.data_changed.connect(self.formations_tab.load_data)
+        # Menu Outils
+        outils_menu = self.menuBar().addMenu("Outils")
+        outils_menu.addAction("Statistiques des requêtes...", self.show_query_stats)
+        outils_menu.addAction("Purger les données orphelines...", self.purge_orphans)
+        outils_menu.addAction("Archiver une année...", self.archiver_annee)
 
-        # Quand les formations changent, mettre à jour les autres onglets si nécessaire
-        self.formations_tab.data_changed.connect(self.refresh_all_tabs)
+    def show_query_stats(self):
+        QueryStatsDialog(self, self.db_manager.query_stats).exec()
 
-        # Quand les étudiants changent, rafraîchir si nécessaire
-        self.etudiants_tab.data_changed.connect(self.refresh_all_tabs)
+    def purge_orphans(self):
+        reply = QMessageBox.question(self, "Confirmation",
+                                     "Supprimer les inscriptions, matières et notes qui référencent "
+                                     "des lignes supprimées, puis compacter la base?")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            counts, liberes = self.db_manager.purge_orphans()
+        finally:
+            QApplication.restoreOverrideCursor()
+        QMessageBox.information(self, "Purge terminée", format_purge(counts, liberes))
+
+    def archiver_annee(self):
+        annees = self.db_manager.annees_archivables()
+        if not annees:
+            QMessageBox.information(self, "Archivage", "Aucune année close à archiver.")
+            return
+        libelles = [libelle_annee(annee) for annee in annees]
+        choix, ok = QInputDialog.getItem(self, "Archiver une année",
+                                         "Les inscriptions et les notes de l'année seront déplacées "
+                                         "dans un fichier d'archive.\nAnnée close :", libelles, 0, False)
+        if not ok:
+            return
+        annee = annees[libelles.index(choix)]
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            counts = self.db_manager.archiver_annee(annee)
+        finally:
+            QApplication.restoreOverrideCursor()
+        QMessageBox.information(self, "Archivage terminé",
+                                f"{libelle_annee(annee)} : {counts['inscriptions']} inscription(s) et "
+                                f"{counts['notes']} note(s) archivées dans "
+                                f"{os.path.basename(self.db_manager.archive_path(annee))}")
 
-    def refresh_all_tabs(self):
-        """Rafraîchit tous les onglets"""
-        self.departements_tab.load_data()
-        self.formations_tab.load_data()
-        self.etudiants_tab.load_data()
+    def connect_update_signals(self):
+        """Connecte les signaux pour la mise à jour automatique des onglets"""
+        # Chaque onglet ne corrige que les lignes touchées par une modification
+        self.change_bus = ChangeBus(self.db_manager, self)
+        self.change_bus.changed.connect(self.departements_tab.on_changes)
+        self.change_bus.changed.connect(self.formations_tab.on_changes)
+        self.change_bus.changed.connect(self.etudiants_tab.on_changes)
+
+    def closeEvent(self, event):
+        """Ferme les connexions persistantes à la fermeture de la fenêtre"""
+        self.change_bus.detach()
+        if hasattr(self, 'poll_timer'):
+            self.poll_timer.stop()
+        self.db_worker.stop()
+        self.db_manager.close()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    # La maintenance sans interface est faite par cli.py
+    for option, commande in (("--rebuild-moyennes", "moyennes"), ("--purger-orphelins", "purger-orphelins"),
+                             ("--archiver", "archiver ANNEE")):
+        if option in sys.argv:
+            sys.exit(f"{option} : utiliser python cli.py {commande}")
+
     app = QApplication(sys.argv)
-    window = MainWindow()
+    # --serveur http://hote:8765 : poste client d'un serveur partagé (voir server.py ; secret dans GESTION_SECRET)
+    window = MainWindow(sys.argv[sys.argv.index("--serveur") + 1] if "--serveur" in sys.argv else None)
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    code = app.exec()
+    if "--query-stats" in sys.argv:
+        # Latences par site d'appel de toute la session
+        print(window.db_manager.query_stats.format_summary())
+    sys.exit(code)
\ No newline at end of file
@@ -0,0 +1,802 @@
+"""Serveur HTTP/JSON optionnel : plusieurs postes partagent une base sans se disputer ses verrous.
+
+Le serveur est seul à ouvrir la base. Les écritures passent par la file
+d'écriture de core (WriteQueue : un seul thread écrivain, validations
+groupées) ; les lectures sont réparties sur un pool de threads lecteurs,
+que WAL laisse travailler pendant les écritures. Les postes lancent main.py avec
+--serveur http://hote:8765 : RemoteDatabaseManager et ClientService
+remplacent alors DatabaseManager et GestionService.
+
+Usage : python server.py base.db [--hote 0.0.0.0] [--port 8765] [--lecteurs 4] [--fenetre-ms 2]
+
+Le serveur et les postes partagent un secret, lu dans la variable
+d'environnement GESTION_SECRET et envoyé dans l'en-tête X-Gestion-Secret.
+Sans secret, le serveur n'écoute que sur une adresse locale.
+"""
+import argparse
+import asyncio
+import http.client
+import ipaddress
+import itertools
+import json
+import os
+import re
+import secrets
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from core import DatabaseManager, GestionService, ImportReport, QueryStats, search_etudiants
+
+# Secret partagé entre le serveur et les postes
+SECRET_ENV = 'GESTION_SECRET'
+EN_TETE_SECRET = 'X-Gestion-Secret'
+
+# Tables exposées en lecture et en écriture ligne à ligne
+TABLES = r'/(departements|formations|etudiants|matieres)'
+
+# Filtres acceptés par GET /<table> : paramètre -> colonne
+FILTRES = {
+    'formations': ('departement_id',),
+    'matieres': ('formation_id',),
+}
+
+# Opérations de l'autorisateur permises aux requêtes libres (POST /requete)
+LECTURE_SEULE = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+def _lecture_seule(action, *args):
+    return sqlite3.SQLITE_OK if action in LECTURE_SEULE else sqlite3.SQLITE_DENY
+
+
+def adresse_locale(hote):
+    """Vrai si `hote` n'est joignable que depuis la machine elle-même"""
+    try:
+        return ipaddress.ip_address(hote).is_loopback
+    except ValueError:
+        return hote == 'localhost'
+
+
+def moyennes_json(resultats):
+    """Résultats de moyennes_etudiant() sans clés tuples, pour JSON"""
+    if resultats is None:
+        return None
+    return dict(resultats,
+                semestres=[[annee, semestre, moyenne] for (annee, semestre), moyenne in resultats['semestres'].items()],
+                annees=[[annee, moyenne] for annee, moyenne in resultats['annees'].items()])
+
+
+def moyennes_depuis_json(data):
+    """Inverse de moyennes_json()"""
+    if data is None:
+        return None
+    return dict(data,
+                semestres={(annee, semestre): moyenne for annee, semestre, moyenne in data['semestres']},
+                annees={annee: moyenne for annee, moyenne in data['annees']})
+
+
+def bulletin_depuis_json(data):
+    """(infos étudiant, notes, moyenne) reçus en listes JSON, remis en tuples"""
+    etudiant_info, notes, moyenne = data
+    return (tuple(etudiant_info) if etudiant_info else None, [tuple(note) for note in notes],
+            tuple(moyenne) if moyenne else None)
+
+
+class ApiServer:
+    """Expose GestionService et des lectures SQL en HTTP/JSON.
+
+    Une requête d'écriture appelle GestionService depuis le pool `_requetes` :
+    ses écritures sont confiées à la WriteQueue de la base, qui valide
+    ensemble celles de plusieurs requêtes simultanées. La réponse part
+    quand l'écriture est durable. Les lectures s'exécutent directement sur
+    le pool de lecteurs. Chaque
+    modification notifiée par DatabaseManager est numérotée dans un journal
+    que les clients relisent (GET /changements?depuis=N) pour mettre leurs
+    vues à jour. Avec un `secret`, toute requête sans l'en-tête
+    EN_TETE_SECRET correspondant est refusée (401).
+    """
+
+    CHANGEMENTS_MAX = 10000
+    CORPS_MAX = 64 * 1024 * 1024  # octets, imports compris
+
+    ROUTES = [
+        ('GET', r'/sante', 'sante'),
+        ('GET', r'/changements', 'changements'),
+        ('POST', r'/requete', 'requete'),
+        ('GET', r'/etudiants/(\d+)/notes', 'notes_etudiant'),
+        ('GET', r'/etudiants/(\d+)/moyennes', 'moyennes'),
+        ('GET', r'/etudiants/(\d+)/bulletin', 'bulletin'),
+        ('GET', r'/formations/(\d+)/bulletins', 'bulletins_formation'),
+        ('GET', r'/formations/(\d+)/statistiques', 'statistiques'),
+        ('POST', r'/formations/(\d+)/inscriptions', 'inscrire'),
+        ('DELETE', r'/formations/(\d+)/inscriptions', 'desinscrire'),
+        ('GET', TABLES, 'lister'),
+        ('POST', TABLES, 'creer'),
+        ('POST', TABLES + r'/suppression', 'supprimer'),
+        ('GET', TABLES + r'/(\d+)', 'lire'),
+        ('PUT', TABLES + r'/(\d+)', 'modifier'),
+        ('DELETE', TABLES + r'/(\d+)', 'supprimer'),
+        ('POST', r'/notes', 'enregistrer_note'),
+        ('POST', r'/notes/grille', 'saisir_notes'),
+        ('PUT', r'/notes/(\d+)', 'modifier_note'),
+        ('DELETE', r'/notes/(\d+)', 'supprimer_note'),
+        ('POST', r'/imports/(etudiants|inscriptions|notes)', 'importer'),
+        ('POST', r'/exports', 'ouvrir_export'),
+        ('POST', r'/exports/(\w+)', 'lire_export'),
+        ('POST', r'/admin/moyennes', 'recalculer_moyennes'),
+        ('POST', r'/admin/purge', 'purger'),
+        ('POST', r'/admin/archives', 'archiver'),
+    ]
+
+    # Requêtes d'écriture traitées simultanément (en attente de leur lot dans la WriteQueue)
+    REQUETES_ECRITURE = 32
+    # Un export dont aucune page n'a été demandée depuis ce délai (s) est abandonné
+    EXPORT_DELAI = 300
+
+    def __init__(self, db_name, lecteurs=4, fenetre_ms=2, secret=None):
+        self.secret = secret or None
+        # L'écrivain ouvre la base en premier : il applique les migrations en attente
+        self.db = DatabaseManager(db_name)
+        self.db.start_write_queue(window_ms=fenetre_ms)
+        self.lecture = DatabaseManager(db_name)
+        self.service = GestionService(self.db)
+        self._requetes = ThreadPoolExecutor(self.REQUETES_ECRITURE, thread_name_prefix='ecriture')
+        self._lecteurs = ThreadPoolExecutor(lecteurs, thread_name_prefix='lecteur')
+        self._routes = [(method, re.compile(pattern), name) for method, pattern, name in self.ROUTES]
+        self._changements = deque(maxlen=self.CHANGEMENTS_MAX)
+        self._sequence = 0
+        # La numérotation repart de zéro à chaque démarrage : les clients la comparent à la leur
+        self._instance = secrets.token_hex(8)
+        self._changements_lock = threading.Lock()
+        # Exports en cours : jeton -> [connexion, lignes, dernière demande]
+        self._exports = {}
+        self._exports_lock = threading.Lock()
+        self.db.add_listener(self._on_change)
+
+    def _on_change(self, table, kind, ids):
+        with self._changements_lock:
+            self._sequence += 1
+            self._changements.append((self._sequence, table, kind, list(ids)))
+
+    # Exécution
+
+    async def read(self, func):
+        """Exécute func(cursor) sur un thread lecteur"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._lecteurs, lambda: func(self.lecture.get_connection().cursor()))
+
+    async def write(self, func):
+        """Exécute func(service) et attend que ses écritures soient durables"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._requetes, func, self.service)
+
+    async def serve(self, hote, port):
+        if self.secret is None and not adresse_locale(hote):
+            # Requêtes libres, suppressions et archivage seraient ouverts à tout le réseau
+            raise ValueError(f"écoute sur {hote} refusée sans secret partagé ({SECRET_ENV})")
+        server = await asyncio.start_server(self.handle, hote, port)
+        print(f"Serveur à l'écoute sur {', '.join(str(s.getsockname()) for s in server.sockets)}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._requetes.shutdown()
+        for conn, _, _ in self._exports.values():
+            conn.close()
+        self._lecteurs.shutdown()
+        self.db.close()
+        self.lecture.close()
+
+    # HTTP
+
+    async def handle(self, reader, writer):
+        """Traite les requêtes d'une connexion (HTTP/1.1, connexion persistante)"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, _ = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if not self._autorise(headers):
+                    await self._respond(writer, 401, {'erreur': "secret partagé absent ou incorrect"})
+                    break
+                length = int(headers.get('content-length') or 0)
+                if length > self.CORPS_MAX:
+                    await self._respond(writer, 413, {'erreur': "requête trop volumineuse"})
+                    break
+                body = await reader.readexactly(length) if length else b''
+                await self._respond(writer, *await self.dispatch(method, target, body))
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _autorise(self, headers):
+        if self.secret is None:
+            return True
+        return secrets.compare_digest(headers.get(EN_TETE_SECRET.lower(), '').encode('utf-8'),
+                                      self.secret.encode('utf-8'))
+
+    @staticmethod
+    async def _respond(writer, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        """Retourne (statut HTTP, réponse JSON) de la requête"""
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        trouvee = False
+        for route_method, pattern, name in self._routes:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            trouvee = True
+            if route_method != method:
+                continue
+            try:
+                data = body if name == 'importer' else (json.loads(body) if body else {})
+                return 200, await getattr(self, name)(*match.groups(), query=query, data=data)
+            except LookupError as e:
+                return 404, {'erreur': str(e), 'type': 'LookupError'}
+            except sqlite3.IntegrityError as e:
+                return 409, {'erreur': str(e), 'type': 'IntegrityError'}
+            except (ValueError, TypeError, sqlite3.DatabaseError) as e:
+                return 400, {'erreur': str(e), 'type': type(e).__name__}
+            except Exception as e:
+                return 500, {'erreur': str(e), 'type': type(e).__name__}
+        if trouvee:
+            return 405, {'erreur': f"méthode {method} non permise sur {url.path}"}
+        return 404, {'erreur': f"ressource inconnue : {url.path}"}
+
+    # Lectures
+
+    async def sante(self, query, data):
+        return {'version': await self.read(lambda cursor: cursor.execute("PRAGMA user_version").fetchone()[0]),
+                'sequence': self._sequence}
+
+    async def changements(self, query, data):
+        """Modifications numérotées après `depuis`.
+
+        `reset` si le journal ne remonte plus assez loin ou si `depuis`
+        dépasse la séquence (numéro reçu d'un serveur redémarré depuis).
+        """
+        depuis = int(query.get('depuis', -1))
+        with self._changements_lock:
+            reponse = {'sequence': self._sequence, 'instance': self._instance, 'changements': []}
+            if depuis < 0:
+                return reponse
+            if depuis > self._sequence or (self._changements and depuis < self._changements[0][0] - 1):
+                return dict(reponse, reset=True)
+            reponse['changements'] = [change[1:] for change in self._changements if change[0] > depuis]
+            return reponse
+
+    async def requete(self, query, data):
+        """Exécute une requête en lecture seule : {'sql', 'params'} -> {'colonnes', 'lignes'}"""
+        sql, params = data['sql'], data.get('params', [])
+
+        def run(cursor):
+            if 'historique_' in sql:
+                # ATTACH est refusé sous l'autorisateur : les vues sont préparées avant
+                DatabaseManager.attach_archives(cursor.connection)
+            cursor.connection.set_authorizer(_lecture_seule)
+            try:
+                cursor.execute(sql, params)
+                colonnes = [column[0] for column in cursor.description or ()]
+                return {'colonnes': colonnes, 'lignes': cursor.fetchall()}
+            finally:
+                cursor.connection.set_authorizer(None)
+
+        return await self.read(run)
+
+    @staticmethod
+    def _dicts(cursor):
+        colonnes = [column[0] for column in cursor.description]
+        return [dict(zip(colonnes, row)) for row in cursor.fetchall()]
+
+    async def lister(self, table, query, data):
+        """Lignes d'une table par id croissant : ?apres=<id>&limite=<n>, filtres de FILTRES, ?recherche= (étudiants)"""
+        limite = min(int(query.get('limite', 100)), 1000)
+        apres = int(query.get('apres', 0))
+        if table == 'etudiants' and query.get('recherche'):
+            return await self.read(lambda cursor: [
+                dict(zip(('id', 'matricule', 'nom', 'prenom'), row))
+                for row in search_etudiants(cursor, query['recherche'], limite)])
+        conditions, params = ["id > ?"], [apres]
+        for colonne in FILTRES.get(table, ()):
+            if colonne in query:
+                conditions.append(f"{colonne} = ?")
+                params.append(int(query[colonne]))
+
+        def run(cursor):
+            cursor.execute(f"SELECT * FROM {table} WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                           params + [limite])
+            return self._dicts(cursor)
+
+        return await self.read(run)
+
+    async def lire(self, table, ligne_id, query, data):
+        def run(cursor):
+            cursor.execute(f"SELECT * FROM {table} WHERE id = ?", (int(ligne_id),))
+            lignes = self._dicts(cursor)
+            if not lignes:
+                raise LookupError(f"{table} {ligne_id} introuvable")
+            return lignes[0]
+
+        return await self.read(run)
+
+    async def notes_etudiant(self, etudiant_id, query, data):
+        def run(cursor):
+            cursor.execute('''
+                SELECT n.id, n.matiere_id, m.nom AS matiere, n.note, n.semestre, m.credits, m.annee,
+                       n.annee_academique
+                FROM notes n
+                JOIN matieres m ON n.matiere_id = m.id
+                WHERE n.etudiant_id = ?
+                ORDER BY m.annee, m.nom, n.semestre
+            ''', (int(etudiant_id),))
+            return self._dicts(cursor)
+
+        return await self.read(run)
+
+    async def moyennes(self, etudiant_id, query, data):
+        return await self.read(lambda cursor: moyennes_json(self.service.moyennes_etudiant(int(etudiant_id), cursor)))
+
+    async def bulletin(self, etudiant_id, query, data):
+        historique = query.get('historique') in ('1', 'true')
+        return await self.read(lambda cursor: self.service.bulletin(int(etudiant_id), historique, cursor))
+
+    async def bulletins_formation(self, formation_id, query, data):
+        annee = int(query['annee']) if 'annee' in query else None
+        semestre = int(query['semestre']) if 'semestre' in query else None
+        return await self.read(lambda cursor: self.service.bulletins_formation(int(formation_id), annee, semestre,
+                                                                                cursor))
+
+    async def statistiques(self, formation_id, query, data):
+        annee = int(query['annee']) if 'annee' in query else None
+        semestre = int(query['semestre']) if 'semestre' in query else None
+        return await self.read(lambda cursor: self.service.statistiques(int(formation_id), annee, semestre, cursor))
+
+    async def ouvrir_export(self, query, data):
+        """Ouvre un export (GestionService.export) lu ensuite par pages : {'export': jeton, 'colonnes'}.
+
+        Chaque export a sa propre connexion, fermée à la dernière page : les
+        lignes sont lues au fil des pages sans être chargées en mémoire.
+        """
+        limite = time.monotonic() - self.EXPORT_DELAI
+        with self._exports_lock:
+            abandonnes = [jeton for jeton, export in self._exports.items() if export[2] < limite]
+            expires = [self._exports.pop(jeton) for jeton in abandonnes]
+        for conn, _, _ in expires:
+            conn.close()
+
+        def run(cursor):
+            conn = self.lecture._open_connection()
+            try:
+                return conn, *self.service.export(data['kind'], data.get('formation_id'), conn.cursor())
+            except Exception:
+                conn.close()
+                raise
+
+        conn, colonnes, lignes = await self.read(run)
+        jeton = secrets.token_hex(8)
+        with self._exports_lock:
+            self._exports[jeton] = [conn, lignes, time.monotonic()]
+        return {'export': jeton, 'colonnes': colonnes}
+
+    async def lire_export(self, jeton, query, data):
+        """Page suivante d'un export : {'lignes', 'fin'} ; la connexion est fermée à la fin"""
+        with self._exports_lock:
+            export = self._exports.get(jeton)
+        if export is None:
+            raise LookupError(f"export {jeton} inconnu ou expiré")
+        conn, lignes, _ = export
+        taille = min(int(data.get('limite', 5000)), 50000)
+        page = await self.read(lambda cursor: list(itertools.islice(lignes, taille)))
+        fin = len(page) < taille
+        if fin:
+            with self._exports_lock:
+                self._exports.pop(jeton, None)
+            conn.close()
+        else:
+            export[2] = time.monotonic()
+        return {'lignes': page, 'fin': fin}
+
+    # Écritures
+
+    async def creer(self, table, query, data):
+        return {'id': await self.write(lambda service: service.creer(table, data))}
+
+    async def modifier(self, table, ligne_id, query, data):
+        await self.write(lambda service: service.modifier(table, int(ligne_id), data))
+        return {'id': int(ligne_id)}
+
+    async def supprimer(self, table, ligne_id=None, query=None, data=None):
+        ids = [int(ligne_id)] if ligne_id is not None else [int(i) for i in data['ids']]
+        return {'supprimees': await self.write(lambda service: service.supprimer(table, ids))}
+
+    async def inscrire(self, formation_id, query, data):
+        return {'inscriptions': await self.write(
+            lambda service: service.inscrire(int(formation_id), data['etudiant_ids'], data.get('annee')))}
+
+    async def desinscrire(self, formation_id, query, data):
+        return {'inscriptions': await self.write(
+            lambda service: service.desinscrire(int(formation_id), data['etudiant_ids']))}
+
+    async def enregistrer_note(self, query, data):
+        note_id = await self.write(
+            lambda service: service.enregistrer_note(data['etudiant_id'], data['matiere_id'], float(data['note'])))
+        if note_id is None:
+            raise LookupError(f"matière {data['matiere_id']} introuvable")
+        return {'id': note_id}
+
+    async def saisir_notes(self, query, data):
+        upserts = [tuple(note) for note in data.get('upserts', [])]
+        deletes = [tuple(note) for note in data.get('deletes', [])]
+        await self.write(lambda service: service.saisir_notes(upserts, deletes))
+        return {'notes': len(upserts) + len(deletes)}
+
+    async def modifier_note(self, note_id, query, data):
+        await self.write(lambda service: service.modifier_note(int(note_id), float(data['note']), data['semestre']))
+        return {'id': int(note_id)}
+
+    async def supprimer_note(self, note_id, query, data):
+        await self.write(lambda service: service.supprimer_note(int(note_id)))
+        return {'id': int(note_id)}
+
+    async def importer(self, kind, query, data):
+        """Importe le fichier envoyé dans le corps (CSV, ou XLSX avec ?format=xlsx)"""
+        suffixe = '.xlsx' if query.get('format') == 'xlsx' else '.csv'
+        with tempfile.NamedTemporaryFile(suffix=suffixe, delete=False) as f:
+            f.write(data)
+        try:
+            report = await self.write(lambda service: service.importer(kind, f.name))
+        finally:
+            os.remove(f.name)
+        return {'lues': report.lues, 'inserees': report.inserees, 'rejets': report.rejets}
+
+    async def recalculer_moyennes(self, query, data):
+        return {'ecarts': await self.write(lambda service: service.recalculer_moyennes())}
+
+    async def purger(self, query, data):
+        counts, liberes = await self.write(lambda service: service.db_manager.purge_orphans())
+        return {'supprimees': counts, 'liberes': liberes}
+
+    async def archiver(self, query, data):
+        annee = int(data['annee'])
+        counts = await self.write(lambda service: service.db_manager.archiver_annee(annee))
+        return {'archivees': counts, 'fichier': os.path.basename(self.db.archive_path(annee))}
+
+
+class ApiClient:
+    """Client HTTP/JSON d'ApiServer ; une connexion persistante par thread"""
+
+    ERREURS = {400: ValueError, 401: PermissionError, 404: LookupError, 409: sqlite3.IntegrityError}
+
+    def __init__(self, url, timeout=30, secret=None):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 8765
+        self.timeout = timeout
+        self._headers = {'Content-Type': 'application/json'}
+        if secret:
+            self._headers[EN_TETE_SECRET] = secret
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def request(self, method, path, data=None, body=None, query=None):
+        """Envoie une requête et retourne la réponse JSON ; les erreurs du serveur sont relevées en exceptions"""
+        if body is None and data is not None:
+            body = json.dumps(data).encode('utf-8')
+        if query:
+            path += '?' + urlencode({name: value for name, value in query.items() if value is not None})
+        # Une connexion persistante fermée par le serveur n'est détectée qu'à l'envoi :
+        # les lectures sont renvoyées une fois, jamais les écritures
+        tentatives = 2 if method == 'GET' or path == '/requete' else 1
+        for tentative in range(tentatives):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=self._headers)
+                response = conn.getresponse()
+                content = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                conn.close()
+                if tentative == tentatives - 1:
+                    raise sqlite3.OperationalError(f"serveur {self.host}:{self.port} injoignable : {e}") from e
+        result = json.loads(content)
+        if response.status != 200:
+            raise self.ERREURS.get(response.status, sqlite3.OperationalError)(result.get('erreur'))
+        return result
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class RemoteCursor:
+    """Curseur en lecture seule dont les requêtes sont exécutées par le serveur (POST /requete)"""
+
+    lastrowid = None
+    rowcount = -1
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self._rows = iter(())
+
+    def execute(self, sql, parameters=()):
+        stats = self.connection.stats
+        site = stats.call_site(skip=1)
+        debut = time.perf_counter()
+        result = self.connection.client.request('POST', '/requete', {'sql': sql, 'params': list(parameters)})
+        rows = [tuple(row) for row in result['lignes']]
+        stats.record(sql, site, time.perf_counter() - debut, len(rows))
+        self.description = tuple((colonne, None, None, None, None, None, None) for colonne in result['colonnes']) or None
+        self._rows = iter(rows)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        raise sqlite3.NotSupportedError("en mode client, les écritures passent par le service")
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=100):
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def close(self):
+        self._rows = iter(())
+
+
+class RemoteConnection:
+    def __init__(self, client, stats):
+        self.client = client
+        self.stats = stats
+
+    def cursor(self):
+        return RemoteCursor(self)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def interrupt(self):
+        # La requête HTTP en cours se termine ; son résultat est ignoré par le worker
+        pass
+
+    def close(self):
+        pass
+
+
+class RemoteDatabaseManager(DatabaseManager):
+    """DatabaseManager d'un poste en mode client : toutes les requêtes passent par ApiServer.
+
+    Les lectures SQL de l'interface sont exécutées telles quelles par le
+    serveur ; les écritures passent par `service` (ClientService).
+    poll_changes() relit le journal des modifications du serveur et les
+    notifie aux écouteurs, comme le ferait une écriture locale. Le secret
+    partagé est lu dans SECRET_ENV s'il n'est pas donné.
+    """
+
+    def __init__(self, url, slow_query_ms=100, slow_query_log=None, secret=None):
+        self.db_name = url
+        self.client = ApiClient(url, secret=secret if secret is not None else os.environ.get(SECRET_ENV))
+        self.query_stats = QueryStats(slow_query_ms, slow_query_log)
+        self._local = threading.local()
+        self._connections = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._archives = {}
+        result = self.client.request('GET', '/changements')
+        self._sequence, self._instance = result['sequence'], result['instance']
+
+    @property
+    def service(self):
+        return ClientService(self)
+
+    def schema_version(self):
+        return self.client.request('GET', '/sante')['version']
+
+    def get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = RemoteConnection(self.client, self.query_stats)
+        return conn
+
+    def transaction(self, immediate=True):
+        raise sqlite3.NotSupportedError("en mode client, les écritures passent par le service")
+
+    def poll_changes(self):
+        """Notifie les modifications faites sur le serveur depuis le dernier appel ; retourne leur nombre"""
+        with self._lock:
+            result = self.client.request('GET', '/changements', query={'depuis': self._sequence})
+            # Un serveur redémarré numérote de nouveau à partir de zéro
+            redemarre = result['instance'] != self._instance
+            self._sequence, self._instance = result['sequence'], result['instance']
+        if result.get('reset') or redemarre:
+            # Modifications manquées ou serveur redémarré : les vues relisent tout
+            self._dispatch([(table, 'reset', []) for table in self.TABLES])
+            return 0
+        self._dispatch([tuple(change) for change in result['changements']])
+        return len(result['changements'])
+
+    def rebuild_moyennes_cache(self):
+        return self.client.request('POST', '/admin/moyennes')['ecarts']
+
+    def purge_orphans(self):
+        result = self.client.request('POST', '/admin/purge')
+        self.poll_changes()
+        return result['supprimees'], result['liberes']
+
+    def archiver_annee(self, annee):
+        result = self.client.request('POST', '/admin/archives', {'annee': annee})
+        self._archives[annee] = result['fichier']
+        self.poll_changes()
+        return result['archivees']
+
+    def archive_path(self, annee):
+        return self._archives.get(annee, f"archive {annee} du serveur")
+
+    def close(self):
+        self.client.close()
+        self._local = threading.local()
+        self.query_stats.close()
+
+
+class ClientService:
+    """Équivalent de GestionService pour un poste en mode client : chaque opération est une requête HTTP.
+
+    Après une écriture, les modifications du serveur sont relues
+    (poll_changes) : les vues du poste se mettent à jour comme en local.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.client = db_manager.client
+
+    def _ecrire(self, method, path, data=None, **kwargs):
+        result = self.client.request(method, path, data, **kwargs)
+        self.db_manager.poll_changes()
+        return result
+
+    def creer(self, table, valeurs):
+        return self._ecrire('POST', f'/{table}', valeurs)['id']
+
+    def modifier(self, table, ligne_id, valeurs):
+        self._ecrire('PUT', f'/{table}/{ligne_id}', valeurs)
+
+    def supprimer(self, table, ids):
+        return self._ecrire('POST', f'/{table}/suppression', {'ids': list(ids)})['supprimees']
+
+    def inscrire(self, formation_id, etudiant_ids, annee=None):
+        if callable(etudiant_ids):
+            etudiant_ids = etudiant_ids(self.db_manager.get_connection().cursor())
+        return self._ecrire('POST', f'/formations/{formation_id}/inscriptions',
+                            {'etudiant_ids': list(etudiant_ids), 'annee': annee})['inscriptions']
+
+    def desinscrire(self, formation_id, etudiant_ids):
+        return self._ecrire('DELETE', f'/formations/{formation_id}/inscriptions',
+                            {'etudiant_ids': list(etudiant_ids)})['inscriptions']
+
+    def enregistrer_note(self, etudiant_id, matiere_id, note):
+        try:
+            return self._ecrire('POST', '/notes', {'etudiant_id': etudiant_id, 'matiere_id': matiere_id,
+                                                    'note': note})['id']
+        except LookupError:
+            return None
+
+    def modifier_note(self, note_id, note, semestre):
+        self._ecrire('PUT', f'/notes/{note_id}', {'note': note, 'semestre': semestre})
+
+    def supprimer_note(self, note_id):
+        self._ecrire('DELETE', f'/notes/{note_id}')
+
+    def saisir_notes(self, upserts, deletes):
+        self._ecrire('POST', '/notes/grille', {'upserts': upserts, 'deletes': deletes})
+
+    def moyennes_etudiant(self, etudiant_id, cursor=None):
+        return moyennes_depuis_json(self.client.request('GET', f'/etudiants/{etudiant_id}/moyennes'))
+
+    def bulletin(self, etudiant_id, historique=False, cursor=None):
+        return bulletin_depuis_json(self.client.request('GET', f'/etudiants/{etudiant_id}/bulletin',
+                                                        query={'historique': int(historique)}))
+
+    def bulletins_formation(self, formation_id, annee=None, semestre=None, cursor=None):
+        return [bulletin_depuis_json(bulletin) for bulletin in self.client.request(
+            'GET', f'/formations/{formation_id}/bulletins', query={'annee': annee, 'semestre': semestre})]
+
+    def statistiques(self, formation_id, annee=None, semestre=None, cursor=None):
+        # Calculées et gardées en cache par le serveur
+        return self.client.request('GET', f'/formations/{formation_id}/statistiques',
+                                   query={'annee': annee, 'semestre': semestre})
+
+    def recalculer_moyennes(self):
+        return self.db_manager.rebuild_moyennes_cache()
+
+    def export(self, kind, formation_id=None, cursor=None, chunk_size=5000):
+        """Export lu sur le serveur par pages de `chunk_size` lignes (voir ApiServer.ouvrir_export)"""
+        result = self.client.request('POST', '/exports', {'kind': kind, 'formation_id': formation_id})
+
+        def lignes():
+            while True:
+                page = self.client.request('POST', f"/exports/{result['export']}", {'limite': chunk_size})
+                yield from (tuple(ligne) for ligne in page['lignes'])
+                if page['fin']:
+                    return
+
+        return tuple(result['colonnes']), lignes()
+
+    def importer(self, kind, path, progress=None):
+        """Envoie le fichier au serveur, qui l'importe ; `progress` n'est appelé qu'à la fin"""
+        with open(path, 'rb') as f:
+            contenu = f.read()
+        result = self._ecrire('POST', f'/imports/{kind}', body=contenu,
+                              query={'format': 'xlsx' if path.lower().endswith('.xlsx') else 'csv'})
+        report = ImportReport()
+        report.lues, report.inserees = result['lues'], result['inserees']
+        report.rejets = [tuple(rejet) for rejet in result['rejets']]
+        if progress:
+            progress(report.lues)
+        return report
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serveur HTTP/JSON de la gestion des étudiants")
+    parser.add_argument('db', nargs='?', default="gestion_etudiants.db", help="fichier de base de données")
+    parser.add_argument('--hote', default='127.0.0.1', help="adresse d'écoute (0.0.0.0 : toutes)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--lecteurs', type=int, default=4, help="threads de lecture")
+    parser.add_argument('--fenetre-ms', type=float, default=2,
+                        help="attente des écritures suivantes avant de valider un lot")
+    args = parser.parse_args(argv)
+    secret = os.environ.get(SECRET_ENV)
+    if not secret and not adresse_locale(args.hote):
+        parser.error(f"--hote {args.hote} : définir le secret partagé dans {SECRET_ENV}")
+
+    server = ApiServer(args.db, args.lecteurs, args.fenetre_ms, secret)
+    try:
+        asyncio.run(server.serve(args.hote, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Base vide dans un fichier temporaire (l'archivage refuse les bases en mémoire)"""
+    db = DatabaseManager(str(tmp_path / "gestion_etudiants.db"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def formation(db):
+    """Une formation de deux ans avec quatre matières et cinq étudiants non inscrits.
+
+    Retourne {'id', 'matieres': [id, ...], 'etudiants': [id, ...]}.
+    """
+    service = db.service
+    departement_id = service.creer('departements', {'nom': "Informatique"})
+    formation_id = service.creer('formations', {'nom': "Licence", 'nb_annees': 2,
+                                                'departement_id': departement_id})
+    matieres = [service.creer('matieres', {'nom': f"Matière {annee}.{semestre}", 'formation_id': formation_id,
+                                           'credits': 2 + semestre, 'annee': annee, 'semestre': semestre})
+                for annee in (1, 2) for semestre in (1, 2)]
+    etudiants = [service.creer('etudiants', {'matricule': f"E{i:03d}", 'nom': f"Nom{i}", 'prenom': f"Prénom{i}"})
+                 for i in range(5)]
+    return {'id': formation_id, 'matieres': matieres, 'etudiants': etudiants}
@@ -0,0 +1,273 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core import BulkImporter, DatabaseManager, annee_academique_courante
+
+
+def notes(db):
+    return db.get_connection().execute(
+        "SELECT etudiant_id, matiere_id, note, semestre FROM notes ORDER BY etudiant_id, matiere_id").fetchall()
+
+
+def test_upsert_remplace_la_note(db, formation):
+    etudiant, matiere = formation['etudiants'][0], formation['matieres'][0]
+    with db.transaction() as cursor:
+        premier = db.upsert_notes(cursor, [(etudiant, matiere, 8.0, 1)])
+    with db.transaction() as cursor:
+        second = db.upsert_notes(cursor, [(etudiant, matiere, 14.0, 1)])
+    assert premier == second
+    assert notes(db) == [(etudiant, matiere, 14.0, 1)]
+
+
+def test_cache_des_moyennes_suit_les_ecritures(db, formation):
+    service = db.service
+    etudiants, matieres = formation['etudiants'], formation['matieres']
+    for i, etudiant in enumerate(etudiants):
+        for j, matiere in enumerate(matieres):
+            service.enregistrer_note(etudiant, matiere, (i * 3 + j) % 21)
+    assert db.check_moyennes_cache() == []
+
+    note_id = service.enregistrer_note(etudiants[0], matieres[0], 12.5)
+    service.modifier_note(note_id, 17.0, 2)
+    service.supprimer_note(service.enregistrer_note(etudiants[1], matieres[1], 3.0))
+    service.modifier('matieres', matieres[2], {'credits': 7, 'annee': 1})
+    assert db.check_moyennes_cache() == []
+
+    service.supprimer('matieres', [matieres[3]])
+    service.supprimer('etudiants', [etudiants[4]])
+    assert db.check_moyennes_cache() == []
+    assert db.rebuild_moyennes_cache() == 0
+
+
+def test_migration_d_une_base_ancienne(tmp_path):
+    """Une base créée avant la numérotation des migrations (user_version = 0) est mise à niveau"""
+    path = str(tmp_path / "ancienne.db")
+    conn = sqlite3.connect(path)
+    for name, sql in DatabaseManager.TABLES.items():
+        if name != 'notes':
+            conn.execute(sql.format(name=name))
+    conn.execute('''
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            etudiant_id INTEGER,
+            matiere_id INTEGER,
+            note REAL,
+            semestre INTEGER
+        )
+    ''')
+    conn.execute("INSERT INTO formations (id, nom, nb_annees) VALUES (1, 'Licence', 3)")
+    conn.execute("INSERT INTO matieres (id, nom, credits, formation_id, annee, semestre) "
+                 "VALUES (1, 'Algo', 4, 1, 1, 1)")
+    conn.execute("INSERT INTO etudiants (id, matricule, nom, prenom) VALUES (1, 'E001', 'Martin', 'Léa')")
+    conn.execute("INSERT INTO inscriptions (etudiant_id, formation_id, annee_inscription) VALUES (1, 1, 2021)")
+    # Deux saisies de la même note : la dernière est gardée
+    conn.executemany("INSERT INTO notes (etudiant_id, matiere_id, note, semestre) VALUES (1, 1, ?, 1)",
+                     [(9.0,), (13.0,)])
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    try:
+        assert db.schema_version() == len(DatabaseManager.MIGRATIONS)
+        assert db.get_connection().execute(
+            "SELECT note, annee_academique FROM notes").fetchall() == [(13.0, 2021)]
+        assert db.check_moyennes_cache() == []
+        colonnes = db.get_connection().execute("SELECT name FROM pragma_index_info('idx_notes_unique')").fetchall()
+        assert [row[0] for row in colonnes] == ['etudiant_id', 'matiere_id', 'semestre', 'annee_academique']
+        assert db.init_database() == 0
+    finally:
+        db.close()
+
+
+def test_matiere_repassee_garde_les_deux_notes(db, formation):
+    """Une note de l'année précédente n'est pas écrasée par celle de l'année en cours, et reste archivable"""
+    service = db.service
+    etudiant, matiere = formation['etudiants'][0], formation['matieres'][0]
+    annee = annee_academique_courante()
+    ancienne = service.enregistrer_note(etudiant, matiere, 7.0)
+    db.get_connection().execute("UPDATE notes SET annee_academique = ? WHERE id = ?", (annee - 1, ancienne))
+
+    nouvelle = service.enregistrer_note(etudiant, matiere, 15.0)
+    assert nouvelle != ancienne
+    service.saisir_notes([(etudiant, matiere, 16.0, 1)], [])
+
+    assert db.archiver_annee(annee - 1) == {'inscriptions': 0, 'notes': 1}
+    conn = db.get_connection()
+    assert conn.execute("SELECT id, note, annee_academique FROM notes").fetchall() == [(nouvelle, 16.0, annee)]
+    assert conn.execute("SELECT id, note, annee_academique FROM historique_notes ORDER BY id").fetchall() \
+        == [(ancienne, 7.0, annee - 1), (nouvelle, 16.0, annee)]
+    assert db.check_moyennes_cache() == []
+
+
+
+def test_matiere_repassee_seule_la_derniere_note_compte(db, formation):
+    """Avant archivage, moyennes, statistiques et bulletins ne comptent que la note la plus récente"""
+    service = db.service
+    etudiant, (algo, math) = formation['etudiants'][0], formation['matieres'][:2]
+    annee = annee_academique_courante()
+    service.modifier('matieres', math, {'semestre': 1, 'credits': 3})
+    service.inscrire(formation['id'], [etudiant])
+    ancienne = service.enregistrer_note(etudiant, algo, 4.0)
+    db.get_connection().execute("UPDATE notes SET annee_academique = ? WHERE id = ?", (annee - 1, ancienne))
+    service.enregistrer_note(etudiant, algo, 16.0)
+    service.enregistrer_note(etudiant, math, 16.0)
+    assert db.check_moyennes_cache() == []
+
+    assert service.moyennes_etudiant(etudiant)['moyenne_generale'] == 16.0
+    resultats = service.resultats_formation(formation['id']).pour_etudiant(etudiant)
+    assert (resultats['moyenne_generale'], resultats['credits']) == (16.0, 6)
+    assert service.statistiques(formation['id'])['cohorte']['moyenne'] == 16.0
+    _, notes_bulletin, moyenne = service.bulletin(etudiant)
+    assert [(note[0], note[1], note[5]) for note in notes_bulletin] == [("Matière 1.1", 16.0, annee),
+                                                                       ("Matière 1.2", 16.0, annee)]
+    assert moyenne == (16.0, 6)
+    [(_, notes_formation, moyenne_formation)] = [bulletin for bulletin in service.bulletins_formation(formation['id'])
+                                                 if bulletin[1]]
+    assert len(notes_formation) == 2 and moyenne_formation == (16.0, 6)
+    # L'historique liste les deux notes, avec leur année, mais ne compte que la plus récente
+    _, historique, moyenne_historique = service.bulletin(etudiant, historique=True)
+    assert [(note[1], note[5]) for note in historique if note[0] == "Matière 1.1"] == [(4.0, annee - 1), (16.0, annee)]
+    assert moyenne_historique == (16.0, 6)
+
+    # Sans la note de l'année en cours, celle de l'année précédente compte de nouveau
+    service.saisir_notes([], [(etudiant, algo, 1)])
+    assert db.check_moyennes_cache() == []
+    assert service.moyennes_etudiant(etudiant)['moyenne_generale'] == 10.0
+
+def test_file_d_ecriture_valide_toutes_les_ecritures(db, formation):
+    db.start_write_queue(window_ms=5)
+    service = db.service
+    couples = [(etudiant, matiere) for etudiant in formation['etudiants'] for matiere in formation['matieres']]
+    with ThreadPoolExecutor(8) as pool:
+        ids = list(pool.map(lambda couple: service.enregistrer_note(*couple, 11.0), couples))
+    assert len(set(ids)) == len(couples)
+    assert len(notes(db)) == len(couples)
+    assert db.write_queue.ecritures == len(couples)
+    assert db.write_queue.lots <= len(couples)
+    assert db.check_moyennes_cache() == []
+
+
+def test_file_d_ecriture_isole_les_echecs(db, formation):
+    queue = db.start_write_queue(window_ms=50)
+
+    def doublon(cursor):
+        cursor.execute("INSERT INTO etudiants (matricule, nom, prenom) VALUES ('E000', 'X', 'Y')")
+
+    def valide(cursor):
+        cursor.execute("INSERT INTO etudiants (matricule, nom, prenom) VALUES ('E999', 'X', 'Y')")
+
+    # Soumises dans la même fenêtre : un seul lot, l'échec du premier n'annule pas le second
+    echec, succes = queue.submit(doublon), queue.submit(valide)
+    with pytest.raises(sqlite3.IntegrityError):
+        echec.result()
+    succes.result()
+    assert db.get_connection().execute("SELECT COUNT(*) FROM etudiants WHERE matricule = 'E999'").fetchone()[0] == 1
+
+
+def test_inscrire_notifie_les_ids_crees(db, formation):
+    """Après une désinscription, les ids AUTOINCREMENT ne sont plus contigus au MAX(id)"""
+    service, etudiants = db.service, formation['etudiants']
+    notifications = []
+    db.add_listener(lambda table, kind, ids: notifications.append((table, kind, ids)))
+
+    assert service.inscrire(formation['id'], etudiants) == 5
+    assert service.desinscrire(formation['id'], etudiants[:2]) == 2
+    notifications.clear()
+    assert service.inscrire(formation['id'], etudiants[:2] + etudiants[:1]) == 2
+
+    ids = [row[0] for row in db.get_connection().execute("SELECT id FROM inscriptions ORDER BY id")]
+    assert ids == [3, 4, 5, 6, 7]
+    assert notifications == [('inscriptions', 'insert', [6, 7])]
+    # Déjà inscrits : rien n'est créé
+    assert service.inscrire(formation['id'], etudiants) == 0
+
+
+
+def test_une_inscription_par_annee(db, formation, tmp_path):
+    """inscrire() et l'import appliquent la même règle : une inscription par étudiant, formation et année"""
+    service, etudiant = db.service, formation['etudiants'][0]
+    assert service.inscrire(formation['id'], [etudiant], 2023) == 1
+    assert service.inscrire(formation['id'], [etudiant], 2024) == 1
+    assert service.inscrire(formation['id'], [etudiant], 2024) == 0
+
+    path = tmp_path / "inscriptions.csv"
+    path.write_text(f"matricule;formation_id;annee\nE000;{formation['id']};2024\nE000;{formation['id']};2025\n",
+                    encoding='utf-8')
+    assert BulkImporter(db).import_inscriptions(str(path)).inserees == 1
+    annees = db.get_connection().execute("SELECT annee_inscription FROM inscriptions ORDER BY annee_inscription")
+    assert annees.fetchall() == [(2023,), (2024,), (2025,)]
+
+def test_import_notifie_les_ids_crees(db, formation, tmp_path):
+    db.service.supprimer('etudiants', formation['etudiants'][3:])
+    notifications = []
+    db.add_listener(lambda table, kind, ids: notifications.append((table, kind, ids)))
+
+    path = tmp_path / "etudiants.csv"
+    path.write_text("matricule;nom;prenom\n" + ''.join(f"N{i:03d};Nom;Prénom\n" for i in range(300)) + "E000;X;Y\n",
+                    encoding='utf-8')
+    report = BulkImporter(db, chunk_size=1000).import_etudiants(str(path))
+
+    assert (report.inserees, len(report.rejets)) == (300, 1)
+    ids = [row[0] for row in db.get_connection().execute("SELECT id FROM etudiants WHERE matricule LIKE 'N%'")]
+    assert notifications == [('etudiants', 'insert', ids)]
+    assert min(ids) == 6
+
+
+def test_saisie_en_grille_notifie_les_notes_effacees(db, formation):
+    service = db.service
+    etudiant, matieres = formation['etudiants'][0], formation['matieres']
+    gardee, effacee = (service.enregistrer_note(etudiant, matiere, 10.0) for matiere in matieres[:2])
+    notifications = []
+    db.add_listener(lambda table, kind, ids: notifications.append((table, kind, ids)))
+
+    service.saisir_notes([(etudiant, matieres[0], 15.0, 1)], [(etudiant, matieres[1], 2), (etudiant, matieres[2], 1)])
+
+    assert notifications == [('notes', 'insert', [gardee]), ('notes', 'delete', [effacee])]
+    assert notes(db) == [(etudiant, matieres[0], 15.0, 1)]
+
+
+def test_maintenance_par_le_thread_ecrivain(db, formation):
+    """Purge, archivage et reconstruction du cache passent par la file : un seul écrivain"""
+    queue = db.start_write_queue()
+    service = db.service
+    etudiants, matieres = formation['etudiants'], formation['matieres']
+    annee = annee_academique_courante()
+    ancienne = service.enregistrer_note(etudiants[0], matieres[0], 7.0)
+    db.write(lambda cursor: cursor.execute("UPDATE notes SET annee_academique = ? WHERE id = ?",
+                                           (annee - 1, ancienne)))
+    # Orphelin laissé par une suppression faite sans clés étrangères
+    conn = db.get_connection()
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("INSERT INTO notes (etudiant_id, matiere_id, note, semestre) VALUES (999, ?, 5, 1)", (matieres[0],))
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    avant = queue.ecritures
+    with ThreadPoolExecutor(4) as pool:
+        # Écritures concurrentes pendant la maintenance : aucune ne rencontre la base occupée
+        notes_futures = [pool.submit(service.enregistrer_note, etudiant, matiere, 12.0)
+                         for etudiant in etudiants[1:] for matiere in matieres]
+        assert db.purge_orphans()[0] == {'notes': 1}
+        assert db.archiver_annee(annee - 1) == {'inscriptions': 0, 'notes': 1}
+        assert db.rebuild_moyennes_cache() == 0
+        for future in notes_futures:
+            future.result()
+    assert queue.ecritures == avant + 3 + len(notes_futures)
+    schemas = db.maintenance(lambda writer: [row[0] for row in writer.execute("SELECT name FROM pragma_database_list")])
+    assert f"archive_{annee - 1}" in schemas
+    assert conn.execute("SELECT COUNT(*) FROM historique_notes WHERE id = ?", (ancienne,)).fetchone()[0] == 1
+
+
+def test_statistiques_filtrees_sur_le_semestre_de_la_matiere(db, formation):
+    """Les notes retenues sont celles des matières retenues, même si la note porte un autre semestre"""
+    service = db.service
+    etudiant, matiere = formation['etudiants'][0], formation['matieres'][0]
+    service.inscrire(formation['id'], [etudiant])
+    service.enregistrer_note(etudiant, matiere, 12.0)
+    db.get_connection().execute("UPDATE notes SET semestre = 2")
+
+    premier, second = (service.statistiques(formation['id'], annee=1, semestre=semestre) for semestre in (1, 2))
+    assert [(stats['matiere_id'], stats['nb']) for stats in premier['matieres']] == [(matiere, 1)]
+    assert premier['cohorte']['nb'] == 1
+    assert second['cohorte']['nb'] == 0
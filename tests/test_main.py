@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('PyQt6.QtWidgets')
+
+from core import annee_academique_courante, libelle_annee  # noqa: E402
+from main import DatabaseWorker, NotesManagementDialog, SqlTableModel, StudentsManagementDialog  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def attendre(app, condition, timeout=5):
+    """Traite les événements Qt (résultats du worker) jusqu'à ce que la condition soit vraie"""
+    fin = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < fin, "délai dépassé"
+        app.processEvents()
+        time.sleep(0.005)
+
+
+def test_reset_relit_la_table(app, db):
+    service = db.service
+    for nom in ("Lettres", "Sciences"):
+        service.creer('departements', {'nom': nom})
+    model = SqlTableModel(db, ["ID", "Nom"])
+    model.set_query("SELECT id, nom FROM departements ORDER BY id")
+    assert model.rowCount() == 2
+
+    # Écriture dont la vue ne reçoit pas le détail (client distancé par le journal du serveur)
+    db.get_connection().execute("INSERT INTO departements (nom) VALUES ('Droit')")
+    model.apply_changes({'reset': set()})
+    assert model.rowCount() == 3
+    assert model.row_data(2)[1] == "Droit"
+
+
+def test_lectures_sur_le_worker(app, db):
+    """Avec un worker, le comptage de invalidate() et la lecture d'une sélection ne bloquent pas l'interface"""
+    for nom in ("Lettres", "Sciences"):
+        db.service.creer('departements', {'nom': nom})
+    worker = DatabaseWorker(db)
+    try:
+        model = SqlTableModel(db, ["ID", "Nom"], worker=worker)
+        model.set_query("SELECT id, nom FROM departements ORDER BY id")
+        attendre(app, lambda: model.rowCount() == 2)
+
+        db.get_connection().execute("INSERT INTO departements (nom) VALUES ('Droit')")
+        model.invalidate()
+        # Le nombre de lignes n'est réajusté qu'à l'arrivée du comptage
+        assert model.rowCount() == 2
+        attendre(app, lambda: model.rowCount() == 3)
+
+        lignes = []
+        model.rows_data([0, 2], lignes.extend)
+        assert lignes == []
+        attendre(app, lambda: lignes)
+        assert [ligne[1] for ligne in lignes] == ["Lettres", "Droit"]
+    finally:
+        worker.stop()
+
+
+def test_erreur_du_worker_journalisee(app, db, caplog):
+    worker = DatabaseWorker(db)
+    try:
+        worker.submit(lambda cursor: cursor.execute("SELECT * FROM inconnue"), lambda result: None)
+        attendre(app, lambda: caplog.records)
+    finally:
+        worker.stop()
+    assert caplog.records[0].levelname == 'ERROR'
+    assert "no such table: inconnue" in caplog.records[0].getMessage()
+
+
+def test_notes_d_une_matiere_repassee_distinguees(app, db, formation):
+    etudiant, matiere = formation['etudiants'][0], formation['matieres'][0]
+    annee = annee_academique_courante()
+    ancienne = db.service.enregistrer_note(etudiant, matiere, 4.0)
+    db.get_connection().execute("UPDATE notes SET annee_academique = ? WHERE id = ?", (annee - 1, ancienne))
+    db.service.enregistrer_note(etudiant, matiere, 16.0)
+    worker = DatabaseWorker(db)
+    try:
+        dialog = NotesManagementDialog(None, db, etudiant, "Nom0 Prénom0", formation['id'], worker)
+        attendre(app, lambda: dialog.table.rowCount() == 2)
+        lignes = [(dialog.table.item(row, 1).text(), dialog.table.item(row, 5).text()) for row in range(2)]
+        assert lignes == [("4.0", libelle_annee(annee - 1)), ("16.0", libelle_annee(annee))]
+        dialog.done(0)
+    finally:
+        worker.stop()
+
+
+def test_etudiant_inscrit_deux_ans_liste_une_fois(app, db, formation):
+    etudiants = formation['etudiants']
+    db.service.inscrire(formation['id'], etudiants[:2], 2023)
+    db.service.inscrire(formation['id'], etudiants[:1], 2024)
+    worker = DatabaseWorker(db)
+    try:
+        dialog = StudentsManagementDialog(None, db, formation['id'], "Licence", worker)
+        attendre(app, lambda: dialog.model.rowCount() == 2)
+        assert sorted(dialog.model.row_data(row)[5] for row in range(2)) == etudiants[:2]
+        dialog.done(0)
+    finally:
+        worker.stop()
@@ -0,0 +1,142 @@
+"""Plans d'exécution de toutes les requêtes SQL de l'application.
+
+Chaque requête littérale passée à execute(), executemany() ou set_query()
+est soumise à EXPLAIN QUERY PLAN sur une base vide créée par
+DatabaseManager, ainsi que chaque combinaison de tri et de filtre de
+l'onglet Étudiants (requêtes construites par etudiants_query). Le test
+échoue si une requête filtrée parcourt entièrement (SCAN) une des grandes
+tables.
+"""
+import ast
+import os
+import re
+
+import pytest
+
+from core import DatabaseManager, ETUDIANTS_FILTERS, ETUDIANTS_SORTS, etudiants_query
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = ('core.py', 'main.py', 'cli.py', 'server.py')
+
+# Tables dont la taille croît avec le nombre d'étudiants
+LARGE_TABLES = {'etudiants', 'inscriptions', 'matieres', 'notes'}
+
+# Parcours complets voulus : (méthode, table) -> raison
+ALLOWED_SCANS = {
+    ('DatabaseManager._merge_duplicate_notes', 'notes'):
+        "migration ponctuelle avant la création de idx_notes_unique",
+    ('DatabaseManager._create_annees_academiques', 'notes'):
+        "migration ponctuelle : année académique des notes existantes",
+}
+
+SQL_KEYWORDS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+ALIAS_RE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)'
+                      r'(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|INNER|ORDER|GROUP)\b)(\w+))?',
+                      re.IGNORECASE)
+
+
+def collect_statements(path):
+    """Retourne les requêtes SQL littérales du fichier avec leur méthode d'origine"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+
+    statements = []
+
+    def visit(node, scope):
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            scope = scope + [node.name]
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ('execute', 'executemany', 'set_query') and node.args
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            sql = node.args[0].value.strip()
+            if sql.upper().startswith(SQL_KEYWORDS):
+                statements.append(('.'.join(scope), node.lineno, sql))
+        for child in ast.iter_child_nodes(node):
+            visit(child, scope)
+
+    visit(tree, [])
+    return statements
+
+
+def dynamic_statements():
+    """Retourne les requêtes construites à l'exécution : tris et filtres de l'onglet Étudiants.
+
+    Les paramètres des filtres sont fournis : l'optimisation de LIKE par
+    l'index dépend de la valeur liée.
+    """
+    statements = []
+    for sort_column in ETUDIANTS_SORTS:
+        for descending in (False, True):
+            for filters in [{}] + [{column: 'a'} for column in ETUDIANTS_FILTERS]:
+                for search, exclude in (('', None), ('a', None), ('', 1)):
+                    sql, params, (seek, _) = etudiants_query(search, filters, sort_column, descending, exclude)
+                    # Sans filtre (l'exclusion des inscrits n'est pas sélective), la première
+                    # page est celle de la liste complète, paginée
+                    if filters or search:
+                        statements.append(('etudiants_query', sql.format(seek='1'), params))
+                    statements.append(('etudiants_query', sql.format(seek=seek),
+                                       [None] * seek.count('?') + params))
+    return statements
+
+
+def allowed(scope, table):
+    """Indique si le parcours est autorisé pour la méthode ou une de ses fonctions internes"""
+    return any(table == allowed_table and (scope == method or scope.startswith(method + '.'))
+               for method, allowed_table in ALLOWED_SCANS)
+
+
+def full_scans(cursor, sql, params=None):
+    """Retourne les tables parcourues entièrement par la requête"""
+    aliases = {}
+    for table, alias in ALIAS_RE.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias:
+            aliases[alias.lower()] = table.lower()
+
+    if params is None:
+        params = [None] * sql.count('?')
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    scans = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        if detail.startswith('SCAN '):
+            name = detail.split()[1].lower()
+            scans.append(aliases.get(name, name))
+    return scans
+
+
+def forbidden_scans(cursor, scope, sql, params=None):
+    """Tables de LARGE_TABLES parcourues entièrement par une requête filtrée"""
+    # Les listes complètes (sans WHERE) sont paginées par les vues
+    if not re.search(r'\bWHERE\b', sql, re.IGNORECASE):
+        return []
+    return [table for table in full_scans(cursor, sql, params)
+            if table in LARGE_TABLES and not allowed(scope, table)]
+
+
+@pytest.fixture(scope='module')
+def cursor():
+    db = DatabaseManager(':memory:')
+    # Vues historique_* lues par les bulletins avec historique
+    DatabaseManager.attach_archives(db.get_connection())
+    yield db.get_connection().cursor()
+    db.close()
+
+
+STATIC = [pytest.param(scope, sql, id=f"{name}:{lineno}:{scope}")
+          for name in SOURCES for scope, lineno, sql in collect_statements(os.path.join(ROOT, name))]
+
+
+@pytest.mark.parametrize('scope, sql', STATIC)
+def test_requete_litterale(cursor, scope, sql):
+    assert forbidden_scans(cursor, scope, sql) == [], ' '.join(sql.split())[:120]
+
+
+@pytest.mark.parametrize('scope, sql, params', dynamic_statements())
+def test_requete_onglet_etudiants(cursor, scope, sql, params):
+    assert forbidden_scans(cursor, scope, sql, params) == [], ' '.join(sql.split())[:120]
+
+
+def test_requetes_trouvees():
+    # Garde-fou : un changement de style d'appel ne doit pas vider la liste sans bruit
+    assert len(STATIC) > 50
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+
+from server import SECRET_ENV, ApiClient, ApiServer, RemoteDatabaseManager
+
+
+@pytest.fixture
+def serveur(request, tmp_path, monkeypatch):
+    """ApiServer sur un port libre, dans un thread ; retourne (serveur, url)
+
+    Paramètre indirect facultatif : le secret partagé du serveur.
+    """
+    # Journal court : quelques écritures suffisent à distancer un client
+    monkeypatch.setattr(ApiServer, 'CHANGEMENTS_MAX', 5)
+    monkeypatch.delenv(SECRET_ENV, raising=False)
+    api = ApiServer(str(tmp_path / "gestion_etudiants.db"), 2, 2, getattr(request, 'param', None))
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(api.handle, '127.0.0.1', 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield api, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    server.close()
+    loop.close()
+    api.close()
+
+
+def test_client_distance_relit_toutes_les_tables(serveur):
+    api, url = serveur
+    client = RemoteDatabaseManager(url)
+    notifications = []
+    client.add_listener(lambda table, kind, ids: notifications.append((table, kind, ids)))
+
+    api.service.creer('departements', {'nom': "Lettres"})
+    assert client.poll_changes() == 1
+    assert notifications == [('departements', 'insert', [1])]
+
+    notifications.clear()
+    for i in range(10):
+        api.service.creer('etudiants', {'matricule': f"E{i}", 'nom': "Nom", 'prenom': "Prénom"})
+    assert client.poll_changes() == 0
+    assert notifications == [(table, 'reset', []) for table in client.TABLES]
+    # Le client est de nouveau à jour
+    assert client.poll_changes() == 0
+
+
+@pytest.mark.parametrize('serveur', ["s3cret"], indirect=True)
+def test_secret_partage_exige(serveur, monkeypatch):
+    api, url = serveur
+    with pytest.raises(PermissionError):
+        ApiClient(url).request('GET', '/sante')
+    with pytest.raises(PermissionError):
+        ApiClient(url, secret="autre").request('POST', '/requete', {'sql': "SELECT 1"})
+
+    assert RemoteDatabaseManager(url, secret="s3cret").schema_version() == api.db.schema_version()
+    monkeypatch.setenv(SECRET_ENV, "s3cret")
+    assert RemoteDatabaseManager(url).poll_changes() == 0
+
+
+def test_ecoute_reseau_refusee_sans_secret(serveur):
+    api, _ = serveur
+    with pytest.raises(ValueError):
+        asyncio.run(api.serve('0.0.0.0', 0))
+
+
+def test_redemarrage_du_serveur_relit_tout(serveur):
+    api, url = serveur
+    client = RemoteDatabaseManager(url)
+    notifications = []
+    client.add_listener(lambda table, kind, ids: notifications.append((table, kind, ids)))
+    reset = [(table, 'reset', []) for table in client.TABLES]
+
+    # Numéro reçu d'une instance précédente, plus avancée
+    client._sequence = 50
+    assert client.poll_changes() == 0
+    assert notifications == reset
+
+    # Nouvelle instance dont la numérotation a déjà dépassé celle du client
+    notifications.clear()
+    api._instance = "redemarre"
+    api.service.creer('departements', {'nom': "Lettres"})
+    assert client.poll_changes() == 0
+    assert notifications == reset
+
+    notifications.clear()
+    api.service.creer('departements', {'nom': "Sciences"})
+    assert client.poll_changes() == 1
+    assert notifications == [('departements', 'insert', [2])]